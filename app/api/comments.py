@@ -1,31 +1,341 @@
 """
 评论相关API路由
 """
-from fastapi import APIRouter, HTTPException
-from app.models import ReplyCommentRequest, UnrepliedCommentsResponse, ReplyResponse
-from app.bilibili.service import get_unreplied_comments, reply_to_comment
+import asyncio
+import logging
+from typing import Optional, Tuple
+from fastapi import APIRouter, Header, HTTPException, Query, Request, Response, WebSocket, WebSocketDisconnect
+from fastapi.responses import StreamingResponse
+from app.models import (
+    ReplyCommentRequest,
+    UnrepliedCommentsResponse,
+    ClaimCommentsResponse,
+    ReplyResponse,
+    BatchReplyRequest,
+    BatchReplyResponse,
+    ReplyJobResponse,
+    BatchReplyJobResponse
+)
+from app.bilibili.service import (
+    get_unreplied_comments,
+    claim_unreplied_comments,
+    release_claim,
+    reply_to_comment,
+    reply_to_comments,
+    get_reply_outbox
+)
+from app.bilibili.reply_worker import reply_worker_pool
+from app.pipeline.runner import reply_pipeline
+from app.bilibili.poller import comment_poller
+from app.bilibili.broadcast import comment_broadcaster
+from app.bilibili.prefilter import comment_prefilter
+from app.lifecycle import drain_controller
+from app.cache import SingleFlightCache, make_etag, etag_matches
+from app.timing import stage
+from app.serialization import FastJSONResponse, dumps, gzip_body
+from app.config import (
+    UNREPLIED_CACHE_TTL,
+    COMMENT_SNAPSHOT_MAX_AGE,
+    COMMENT_STREAM_HEARTBEAT,
+    REPLY_BATCH_MAX_SIZE,
+    CLAIM_LEASE_SECONDS,
+    CLAIM_MAX_LEASE_SECONDS,
+    CLAIM_MAX_LIMIT,
+    PREFILTER_ENABLED
+)
+
+logger = logging.getLogger(__name__)
 
 router = APIRouter()
 
+# 未回复评论缓存：并发请求共享同一次上游拉取，结果缓存 UNREPLIED_CACHE_TTL 秒
+unreplied_cache = SingleFlightCache(ttl=UNREPLIED_CACHE_TTL)
+
+
+async def _load_unreplied() -> Tuple[UnrepliedCommentsResponse, bytes, str]:
+    """拉取未回复评论并序列化，返回响应对象、响应体和对应的 ETag"""
+    result = await get_unreplied_comments()
+    with stage("serialize"):
+        body = dumps(result)
+        etag = make_etag(body)
+    return result, body, etag
+
+
+def _fresh_snapshot():
+    """后台轮询器正在运行且快照足够新时返回快照，否则返回 None"""
+    snapshot = comment_poller.snapshot
+    if comment_poller.running and snapshot is not None and snapshot.age <= COMMENT_SNAPSHOT_MAX_AGE:
+        return snapshot
+    return None
+
+
+def _on_replied():
+    """回复成功后刷新未回复列表：已回复的评论不应再出现在缓存或快照中"""
+    unreplied_cache.invalidate()
+    comment_poller.refresh_soon()
+
+
+# 发件箱和回复流水线中的回复发送成功后同样刷新未回复列表
+reply_worker_pool.on_success(lambda result: _on_replied())
+reply_pipeline.on_success(lambda result: _on_replied())
+
+
+def _on_reply_job_failed(job):
+    """固定回复的发件箱任务最终失败时改为交给 LLM，评论重新出现在未回复列表中"""
+    if comment_prefilter.demote(job["rpid"]):
+        _on_replied()
+
+
+reply_worker_pool.on_failure(lambda job, result: _on_reply_job_failed(job))
+
+
+def _job_response(job) -> ReplyJobResponse:
+    """发件箱任务记录转换为响应模型"""
+    return ReplyJobResponse(job_id=job["id"], **{key: value for key, value in job.items() if key != "id"})
+
 
 @router.post("/unreplied", response_model=UnrepliedCommentsResponse)
-async def get_unreplied_comments_endpoint():
+async def get_unreplied_comments_endpoint(if_none_match: Optional[str] = Header(default=None),
+                                          accept_encoding: Optional[str] = Header(default=None)):
     """
     获取未回复的评论
+
+    后台轮询器有足够新的快照时直接返回快照，否则实时拉取（并发请求共享同一次拉取）。
+    支持 If-None-Match：结果未变化时返回 304，不再重复传输响应体；
+    响应体较大且客户端支持时以 gzip 压缩传输
+    """
+    snapshot = _fresh_snapshot()
+    if snapshot is not None:
+        body, etag = snapshot.body, snapshot.etag
+        headers = {
+            "Cache-Control": "private, no-cache",
+            "X-Snapshot-Age": f"{snapshot.age:.3f}",
+            "X-Poller-Lag": f"{comment_poller.lag:.3f}"
+        }
+    else:
+        try:
+            _, body, etag = await unreplied_cache.get("unreplied", _load_unreplied)
+        except Exception as e:
+            raise HTTPException(status_code=500, detail=str(e))
+        headers = {"Cache-Control": f"private, max-age={int(UNREPLIED_CACHE_TTL)}"}
+
+    body, etag, encoding_headers = gzip_body(body, etag, accept_encoding)
+    headers.update(encoding_headers, ETag=etag)
+    if etag_matches(if_none_match, etag):
+        return Response(status_code=304, headers=headers)
+    return FastJSONResponse(content=body, headers=headers)
+
+
+@router.post("/claim", response_model=ClaimCommentsResponse)
+async def claim_comments_endpoint(
+    limit: int = Query(default=10, ge=1, le=CLAIM_MAX_LIMIT),
+    lease_seconds: float = Query(default=CLAIM_LEASE_SECONDS, ge=1, le=CLAIM_MAX_LEASE_SECONDS),
+    consumer: Optional[str] = Query(default=None, max_length=64)
+):
     """
+    认领一批未回复的评论
+
+    并发调用的消费者拿到的评论互不重叠。评论回复成功后自动释放；
+    租约到期仍未回复的评论会重新分配给后续的认领请求
+    """
+    snapshot = _fresh_snapshot()
     try:
-        return await get_unreplied_comments()
+        if snapshot is not None:
+            unreplied = snapshot.response
+        else:
+            unreplied, _, _ = await unreplied_cache.get("unreplied", _load_unreplied)
+        # 认领结果由已构造好的评论对象组成，直接序列化返回，不再按 response_model 校验一遍
+        return FastJSONResponse(await claim_unreplied_comments(limit, lease_seconds, consumer, unreplied))
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 
+@router.delete("/claim/{lease_id}")
+async def release_claim_endpoint(lease_id: str):
+    """
+    提前释放认领租约，其中未回复的评论可以立即被重新认领
+    """
+    return {"lease_id": lease_id, "released": await release_claim(lease_id)}
+
+
 @router.post("/reply", response_model=ReplyResponse)
-async def reply_comment_endpoint(request: ReplyCommentRequest):
+async def reply_comment_endpoint(request: ReplyCommentRequest,
+                                 idempotency_key: Optional[str] = Header(default=None)):
     """
     回复评论
+
+    同一评论（或同一 Idempotency-Key）重复提交时直接返回首次回复的结果，不会重复发送
+    """
+    try:
+        logger.info("收到回复请求 - OID: %s, RPID: %s, ROOT: %s, 消息: %s",
+                    request.oid, request.rpid, request.root, request.message)
+        result = await reply_to_comment(
+            request.oid, request.rpid, request.message, request.root,
+            request.idempotency_key or idempotency_key
+        )
+        if result.success:
+            _on_replied()
+        return result
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@router.post("/reply/batch", response_model=BatchReplyResponse)
+async def reply_comments_batch_endpoint(request: BatchReplyRequest):
+    """
+    批量回复评论
+
+    所有回复经过共享的令牌桶限流器和并发上限发送，返回结果与请求顺序一一对应
+    """
+    if len(request.items) > REPLY_BATCH_MAX_SIZE:
+        raise HTTPException(status_code=400, detail=f"单次最多回复 {REPLY_BATCH_MAX_SIZE} 条评论")
+    try:
+        results = await reply_to_comments(request.items)
+        success_count = sum(1 for result in results if result.success)
+        if success_count:
+            _on_replied()
+        return BatchReplyResponse(
+            results=results,
+            success_count=success_count,
+            failure_count=len(results) - success_count
+        )
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@router.post("/reply/async", response_model=ReplyJobResponse, status_code=202)
+async def enqueue_reply_endpoint(request: ReplyCommentRequest, response: Response,
+                                 idempotency_key: Optional[str] = Header(default=None)):
     """
+    异步回复评论
+
+    回复写入持久化发件箱后立即返回 202 和任务ID，由后台 worker 限流发送并在失败时重试；
+    进程重启后未完成的任务会继续发送。同一幂等键重复提交时返回已有的任务
+    """
+    if idempotency_key and not request.idempotency_key:
+        request = request.model_copy(update={"idempotency_key": idempotency_key})
     try:
-        print(f"收到回复请求 - OID: {request.oid}, RPID: {request.rpid}, ROOT: {request.root}, 消息: {request.message}")
-        return await reply_to_comment(request.oid, request.rpid, request.message, request.root)
+        job = await asyncio.to_thread(get_reply_outbox().enqueue, request)
     except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e)) 
\ No newline at end of file
+        raise HTTPException(status_code=500, detail=str(e))
+    reply_worker_pool.notify()
+    response.headers["Location"] = f"/api/comments/reply/jobs/{job['id']}"
+    return _job_response(job)
+
+
+@router.post("/reply/async/batch", response_model=BatchReplyJobResponse, status_code=202)
+async def enqueue_replies_endpoint(request: BatchReplyRequest):
+    """
+    批量异步回复评论，返回的任务与请求顺序一一对应
+    """
+    if len(request.items) > REPLY_BATCH_MAX_SIZE:
+        raise HTTPException(status_code=400, detail=f"单次最多回复 {REPLY_BATCH_MAX_SIZE} 条评论")
+    try:
+        jobs = [_job_response(job) for job in await asyncio.to_thread(get_reply_outbox().enqueue_many, request.items)]
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+    reply_worker_pool.notify()
+    return BatchReplyJobResponse(jobs=jobs)
+
+
+@router.get("/reply/jobs/{job_id}", response_model=ReplyJobResponse)
+async def get_reply_job_endpoint(job_id: str):
+    """
+    查询异步回复任务的状态和结果
+    """
+    job = await asyncio.to_thread(get_reply_outbox().get, job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="回复任务不存在或已过期")
+    return _job_response(job)
+
+
+@router.get("/reply/outbox")
+async def get_reply_outbox_status():
+    """
+    发件箱 worker 状态和各状态任务数
+    """
+    return await asyncio.to_thread(reply_worker_pool.status)
+
+
+@router.get("/snapshot")
+async def get_snapshot_status():
+    """
+    获取未回复评论快照状态（快照年龄、轮询延迟等）
+    """
+    return comment_poller.status()
+
+
+@router.get("/prefilter")
+async def get_prefilter_status():
+    """
+    评论预过滤统计：跳过、固定回复和交给 LLM 的评论数，各规则命中次数和命中率
+    """
+    return {"enabled": PREFILTER_ENABLED, **comment_prefilter.status()}
+
+
+def _subscribe(backlog: bool):
+    """订阅新评论推送，backlog 为真时先推送当前快照中的未回复评论"""
+    if drain_controller.draining:
+        raise HTTPException(status_code=503, detail="服务正在关闭")
+    if not comment_poller.running:
+        raise HTTPException(status_code=503, detail="评论轮询器未运行，无法推送新评论")
+    snapshot = comment_poller.snapshot
+    items = snapshot.response.result if backlog and snapshot is not None else ()
+    return comment_broadcaster.subscribe(backlog=items)
+
+
+@router.get("/stream")
+async def stream_comments(request: Request, backlog: bool = Query(default=False)):
+    """
+    以 Server-Sent Events 推送新出现的未回复评论
+
+    每条评论只推送一次，事件数据为 CommentInfo JSON
+    """
+    subscriber = _subscribe(backlog)
+
+    async def event_stream():
+        try:
+            while not subscriber.closed:
+                try:
+                    item = await asyncio.wait_for(subscriber.get(), timeout=COMMENT_STREAM_HEARTBEAT)
+                except asyncio.TimeoutError:
+                    if await request.is_disconnected():
+                        break
+                    yield ": ping\n\n"
+                    continue
+                if item is None:
+                    break
+                yield f"id: {item.rpid}\nevent: comment\ndata: {item.model_dump_json()}\n\n"
+        finally:
+            comment_broadcaster.unsubscribe(subscriber)
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+
+@router.websocket("/ws")
+async def websocket_comments(websocket: WebSocket, backlog: bool = False):
+    """
+    以 WebSocket 推送新出现的未回复评论，每条消息为 CommentInfo JSON
+    """
+    try:
+        subscriber = _subscribe(backlog)
+    except HTTPException as e:
+        await websocket.close(code=1013, reason=e.detail)
+        return
+
+    await websocket.accept()
+    try:
+        while True:
+            item = await subscriber.get()
+            if item is None:
+                await websocket.close(code=1008, reason="消费过慢")
+                break
+            await websocket.send_text(item.model_dump_json())
+    except WebSocketDisconnect:
+        pass
+    finally:
+        comment_broadcaster.unsubscribe(subscriber)
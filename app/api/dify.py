@@ -3,47 +3,73 @@ Dify API路由
 提供Dify workflow的API接口
 """
 from fastapi import APIRouter, HTTPException, Query
-from typing import Dict, Any
+from typing import Dict, Any, Optional
 
 from app.dify.service import (
     manual_call_dify,
     start_scheduler,
     stop_scheduler,
-    get_scheduler_status
+    get_scheduler_status,
+    get_workflow_progress
 )
+from app.leader import leader_elector
 from app.models import DifyCallResponse, DifyConfigRequest
-from dify_config import DEFAULT_INTERVAL_HOURS
+from dify_config import DEFAULT_INTERVAL_HOURS, ADAPTIVE_MIN_MINUTES, ADAPTIVE_MAX_MINUTES
 
 router = APIRouter()
 
 
 @router.post("/call", response_model=DifyCallResponse)
-async def call_dify_workflow():
+async def call_dify_workflow(
+    response_mode: Optional[str] = Query(default=None, pattern="^(blocking|streaming)$"),
+    execution_mode: Optional[str] = Query(default=None, pattern="^(single|fanout)$")
+):
     """
     手动调用Dify workflow
+    
+    Args:
+        response_mode: blocking 或 streaming，默认使用配置 DIFY_RESPONSE_MODE
+        execution_mode: single 或 fanout，默认使用配置 DIFY_EXECUTION_MODE
     """
     try:
-        result = await manual_call_dify()
+        result = await manual_call_dify(response_mode, execution_mode)
         return result
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"调用Dify workflow失败: {str(e)}")
 
 
 @router.post("/scheduler/start")
-async def start_dify_scheduler(interval_hours: int = Query(default=DEFAULT_INTERVAL_HOURS, ge=1, le=24)):
+async def start_dify_scheduler(
+    interval_hours: int = Query(default=DEFAULT_INTERVAL_HOURS, ge=1, le=24),
+    mode: Optional[str] = Query(default=None, pattern="^(interval|adaptive)$"),
+    interval_minutes: Optional[float] = Query(default=None, ge=1, le=1440),
+    min_minutes: float = Query(default=ADAPTIVE_MIN_MINUTES, ge=1, le=1440),
+    max_minutes: float = Query(default=ADAPTIVE_MAX_MINUTES, ge=1, le=1440)
+):
     """
     启动Dify workflow定时调度器
     
     Args:
         interval_hours: 调度间隔（小时），范围1-24
+        mode: interval（固定间隔）或 adaptive（按评论到达速率自适应），默认使用配置 SCHEDULER_MODE
+        interval_minutes: 调度间隔（分钟），范围1-1440，指定时优先于 interval_hours
+        min_minutes: adaptive 模式的最短间隔（分钟）
+        max_minutes: adaptive 模式的最长间隔（分钟）
     """
+    if not leader_elector.is_leader:
+        leader = leader_elector.status()
+        raise HTTPException(
+            status_code=409,
+            detail=f"当前进程 {leader['pid']} 不是 leader，调度器由进程 {leader['leader_pid']} 运行"
+        )
     try:
-        success = start_scheduler(interval_hours)
+        success = start_scheduler(interval_hours, mode, interval_minutes, min_minutes, max_minutes)
         if success:
             return {
                 "success": True,
-                "message": f"调度器已启动，每{interval_hours}小时执行一次",
-                "interval_hours": interval_hours
+                "message": "调度器已启动",
+                "interval_hours": interval_hours,
+                "status": get_scheduler_status()
             }
         else:
             raise HTTPException(status_code=400, detail="调度器启动失败，可能已经在运行中")
@@ -76,11 +102,20 @@ async def get_dify_scheduler_status():
     """
     try:
         status = get_scheduler_status()
+        status["leader"] = leader_elector.status()
         return status
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"获取调度器状态失败: {str(e)}")
 
 
+@router.get("/progress")
+async def get_dify_workflow_progress():
+    """
+    获取流式模式下Dify workflow的运行进度（进行中和最近完成的运行）
+    """
+    return get_workflow_progress()
+
+
 @router.put("/config")
 async def update_dify_config(config: DifyConfigRequest):
     """
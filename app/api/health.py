@@ -2,6 +2,10 @@
 健康检查和基础API路由
 """
 from fastapi import APIRouter
+from fastapi.responses import JSONResponse
+from app.lifecycle import drain_controller
+from app.leader import leader_elector
+from app.resilience import get_resilience_status
 
 router = APIRouter()
 
@@ -23,8 +27,32 @@ async def root():
 async def health_check():
     """
     健康检查接口
+
+    服务关闭排空期间返回 503 和 draining 状态，负载均衡器应停止转发新请求
     """
+    if drain_controller.draining:
+        return JSONResponse(status_code=503, content={
+            "status": "draining",
+            "message": "服务正在关闭",
+            "inflight": drain_controller.inflight()
+        })
     return {
         "status": "healthy",
         "message": "服务运行正常"
-    } 
\ No newline at end of file
+    }
+
+
+@router.get("/health/upstreams")
+async def upstreams_health():
+    """
+    上游（B站、Dify）熔断器状态
+    """
+    return get_resilience_status()
+
+
+@router.get("/health/leader")
+async def leader_health():
+    """
+    多进程 leader 选举状态：当前进程 PID、leader 进程 PID 和租约剩余时间
+    """
+    return leader_elector.status()
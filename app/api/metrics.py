@@ -0,0 +1,71 @@
+"""
+Prometheus 指标接口
+"""
+import asyncio
+
+from fastapi import APIRouter, Response
+from app.metrics import registry
+from app.leader import leader_elector
+from app.bilibili.poller import comment_poller
+from app.bilibili.service import get_reply_outbox
+from app.dify import service as dify_service
+from app.pipeline.runner import reply_pipeline
+
+router = APIRouter()
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+def _unreplied_backlog():
+    snapshot = comment_poller.snapshot
+    return snapshot.response.count if snapshot is not None else None
+
+
+def _snapshot_age():
+    snapshot = comment_poller.snapshot
+    return snapshot.age if snapshot is not None else None
+
+
+def _outbox_jobs():
+    return {(status,): count for status, count in get_reply_outbox().counts().items()}
+
+
+def _pipeline_queues():
+    if not reply_pipeline.running:
+        return None
+    return {(stage,): depth for stage, depth in reply_pipeline.queue_depths().items()}
+
+
+# 抓取时才计算的仪表（只有 leader 进程运行轮询器和调度器，非 leader 进程不输出相应样本）
+registry.gauge(
+    "unreplied_comments_backlog", "预热快照中的未回复评论数"
+).set_function(_unreplied_backlog)
+registry.gauge(
+    "comment_snapshot_age_seconds", "未回复评论快照的年龄（秒）"
+).set_function(_snapshot_age)
+registry.gauge(
+    "scheduler_running", "Dify 定时调度器是否在本进程运行（1 / 0）"
+).set_function(lambda: 1 if dify_service.scheduler_running else 0)
+registry.gauge(
+    "leader", "本进程是否为 leader（1 / 0）"
+).set_function(lambda: 1 if leader_elector.is_leader else 0)
+registry.gauge(
+    "reply_outbox_jobs", "回复发件箱中各状态的任务数", ("status",)
+).set_function(_outbox_jobs)
+registry.gauge(
+    "pipeline_queue_depth", "回复流水线各阶段队列中等待的评论数", ("stage",)
+).set_function(_pipeline_queues)
+registry.gauge(
+    "pipeline_inflight_comments", "回复流水线中正在处理的评论数"
+).set_function(lambda: reply_pipeline.inflight if reply_pipeline.running else None)
+
+
+@router.get("/metrics")
+async def metrics():
+    """
+    Prometheus 文本格式的指标
+
+    包括 B站接口和 Dify 运行耗时直方图、回复结果计数、未回复积压和快照年龄、调度器状态以及各路由的请求耗时
+    """
+    # 部分仪表（如发件箱任务数）需要查询 SQLite，在线程中渲染，避免阻塞事件循环
+    return Response(content=await asyncio.to_thread(registry.render), media_type=CONTENT_TYPE)
@@ -0,0 +1,53 @@
+"""
+回复流水线API路由
+"""
+from typing import Optional
+from fastapi import APIRouter, HTTPException, Query
+
+from app.leader import leader_elector
+from app.pipeline.generators import GENERATORS
+from app.pipeline.runner import reply_pipeline
+
+router = APIRouter()
+
+
+@router.post("/start")
+async def start_pipeline(generator: Optional[str] = Query(default=None, pattern=f"^({'|'.join(GENERATORS)})$")):
+    """
+    启动进程内回复流水线
+
+    Args:
+        generator: 回复生成器 dify / openai / template，默认使用配置 PIPELINE_GENERATOR
+    """
+    if not leader_elector.is_leader:
+        leader = leader_elector.status()
+        raise HTTPException(
+            status_code=409,
+            detail=f"当前进程 {leader['pid']} 不是 leader，流水线由进程 {leader['leader_pid']} 运行"
+        )
+    try:
+        success = reply_pipeline.start(generator)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"启动流水线失败: {str(e)}")
+    if not success:
+        raise HTTPException(status_code=400, detail="流水线已经在运行中")
+    return {"success": True, "message": "流水线已启动", "status": reply_pipeline.status()}
+
+
+@router.post("/stop")
+async def stop_pipeline(timeout: float = Query(default=10, ge=0, le=300)):
+    """
+    停止回复流水线，最多等待 timeout 秒让已认领的评论处理完，其余评论释放认领
+    """
+    if not reply_pipeline.running:
+        raise HTTPException(status_code=400, detail="流水线未在运行")
+    await reply_pipeline.stop(timeout=timeout)
+    return {"success": True, "message": "流水线已停止", "status": reply_pipeline.status()}
+
+
+@router.get("/status")
+async def get_pipeline_status():
+    """
+    回复流水线状态：各阶段队列长度、在途评论数和累计处理结果
+    """
+    return reply_pipeline.status()
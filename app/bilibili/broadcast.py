@@ -0,0 +1,124 @@
+"""
+新评论广播 - 将新出现的未回复评论推送给所有订阅者
+"""
+import asyncio
+import logging
+from collections import OrderedDict
+from typing import Iterable, List, Optional
+
+from app.config import COMMENT_STREAM_QUEUE_SIZE, COMMENT_STREAM_SLOW_POLICY
+from app.models import CommentInfo
+
+logger = logging.getLogger(__name__)
+
+# 记住已推送评论的数量上限，超出后淘汰最早的记录
+SEEN_LIMIT = 10000
+
+
+class Subscriber:
+    """
+    单个订阅者，持有一个有界队列
+
+    队列满时按策略处理：drop 丢弃最旧的一条再放入新评论，disconnect 直接断开该订阅者。
+    """
+
+    def __init__(self, maxsize: int = COMMENT_STREAM_QUEUE_SIZE, policy: str = COMMENT_STREAM_SLOW_POLICY):
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=maxsize)
+        self.policy = policy
+        self.closed = False
+        self.dropped = 0
+
+    def offer(self, item: CommentInfo) -> None:
+        """非阻塞地放入一条评论，慢消费者不会拖慢广播方"""
+        if self.closed:
+            return
+        if self.queue.full():
+            if self.policy == "disconnect":
+                logger.warning("订阅者消费过慢，已断开")
+                self.close()
+                return
+            self.queue.get_nowait()
+            self.dropped += 1
+        self.queue.put_nowait(item)
+
+    def close(self) -> None:
+        """关闭订阅者，清空队列并放入结束标记"""
+        if self.closed:
+            return
+        self.closed = True
+        while not self.queue.empty():
+            self.queue.get_nowait()
+        self.queue.put_nowait(None)
+
+    async def get(self) -> Optional[CommentInfo]:
+        """获取下一条评论，订阅者被关闭时返回 None"""
+        return await self.queue.get()
+
+
+class CommentBroadcaster:
+    """
+    评论广播器
+
+    每条未回复评论只推送一次：publish 会跳过已经推送过的 rpid。
+    """
+
+    def __init__(self):
+        self._subscribers: List[Subscriber] = []
+        self._seen: "OrderedDict[int, None]" = OrderedDict()
+
+    @property
+    def subscriber_count(self) -> int:
+        return len(self._subscribers)
+
+    def subscribe(self, backlog: Iterable[CommentInfo] = ()) -> Subscriber:
+        """
+        新增订阅者
+
+        Args:
+            backlog: 订阅时先放入队列的评论（例如当前快照中的未回复评论）
+        """
+        subscriber = Subscriber()
+        for item in backlog:
+            subscriber.offer(item)
+        self._subscribers.append(subscriber)
+        return subscriber
+
+    def unsubscribe(self, subscriber: Subscriber) -> None:
+        """移除订阅者"""
+        subscriber.close()
+        if subscriber in self._subscribers:
+            self._subscribers.remove(subscriber)
+
+    def publish(self, comments: Iterable[CommentInfo]) -> int:
+        """
+        推送新出现的评论
+
+        Returns:
+            int: 本次实际推送的评论数
+        """
+        fresh = []
+        for item in comments:
+            if item.rpid in self._seen:
+                continue
+            self._seen[item.rpid] = None
+            fresh.append(item)
+        while len(self._seen) > SEEN_LIMIT:
+            self._seen.popitem(last=False)
+
+        if fresh and self._subscribers:
+            for subscriber in list(self._subscribers):
+                for item in fresh:
+                    subscriber.offer(item)
+                if subscriber.closed:
+                    self._subscribers.remove(subscriber)
+        return len(fresh)
+
+    def close_all(self) -> None:
+        """关闭所有订阅者（应用关闭时调用）"""
+        for subscriber in self._subscribers:
+            subscriber.close()
+        self._subscribers.clear()
+
+
+# 全局广播器实例
+comment_broadcaster = CommentBroadcaster()
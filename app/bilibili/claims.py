@@ -0,0 +1,111 @@
+"""
+评论认领租约 - 并发消费者各自领取互不重叠的未回复评论
+"""
+import sqlite3
+import threading
+import time
+import uuid
+from typing import Iterable, List, Optional, Tuple
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS comment_claims (
+    rpid INTEGER PRIMARY KEY,
+    lease_id TEXT NOT NULL,
+    consumer TEXT,
+    claimed_at REAL NOT NULL,
+    expires_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_comment_claims_lease ON comment_claims(lease_id);
+CREATE INDEX IF NOT EXISTS idx_comment_claims_expires_at ON comment_claims(expires_at);
+"""
+
+
+class ClaimStore:
+    """
+    认领记录
+
+    每条被认领的评论对应一条记录，租约到期前不会再分配给其他消费者；
+    回复成功后释放对应记录，到期未回复的评论在下一次认领时重新分配。
+    认领在 BEGIN IMMEDIATE 事务中完成，多个 worker 进程共享同一数据库文件时同样互斥。
+    方法都是同步的（可能等待其他进程的写锁），在事件循环中应通过 asyncio.to_thread 调用。
+    """
+
+    def __init__(self, path: str):
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, timeout=5, isolation_level=None, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(SCHEMA)
+
+    def close(self) -> None:
+        """关闭数据库连接"""
+        with self._lock:
+            self._conn.close()
+
+    def claim(self, candidates: Iterable[int], limit: Optional[int], lease_seconds: float,
+              consumer: Optional[str] = None) -> Tuple[str, float, List[int]]:
+        """
+        从候选评论中按顺序认领最多 limit 条未被他人持有的评论
+
+        Returns:
+            Tuple[str, float, List[int]]: (租约ID, 到期时间戳, 认领到的 rpid 列表)
+        """
+        now = time.time()
+        lease_id = uuid.uuid4().hex
+        expires_at = now + lease_seconds
+        claimed: List[int] = []
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                self._conn.execute("DELETE FROM comment_claims WHERE expires_at < ?", (now,))
+                held = {row[0] for row in self._conn.execute("SELECT rpid FROM comment_claims")}
+                for rpid in candidates:
+                    if limit is not None and len(claimed) >= limit:
+                        break
+                    if rpid in held:
+                        continue
+                    held.add(rpid)
+                    claimed.append(rpid)
+                self._conn.executemany(
+                    "INSERT INTO comment_claims (rpid, lease_id, consumer, claimed_at, expires_at) "
+                    "VALUES (?, ?, ?, ?, ?)",
+                    [(rpid, lease_id, consumer, now, expires_at) for rpid in claimed]
+                )
+                self._conn.execute("COMMIT")
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+        return lease_id, expires_at, claimed
+
+    def release(self, rpids: Iterable[int]) -> int:
+        """释放指定评论的认领（通常在回复成功后调用）"""
+        rows = [(rpid,) for rpid in rpids]
+        if not rows:
+            return 0
+        with self._lock:
+            cursor = self._conn.executemany("DELETE FROM comment_claims WHERE rpid = ?", rows)
+        return cursor.rowcount
+
+    def release_lease(self, lease_id: str) -> int:
+        """释放整个租约，未回复的评论可以立即被重新认领"""
+        with self._lock:
+            cursor = self._conn.execute("DELETE FROM comment_claims WHERE lease_id = ?", (lease_id,))
+        return cursor.rowcount
+
+    def renew_lease(self, lease_id: str, lease_seconds: float) -> int:
+        """延长租约中仍然有效的认领，返回续期的评论数（已过期的认领可能已被其他消费者认领，不再续期）"""
+        now = time.time()
+        with self._lock:
+            cursor = self._conn.execute(
+                "UPDATE comment_claims SET expires_at = ? WHERE lease_id = ? AND expires_at >= ?",
+                (now + lease_seconds, lease_id, now)
+            )
+        return cursor.rowcount
+
+    def count_active(self) -> int:
+        """当前有效的认领数"""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT COUNT(*) FROM comment_claims WHERE expires_at >= ?", (time.time(),)
+            ).fetchone()
+        return row[0]
@@ -0,0 +1,147 @@
+"""
+回复幂等记录 - 持久化已完成和进行中的回复，重复请求直接返回首次结果
+"""
+import hashlib
+import sqlite3
+import threading
+import time
+from typing import Optional, Tuple
+
+from app.models import ReplyResponse
+
+STATUS_IN_FLIGHT = "in_flight"
+STATUS_COMPLETED = "completed"
+# 发送结果未知（例如读超时，回复可能已经发出），保留到 ttl 到期，期间不再自动发送
+STATUS_UNKNOWN = "unknown"
+# 不写入记录，表示幂等键已被内容不同的回复占用
+STATUS_CONFLICT = "conflict"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS reply_ledger (
+    key TEXT PRIMARY KEY,
+    rpid INTEGER,
+    message_hash TEXT,
+    status TEXT NOT NULL,
+    response TEXT,
+    updated_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_reply_ledger_updated_at ON reply_ledger(updated_at);
+"""
+
+# 两次淘汰过期记录之间的最小间隔（秒）
+EVICT_INTERVAL = 60
+
+
+def message_hash(message: str) -> str:
+    """回复内容的摘要"""
+    return hashlib.blake2b(message.encode("utf-8"), digest_size=8).hexdigest()
+
+
+class ReplyLedger:
+    """
+    回复幂等记录
+
+    每个幂等键对应一条记录：发送前写入 in_flight，成功后写入 completed 和原始响应，
+    确定未发出的失败删除记录以便重试，结果未知时写入 unknown 不再自动发送。completed 和 unknown 记录在 ttl 秒后淘汰；
+    in_flight 记录超过 inflight_timeout 秒仍未完成时视为进程中断遗留，允许重新发送。
+    记录保存回复内容的摘要，同一幂等键携带不同内容的请求视为冲突，既不发送也不返回首次结果。
+    占用在 BEGIN IMMEDIATE 事务中完成，多个 worker 进程共享同一数据库文件时同样互斥。
+    方法都是同步的（可能等待其他进程的写锁），在事件循环中应通过 asyncio.to_thread 调用。
+    """
+
+    def __init__(self, path: str, ttl: float, inflight_timeout: float):
+        self.ttl = ttl
+        self.inflight_timeout = inflight_timeout
+        self._lock = threading.Lock()
+        self._last_evict = 0.0
+        self._conn = sqlite3.connect(path, timeout=5, isolation_level=None, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(SCHEMA)
+
+    def close(self) -> None:
+        """关闭数据库连接"""
+        with self._lock:
+            self._conn.close()
+
+    def begin(self, key: str, rpid: int, message: str) -> Tuple[bool, Optional[str], Optional[ReplyResponse]]:
+        """
+        尝试占用幂等键
+
+        Returns:
+            Tuple[bool, Optional[str], Optional[ReplyResponse]]:
+                (是否占用成功, 已存在记录的状态, 已完成记录的原始响应)；
+                幂等键已被不同内容的回复占用时状态为 STATUS_CONFLICT
+        """
+        digest = message_hash(message)
+        now = time.time()
+        self._maybe_evict(now)
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                row = self._conn.execute(
+                    "SELECT status, response, updated_at, message_hash FROM reply_ledger WHERE key = ?", (key,)
+                ).fetchone()
+                held = row is not None and (
+                    (row[0] in (STATUS_COMPLETED, STATUS_UNKNOWN) and now - row[2] < self.ttl)
+                    or (row[0] == STATUS_IN_FLIGHT and now - row[2] < self.inflight_timeout)
+                )
+                if not held:
+                    self._conn.execute(
+                        "INSERT OR REPLACE INTO reply_ledger (key, rpid, message_hash, status, response, updated_at) "
+                        "VALUES (?, ?, ?, ?, NULL, ?)",
+                        (key, rpid, digest, STATUS_IN_FLIGHT, now)
+                    )
+                self._conn.execute("COMMIT")
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+
+        if not held:
+            return True, None, None
+        status, response, _, stored_digest = row
+        if stored_digest is not None and stored_digest != digest:
+            return False, STATUS_CONFLICT, None
+        if status == STATUS_COMPLETED:
+            return False, status, ReplyResponse.model_validate_json(response)
+        return False, status, None
+
+    def complete(self, key: str, response: ReplyResponse) -> None:
+        """记录回复成功及其原始响应"""
+        with self._lock:
+            self._conn.execute(
+                "UPDATE reply_ledger SET status = ?, response = ?, updated_at = ? WHERE key = ?",
+                (STATUS_COMPLETED, response.model_dump_json(), time.time(), key)
+            )
+
+    def mark_unknown(self, key: str) -> None:
+        """回复结果未知时保留幂等键，避免重试时重复发送"""
+        with self._lock:
+            self._conn.execute(
+                "UPDATE reply_ledger SET status = ?, updated_at = ? WHERE key = ? AND status = ?",
+                (STATUS_UNKNOWN, time.time(), key, STATUS_IN_FLIGHT)
+            )
+
+    def release(self, key: str) -> None:
+        """回复失败时释放幂等键，允许之后重试"""
+        with self._lock:
+            self._conn.execute(
+                "DELETE FROM reply_ledger WHERE key = ? AND status = ?", (key, STATUS_IN_FLIGHT)
+            )
+
+    def get_status(self, key: str) -> Optional[str]:
+        """查询幂等键当前的状态，不存在时返回 None"""
+        with self._lock:
+            row = self._conn.execute("SELECT status FROM reply_ledger WHERE key = ?", (key,)).fetchone()
+        return row[0] if row is not None else None
+
+    def _maybe_evict(self, now: float) -> None:
+        """淘汰过期记录"""
+        if now - self._last_evict < EVICT_INTERVAL:
+            return
+        self._last_evict = now
+        with self._lock:
+            self._conn.execute(
+                "DELETE FROM reply_ledger WHERE (status IN (?, ?) AND updated_at < ?) OR (status = ? AND updated_at < ?)",
+                (STATUS_COMPLETED, STATUS_UNKNOWN, now - self.ttl, STATUS_IN_FLIGHT, now - self.inflight_timeout)
+            )
@@ -0,0 +1,218 @@
+"""
+回复发件箱 - 持久化待发送的回复任务，进程重启后继续发送
+"""
+import json
+import sqlite3
+import threading
+import time
+import uuid
+from typing import Any, Dict, Iterable, List, Optional
+
+from app.models import ReplyCommentRequest, ReplyResponse
+
+STATUS_QUEUED = "queued"
+STATUS_SENDING = "sending"
+STATUS_SUCCEEDED = "succeeded"
+STATUS_FAILED = "failed"
+# 仍然有效（会发出或已经发出）的任务状态
+ACTIVE_STATUSES = (STATUS_QUEUED, STATUS_SENDING, STATUS_SUCCEEDED)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS reply_outbox (
+    id TEXT PRIMARY KEY,
+    oid INTEGER NOT NULL,
+    rpid INTEGER NOT NULL,
+    root INTEGER NOT NULL,
+    message TEXT NOT NULL,
+    idempotency_key TEXT NOT NULL,
+    status TEXT NOT NULL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    next_attempt_at REAL NOT NULL,
+    result TEXT,
+    error TEXT,
+    created_at REAL NOT NULL,
+    updated_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_reply_outbox_due ON reply_outbox(status, next_attempt_at);
+CREATE INDEX IF NOT EXISTS idx_reply_outbox_key ON reply_outbox(idempotency_key);
+"""
+
+JOB_FIELDS = ('id', 'oid', 'rpid', 'root', 'message', 'idempotency_key', 'status', 'attempts',
+              'next_attempt_at', 'result', 'error', 'created_at', 'updated_at')
+
+# 两次淘汰已结束任务之间的最小间隔（秒）
+EVICT_INTERVAL = 600
+# 按幂等键批量查询时每条 SQL 的参数个数上限
+QUERY_BATCH = 500
+
+
+class ReplyOutbox:
+    """
+    回复发件箱
+
+    任务状态: queued → sending → succeeded / failed；发送失败且未超过最大尝试次数时回到 queued，
+    在 next_attempt_at 之后重新发送。领取任务在 BEGIN IMMEDIATE 事务中完成，多个进程共享同一数据库文件时
+    同一任务只会被领取一次；进程中断遗留的 sending 任务超过 sending_timeout 秒后重新排队。
+    方法都是同步的（可能等待其他进程的写锁），在事件循环中应通过 asyncio.to_thread 调用。
+    """
+
+    def __init__(self, path: str, sending_timeout: float, retention: float):
+        self.sending_timeout = sending_timeout
+        self.retention = retention
+        self._lock = threading.Lock()
+        self._last_evict = 0.0
+        self._conn = sqlite3.connect(path, timeout=5, isolation_level=None, check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(SCHEMA)
+
+    def close(self) -> None:
+        """关闭数据库连接"""
+        with self._lock:
+            self._conn.close()
+
+    def enqueue(self, request: ReplyCommentRequest) -> Dict[str, Any]:
+        """
+        写入一个回复任务
+
+        同一幂等键已有排队中、发送中或已成功的任务时直接返回该任务，不重复入队
+        """
+        key = request.idempotency_key or str(request.rpid)
+        now = time.time()
+        self._maybe_evict(now)
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                row = self._conn.execute(
+                    "SELECT * FROM reply_outbox WHERE idempotency_key = ? AND status != ? "
+                    "ORDER BY created_at DESC LIMIT 1",
+                    (key, STATUS_FAILED)
+                ).fetchone()
+                if row is None:
+                    job_id = uuid.uuid4().hex
+                    self._conn.execute(
+                        "INSERT INTO reply_outbox (id, oid, rpid, root, message, idempotency_key, status, "
+                        "attempts, next_attempt_at, created_at, updated_at) "
+                        "VALUES (?, ?, ?, ?, ?, ?, ?, 0, ?, ?, ?)",
+                        (job_id, request.oid, request.rpid, request.root, request.message, key,
+                         STATUS_QUEUED, now, now, now)
+                    )
+                    row = self._conn.execute("SELECT * FROM reply_outbox WHERE id = ?", (job_id,)).fetchone()
+                self._conn.execute("COMMIT")
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+        return self._to_job(row)
+
+    def enqueue_many(self, requests: Iterable[ReplyCommentRequest]) -> List[Dict[str, Any]]:
+        """依次写入多个回复任务，返回的任务与请求顺序一致"""
+        return [self.enqueue(request) for request in requests]
+
+    def claim_next(self) -> Optional[Dict[str, Any]]:
+        """领取一个到期的排队任务并标记为发送中，没有可发送的任务时返回 None"""
+        now = time.time()
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                # 进程中断遗留的发送中任务重新排队
+                self._conn.execute(
+                    "UPDATE reply_outbox SET status = ?, next_attempt_at = ? WHERE status = ? AND updated_at < ?",
+                    (STATUS_QUEUED, now, STATUS_SENDING, now - self.sending_timeout)
+                )
+                row = self._conn.execute(
+                    "SELECT * FROM reply_outbox WHERE status = ? AND next_attempt_at <= ? "
+                    "ORDER BY next_attempt_at, created_at LIMIT 1",
+                    (STATUS_QUEUED, now)
+                ).fetchone()
+                if row is not None:
+                    self._conn.execute(
+                        "UPDATE reply_outbox SET status = ?, attempts = attempts + 1, updated_at = ? WHERE id = ?",
+                        (STATUS_SENDING, now, row["id"])
+                    )
+                    row = self._conn.execute("SELECT * FROM reply_outbox WHERE id = ?", (row["id"],)).fetchone()
+                self._conn.execute("COMMIT")
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+        return self._to_job(row) if row is not None else None
+
+    def complete(self, job_id: str, result: ReplyResponse) -> None:
+        """记录发送成功"""
+        self._update(job_id, STATUS_SUCCEEDED, result=result.model_dump_json(), error=None)
+
+    def retry(self, job_id: str, error: str, delay: float) -> None:
+        """发送失败，delay 秒后重新发送"""
+        self._update(job_id, STATUS_QUEUED, error=error, next_attempt_at=time.time() + delay)
+
+    def fail(self, job_id: str, error: str, result: Optional[ReplyResponse] = None) -> None:
+        """发送失败且不再重试"""
+        self._update(job_id, STATUS_FAILED, error=error,
+                     result=result.model_dump_json() if result is not None else None)
+
+    def requeue(self, job_id: str) -> None:
+        """发送被中断（例如进程关闭），立即重新排队并退还本次尝试次数"""
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "UPDATE reply_outbox SET status = ?, attempts = MAX(attempts - 1, 0), next_attempt_at = ?, "
+                "updated_at = ? WHERE id = ? AND status = ?",
+                (STATUS_QUEUED, now, now, job_id, STATUS_SENDING)
+            )
+
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """查询任务"""
+        with self._lock:
+            row = self._conn.execute("SELECT * FROM reply_outbox WHERE id = ?", (job_id,)).fetchone()
+        return self._to_job(row) if row is not None else None
+
+    def latest_statuses(self, keys: Iterable[str]) -> Dict[str, str]:
+        """每个幂等键最近一个任务的状态，没有任务的幂等键不在结果中"""
+        keys = list(keys)
+        statuses: Dict[str, str] = {}
+        with self._lock:
+            for start in range(0, len(keys), QUERY_BATCH):
+                batch = keys[start:start + QUERY_BATCH]
+                rows = self._conn.execute(
+                    f"SELECT idempotency_key, status FROM reply_outbox "
+                    f"WHERE idempotency_key IN ({', '.join('?' * len(batch))}) ORDER BY created_at",
+                    batch
+                ).fetchall()
+                statuses.update({row[0]: row[1] for row in rows})
+        return statuses
+
+    def counts(self) -> Dict[str, int]:
+        """各状态的任务数"""
+        with self._lock:
+            rows = self._conn.execute("SELECT status, COUNT(*) FROM reply_outbox GROUP BY status").fetchall()
+        counts = {status: 0 for status in (STATUS_QUEUED, STATUS_SENDING, STATUS_SUCCEEDED, STATUS_FAILED)}
+        counts.update({row[0]: row[1] for row in rows})
+        return counts
+
+    def _update(self, job_id: str, status: str, **fields: Any) -> None:
+        fields["status"] = status
+        fields["updated_at"] = time.time()
+        assignments = ", ".join(f"{name} = ?" for name in fields)
+        with self._lock:
+            self._conn.execute(
+                f"UPDATE reply_outbox SET {assignments} WHERE id = ?",
+                tuple(fields.values()) + (job_id,)
+            )
+
+    def _maybe_evict(self, now: float) -> None:
+        """定期删除超过保留期的已结束任务"""
+        if now - self._last_evict < EVICT_INTERVAL:
+            return
+        self._last_evict = now
+        with self._lock:
+            self._conn.execute(
+                "DELETE FROM reply_outbox WHERE status IN (?, ?) AND updated_at < ?",
+                (STATUS_SUCCEEDED, STATUS_FAILED, now - self.retention)
+            )
+
+    @staticmethod
+    def _to_job(row: sqlite3.Row) -> Dict[str, Any]:
+        job = {field: row[field] for field in JOB_FIELDS}
+        job["result"] = json.loads(job["result"]) if job["result"] else None
+        return job
+
@@ -0,0 +1,187 @@
+"""
+未回复评论预热轮询器 - 在后台定期拉取评论，维护可直接返回的内存快照
+"""
+import asyncio
+import logging
+import time
+from dataclasses import dataclass
+from typing import Any, Awaitable, Callable, Dict, Iterable, List, Optional
+
+from app.cache import make_etag
+from app.serialization import dumps
+from app.config import COMMENT_POLL_MIN_INTERVAL, COMMENT_POLL_MAX_INTERVAL
+from app.models import CommentInfo, UnrepliedCommentsResponse
+from app.bilibili.service import poll_unreplied_comments
+from app.bilibili.broadcast import comment_broadcaster
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass(frozen=True)
+class UnrepliedSnapshot:
+    """
+    未回复评论快照（不可变），包含已序列化的响应体和 ETag，接口可直接返回
+    """
+    response: UnrepliedCommentsResponse
+    body: bytes
+    etag: str
+    fetched_at: float
+    fetch_duration: float
+
+    @property
+    def age(self) -> float:
+        """快照年龄（秒）"""
+        return time.time() - self.fetched_at
+
+
+class CommentPoller:
+    """
+    评论预热轮询器
+
+    轮询间隔在 [min_interval, max_interval] 之间自适应：出现新的未回复评论时间隔减半，
+    没有变化时逐步放大，拉取失败时加倍退避。每次拉取后，快照中的未回复评论会交给 listeners。
+    默认拉取时把判定为固定回复的评论写入回复发件箱，快照中只保留需要生成回复的评论。
+    """
+
+    def __init__(
+        self,
+        fetch: Callable[[], Awaitable[UnrepliedCommentsResponse]] = poll_unreplied_comments,
+        min_interval: float = COMMENT_POLL_MIN_INTERVAL,
+        max_interval: float = COMMENT_POLL_MAX_INTERVAL,
+        listeners: Iterable[Callable[[List[CommentInfo]], Any]] = ()
+    ):
+        self._fetch = fetch
+        self._listeners = list(listeners)
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.interval = min_interval
+        self.lag = 0.0
+        self.poll_count = 0
+        self.error_count = 0
+        self.last_error: Optional[str] = None
+        self._snapshot: Optional[UnrepliedSnapshot] = None
+        self._task: Optional[asyncio.Task] = None
+        self._wakeup: Optional[asyncio.Event] = None
+        self._next_run: Optional[float] = None
+        self._stopping = False
+
+    @property
+    def snapshot(self) -> Optional[UnrepliedSnapshot]:
+        """当前快照，尚未成功拉取过时为 None"""
+        return self._snapshot
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    def start(self) -> bool:
+        """在当前事件循环中启动后台轮询任务"""
+        if self.running:
+            logger.warning("评论轮询器已经在运行中")
+            return False
+        self._stopping = False
+        self._wakeup = asyncio.Event()
+        self._task = asyncio.create_task(self._run())
+        logger.info("评论轮询器已启动，间隔 %.0f~%.0f 秒", self.min_interval, self.max_interval)
+        return True
+
+    async def stop(self, timeout: float = 0) -> None:
+        """
+        停止后台轮询任务
+
+        Args:
+            timeout: 正在进行的拉取最多等待的时间（秒），超时后取消
+        """
+        if self._task is None:
+            return
+        self._stopping = True
+        self.refresh_soon()
+        if timeout > 0:
+            await asyncio.wait({self._task}, timeout=timeout)
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+        logger.info("评论轮询器已停止")
+
+    def refresh_soon(self) -> None:
+        """唤醒轮询器立即拉取一次（例如刚回复完评论后）"""
+        if self._wakeup is not None:
+            self._wakeup.set()
+
+    async def poll_once(self) -> UnrepliedSnapshot:
+        """拉取一次并替换快照"""
+        started = time.time()
+        response = await self._fetch()
+        body = dumps(response)
+        previous = self._snapshot
+        snapshot = UnrepliedSnapshot(
+            response=response,
+            body=body,
+            etag=make_etag(body),
+            fetched_at=time.time(),
+            fetch_duration=time.time() - started
+        )
+        self._snapshot = snapshot
+        self.poll_count += 1
+        self._adapt(previous, snapshot)
+        for listener in self._listeners:
+            try:
+                listener(response.result)
+            except Exception as e:
+                logger.error("处理评论快照时发生错误: %s", str(e))
+        return snapshot
+
+    def _adapt(self, previous: Optional[UnrepliedSnapshot], current: UnrepliedSnapshot) -> None:
+        """根据新出现的未回复评论调整轮询间隔"""
+        if previous is None:
+            return
+        previous_ids = {item.rpid for item in previous.response.result}
+        if any(item.rpid not in previous_ids for item in current.response.result):
+            self.interval = max(self.min_interval, self.interval / 2)
+        else:
+            self.interval = min(self.max_interval, self.interval * 1.5)
+
+    async def _run(self) -> None:
+        while not self._stopping:
+            # 拉取期间收到的唤醒请求保留到下一轮，避免刚回复的评论要等一整个间隔
+            self._wakeup.clear()
+            try:
+                await self.poll_once()
+                self.last_error = None
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                self.error_count += 1
+                self.last_error = str(e)
+                self.interval = min(self.max_interval, self.interval * 2)
+                logger.error("评论轮询失败，%.0f 秒后重试: %s", self.interval, str(e))
+
+            self._next_run = time.monotonic() + self.interval
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self.interval)
+                self.lag = 0.0
+            except asyncio.TimeoutError:
+                # 事件循环繁忙时，实际唤醒时间会晚于计划时间
+                self.lag = max(0.0, time.monotonic() - self._next_run)
+
+    def status(self) -> Dict[str, Any]:
+        """轮询器状态，包含快照年龄和轮询延迟"""
+        snapshot = self._snapshot
+        return {
+            "running": self.running,
+            "interval": round(self.interval, 3),
+            "lag": round(self.lag, 3),
+            "poll_count": self.poll_count,
+            "error_count": self.error_count,
+            "last_error": self.last_error,
+            "snapshot_age": round(snapshot.age, 3) if snapshot else None,
+            "snapshot_count": snapshot.response.count if snapshot else None,
+            "fetch_duration": round(snapshot.fetch_duration, 3) if snapshot else None
+        }
+
+
+# 全局轮询器实例
+comment_poller = CommentPoller(listeners=[comment_broadcaster.publish])
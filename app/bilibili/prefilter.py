@@ -0,0 +1,321 @@
+"""
+评论预过滤 - 用规则把评论分为跳过、固定回复和需要 LLM 生成三类，减少不必要的生成调用
+"""
+import json
+import logging
+import os
+import re
+import string
+import unicodedata
+from collections import OrderedDict, deque
+from dataclasses import dataclass
+from typing import Any, Dict, Generic, Iterable, List, Optional, Tuple, TypeVar
+
+from app.config import PREFILTER_RULES_FILE
+from app.models import CommentInfo
+from app.metrics import PREFILTER_DECISIONS_TOTAL
+
+logger = logging.getLogger(__name__)
+
+V = TypeVar("V")
+
+ACTION_SKIP = "skip"
+ACTION_CANNED = "canned"
+ACTION_LLM = "llm"
+
+# 记住已判定评论的数量上限，超出后淘汰最早的记录
+DECISION_CACHE_LIMIT = 100000
+
+# B站表情（[呲牙]、[doge]）
+_EMOTE = re.compile(r"\[[^\[\]\s]{1,16}\]")
+# 空白、标点和 emoji 等非文字字符
+_NOISE = re.compile(r"[\W_]+")
+
+DEFAULT_RULES: Dict[str, Any] = {
+    # 这些用户的评论一律跳过（mid）
+    "blocked_users": [],
+    # 命中即跳过的垃圾评论关键词（不区分大小写，任意长度的评论都生效；字母数字只按整词匹配）
+    "spam_keywords": [
+        "加微信", "加vx", "v信", "威信", "私信领取", "免费领取", "兼职", "日结", "刷单", "代刷",
+        "点击链接", "看我主页", "主页有惊喜", "互关", "互粉"
+    ],
+    # 评论（去掉表情和标点后）完全由某条规则的关键词和语气词组成时直接发送固定回复，
+    # 回复可以使用 CommentInfo 的字段，例如 {uname}
+    "canned": [
+        {"keywords": ["谢谢", "感谢", "多谢", "thx", "thanks", "thank you"], "reply": "不客气～感谢{uname}的支持！"},
+        {"keywords": ["支持", "加油", "三连", "好活", "太棒了", "牛"], "reply": "谢谢{uname}的支持！"},
+        {"keywords": ["前排", "第一", "来了", "打卡"], "reply": "欢迎{uname}～"}
+    ],
+    # 可以和固定回复关键词一起出现的称呼和语气词，例如 "谢谢up主"、"支持支持啦"
+    "canned_fillers": ["up主", "up", "大佬", "老师", "啦", "了", "呀", "啊", "哦", "哈", "哇", "嗷", "呢"],
+    # 包含这些内容的评论可能是提问，不发送固定回复
+    "question_markers": ["？", "?", "吗", "怎么", "什么", "几", "为啥", "为什么", "如何", "哪"],
+    # 固定回复只用于去掉表情和标点后不超过该长度的评论
+    "canned_max_length": 8,
+    # 只有表情的评论的回复，留空表示跳过
+    "emoji_only_reply": "[打call]",
+    # 去掉表情和标点后短于该长度且未命中固定回复的评论跳过
+    "min_length": 2
+}
+
+
+@dataclass(frozen=True)
+class PrefilterDecision:
+    """预过滤结果：action 为 skip / canned / llm，rule 为命中的规则，canned 时 reply 为回复内容"""
+    action: str
+    rule: str
+    reply: Optional[str] = None
+
+
+LLM_DECISION = PrefilterDecision(ACTION_LLM, "llm")
+# 固定回复发送失败，改为交给 LLM
+CANNED_FAILED_DECISION = PrefilterDecision(ACTION_LLM, "canned_failed")
+
+
+class KeywordMatcher(Generic[V]):
+    """
+    Aho-Corasick 多模式匹配
+
+    所有关键词编译成一个自动机，扫描一遍文本即可判断是否命中任意关键词，耗时与关键词数量无关。
+    以字母或数字开头（结尾）的关键词要求前（后）一个字符不是字母或数字，"加vx" 不会命中 "加vxworks"
+    """
+
+    def __init__(self, keywords: Iterable[Tuple[str, V]]):
+        self._goto: List[Dict[str, int]] = [{}]
+        self._fail: List[int] = [0]
+        # 每个状态结束的全部关键词：(长度, 开头需要词边界, 结尾需要词边界, 值)
+        self._output: List[List[Tuple[int, bool, bool, V]]] = [[]]
+        for keyword, value in keywords:
+            self._add(keyword.lower(), value)
+        self._build()
+
+    def _add(self, keyword: str, value: V) -> None:
+        if not keyword:
+            return
+        state = 0
+        for char in keyword:
+            next_state = self._goto[state].get(char)
+            if next_state is None:
+                next_state = len(self._goto)
+                self._goto[state][char] = next_state
+                self._goto.append({})
+                self._fail.append(0)
+                self._output.append([])
+            state = next_state
+        if not self._output[state]:
+            self._output[state] = [(len(keyword), _is_latin(keyword[0]), _is_latin(keyword[-1]), value)]
+
+    def _build(self) -> None:
+        """按广度优先计算失败指针，并把后缀关键词的输出合并到当前状态"""
+        queue = deque(self._goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for char, next_state in self._goto[state].items():
+                queue.append(next_state)
+                fail = self._fail[state]
+                while fail and char not in self._goto[fail]:
+                    fail = self._fail[fail]
+                self._fail[next_state] = self._goto[fail].get(char, 0)
+                self._output[next_state] = self._output[next_state] + self._output[self._fail[next_state]]
+
+    def search(self, text: str) -> Optional[V]:
+        """返回文本中最先出现的关键词对应的值，未命中时返回 None（text 需已转为小写）"""
+        goto, fail, output = self._goto, self._fail, self._output
+        state = 0
+        for end, char in enumerate(text):
+            while state and char not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(char, 0)
+            for length, check_start, check_end, value in output[state]:
+                start = end - length + 1
+                if check_start and start > 0 and _is_latin(text[start - 1]):
+                    continue
+                if check_end and end + 1 < len(text) and _is_latin(text[end + 1]):
+                    continue
+                return value
+        return None
+
+
+def _is_latin(char: str) -> bool:
+    return char.isascii() and char.isalnum()
+
+
+def _check_template(template: str) -> None:
+    """固定回复模板只能引用 CommentInfo 的字段"""
+    try:
+        fields = [field for _, field, _, _ in string.Formatter().parse(template) if field is not None]
+    except ValueError as e:
+        raise ValueError(f"固定回复模板 {template!r} 格式错误: {e}") from e
+    for field in fields:
+        name = re.split(r"[.\[]", field, maxsplit=1)[0]
+        if name not in CommentInfo.model_fields:
+            raise ValueError(f"固定回复模板 {template!r} 引用了未知字段 {{{field}}}，"
+                             f"可用字段: {', '.join(CommentInfo.model_fields)}")
+
+
+def _has_emoji(text: str) -> bool:
+    return bool(_EMOTE.search(text)) or any(unicodedata.category(char) == "So" for char in text)
+
+
+class CommentPrefilter:
+    """
+    评论预过滤器
+
+    依次检查：用户黑名单 → 垃圾关键词 → 纯表情 → 固定回复 → 过短，都未命中时交给 LLM。
+    固定回复只用于整句由关键词和语气词组成的短评论，带有提问的评论一律交给 LLM。
+    同一条评论只判定一次（按 rpid 缓存），命中率按评论去重统计。
+    """
+
+    def __init__(self, rules: Optional[Dict[str, Any]] = None):
+        rules = {**DEFAULT_RULES, **(rules or {})}
+        self.blocked_users = {str(mid) for mid in rules["blocked_users"]}
+        self.canned_max_length = int(rules["canned_max_length"])
+        self.emoji_only_reply = rules["emoji_only_reply"] or None
+        self.min_length = int(rules["min_length"])
+        self._spam = KeywordMatcher((keyword, True) for keyword in rules["spam_keywords"])
+        self._question = KeywordMatcher((marker, True) for marker in rules["question_markers"])
+        self._canned = self._compile_canned(rules["canned"], rules["canned_fillers"])
+        self._decisions: "OrderedDict[int, PrefilterDecision]" = OrderedDict()
+        self.counts: Dict[Tuple[str, str], int] = {}
+
+    @staticmethod
+    def _compile_canned(canned: List[Dict[str, Any]], fillers: List[str]) -> List[Tuple["re.Pattern", str]]:
+        """
+        每条固定回复规则编译为一个整句匹配的正则：评论只能由该规则的关键词和语气词组成，且至少包含一个关键词
+        """
+        def alternation(words: Iterable[str]) -> str:
+            words = {_NOISE.sub("", word.lower()) for word in words} - {""}
+            return "|".join(re.escape(word) for word in sorted(words, key=len, reverse=True))
+
+        filler = alternation(fillers) or "(?!)"
+        compiled = []
+        for rule in canned:
+            _check_template(rule["reply"])
+            keyword = alternation(rule["keywords"])
+            if keyword:
+                pattern = re.compile(f"(?:{filler})*(?:{keyword})(?:{keyword}|{filler})*")
+                compiled.append((pattern, rule["reply"]))
+        return compiled
+
+    def _match_canned(self, core: str) -> Optional[str]:
+        for pattern, reply in self._canned:
+            if pattern.fullmatch(core):
+                return reply
+        return None
+
+    def classify(self, comment: CommentInfo) -> PrefilterDecision:
+        """判定单条评论（不缓存、不计数）"""
+        if comment.mid in self.blocked_users:
+            return PrefilterDecision(ACTION_SKIP, "blocked_user")
+        text = comment.content.lower()
+        if self._spam.search(text):
+            return PrefilterDecision(ACTION_SKIP, "spam")
+
+        core = _NOISE.sub("", _EMOTE.sub("", text))
+        # 提问交给 LLM 认真回答，不发送固定回复
+        question = self._question.search(_EMOTE.sub("", text)) is not None
+        if not core:
+            if self.emoji_only_reply and not question and _has_emoji(text):
+                return PrefilterDecision(ACTION_CANNED, "emoji_only", self.emoji_only_reply)
+            return PrefilterDecision(ACTION_SKIP, "empty")
+        if len(core) <= self.canned_max_length and not question:
+            reply = self._match_canned(core)
+            if reply is not None:
+                try:
+                    return PrefilterDecision(ACTION_CANNED, "keyword", reply.format(**comment.model_dump()))
+                except (KeyError, IndexError, AttributeError, ValueError) as e:
+                    logger.warning("固定回复模板 %r 格式化失败，评论 %s 交给 LLM: %s", reply, comment.rpid, str(e))
+        if len(core) < self.min_length:
+            return PrefilterDecision(ACTION_SKIP, "too_short")
+        return LLM_DECISION
+
+    def apply(self, comments: Iterable[CommentInfo]) -> Tuple[List[CommentInfo], List[Tuple[CommentInfo, PrefilterDecision]]]:
+        """
+        预过滤一批评论
+
+        Returns:
+            (需要 LLM 生成的评论, 判定为固定回复的评论及其判定结果)；跳过的评论不出现在结果中
+        """
+        keep: List[CommentInfo] = []
+        canned: List[Tuple[CommentInfo, PrefilterDecision]] = []
+        decisions = self._decisions
+        for comment in comments:
+            decision = decisions.get(comment.rpid)
+            if decision is None:
+                decision = self.classify(comment)
+                decisions[comment.rpid] = decision
+                key = (decision.action, decision.rule)
+                self.counts[key] = self.counts.get(key, 0) + 1
+                PREFILTER_DECISIONS_TOTAL.inc(*key)
+                if decision.action == ACTION_SKIP:
+                    logger.debug("预过滤跳过评论 %s（%s）: %s", comment.rpid, decision.rule, comment.content)
+            if decision.action == ACTION_LLM:
+                keep.append(comment)
+            elif decision.action == ACTION_CANNED:
+                canned.append((comment, decision))
+        while len(decisions) > DECISION_CACHE_LIMIT:
+            decisions.popitem(last=False)
+        return keep, canned
+
+    def forget(self, rpid: int) -> None:
+        """丢弃已缓存的判定结果，下次遇到这条评论时重新判定"""
+        self._decisions.pop(rpid, None)
+
+    def demote(self, rpid: int) -> bool:
+        """
+        固定回复发送失败后改为交给 LLM，之后不再为这条评论使用固定回复
+
+        Returns:
+            bool: 这条评论之前是否判定为固定回复
+        """
+        previous = self._decisions.get(rpid)
+        if previous is None or previous.action != ACTION_CANNED:
+            return False
+        self._decisions[rpid] = CANNED_FAILED_DECISION
+        old_key = (previous.action, previous.rule)
+        self.counts[old_key] = max(0, self.counts.get(old_key, 0) - 1)
+        new_key = (ACTION_LLM, CANNED_FAILED_DECISION.rule)
+        self.counts[new_key] = self.counts.get(new_key, 0) + 1
+        PREFILTER_DECISIONS_TOTAL.inc(*new_key)
+        logger.info("评论 %s 的固定回复发送失败，改为交给 LLM", rpid)
+        return True
+
+    def status(self) -> Dict[str, Any]:
+        """判定统计：各结果的评论数、命中率和节省的 LLM 调用数"""
+        total = sum(self.counts.values())
+        by_action: Dict[str, int] = {}
+        for (action, _), count in self.counts.items():
+            by_action[action] = by_action.get(action, 0) + count
+        saved = by_action.get(ACTION_SKIP, 0) + by_action.get(ACTION_CANNED, 0)
+        return {
+            "total": total,
+            "actions": by_action,
+            "rules": {f"{action}:{rule}": count for (action, rule), count in sorted(self.counts.items())},
+            "llm_calls_saved": saved,
+            "hit_rate": round(saved / total, 4) if total else 0.0
+        }
+
+
+def load_rules(path: str = PREFILTER_RULES_FILE) -> Dict[str, Any]:
+    """读取规则文件（JSON），文件中的字段覆盖默认规则；文件不存在时使用默认规则"""
+    if not path or not os.path.exists(path):
+        return {}
+    try:
+        with open(path, encoding="utf-8") as f:
+            return json.load(f)
+    except Exception as e:
+        logger.error("读取预过滤规则 %s 失败，使用默认规则: %s", path, str(e))
+        return {}
+
+
+def create_prefilter(path: str = PREFILTER_RULES_FILE) -> CommentPrefilter:
+    """按规则文件创建预过滤器，规则无效时记录错误并使用默认规则"""
+    try:
+        return CommentPrefilter(load_rules(path))
+    except Exception as e:
+        logger.error("预过滤规则 %s 无效，使用默认规则: %s", path, str(e))
+        return CommentPrefilter()
+
+
+# 全局预过滤器
+comment_prefilter = create_prefilter()
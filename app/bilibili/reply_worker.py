@@ -0,0 +1,180 @@
+"""
+回复发件箱 worker - 后台从发件箱领取任务并发送回复
+"""
+import asyncio
+import logging
+from typing import Any, Callable, Dict, List, Optional
+
+from app.config import (
+    OUTBOX_WORKERS,
+    OUTBOX_POLL_INTERVAL,
+    OUTBOX_MAX_ATTEMPTS,
+    OUTBOX_RETRY_BASE_DELAY,
+    OUTBOX_RETRY_MAX_DELAY
+)
+from app.models import ReplyResponse
+from app.bilibili.idempotency import STATUS_UNKNOWN
+from app.bilibili.service import get_reply_ledger, get_reply_outbox, reply_to_comment
+from app.resilience import backoff_delay
+
+logger = logging.getLogger(__name__)
+
+
+class ReplyWorkerPool:
+    """
+    发件箱 worker 池
+
+    每个 worker 循环领取到期任务并通过 reply_to_comment 发送（共享回复限流、并发上限和幂等记录）。
+    发送失败时按指数退避重新排队，超过 max_attempts 次后标记为失败，幂等键冲突、结果未知等不可重试的失败直接标记为失败；
+    停止时正在发送的任务会先等待完成，超时后被取消：请求尚未发出的任务重新排队，重启后继续发送；
+    请求可能已经发出的任务标记为失败（幂等键保留为 unknown），不会在重启后重复发送。
+    """
+
+    def __init__(self, workers: int = OUTBOX_WORKERS, poll_interval: float = OUTBOX_POLL_INTERVAL,
+                 max_attempts: int = OUTBOX_MAX_ATTEMPTS):
+        self.workers = max(1, workers)
+        self.poll_interval = poll_interval
+        self.max_attempts = max(1, max_attempts)
+        self.sent = 0
+        self.failed = 0
+        self.retried = 0
+        self._listeners: List[Callable[[ReplyResponse], Any]] = []
+        self._failure_listeners: List[Callable[[Dict[str, Any], ReplyResponse], Any]] = []
+        self._tasks: List[asyncio.Task] = []
+        self._wakeup: Optional[asyncio.Event] = None
+        self._stopping = False
+
+    @property
+    def running(self) -> bool:
+        return any(not task.done() for task in self._tasks)
+
+    def on_success(self, listener: Callable[[ReplyResponse], Any]) -> None:
+        """注册回复发送成功后的回调"""
+        self._listeners.append(listener)
+
+    def on_failure(self, listener: Callable[[Dict[str, Any], ReplyResponse], Any]) -> None:
+        """注册回复任务最终失败（不再重试）后的回调，参数为任务和最后一次的结果"""
+        self._failure_listeners.append(listener)
+
+    def start(self) -> bool:
+        """在当前事件循环中启动 worker"""
+        if self.running:
+            logger.warning("回复发件箱 worker 已经在运行中")
+            return False
+        self._stopping = False
+        self._wakeup = asyncio.Event()
+        self._tasks = [asyncio.create_task(self._run(index)) for index in range(self.workers)]
+        logger.info("回复发件箱 worker 已启动（%d 个）", self.workers)
+        return True
+
+    async def stop(self, timeout: float = 10) -> None:
+        """停止 worker：不再领取新任务，等待正在发送的任务最多 timeout 秒"""
+        if not self._tasks:
+            return
+        self._stopping = True
+        self.notify()
+        done, pending = await asyncio.wait(self._tasks, timeout=timeout)
+        for task in pending:
+            task.cancel()
+        if pending:
+            await asyncio.gather(*pending, return_exceptions=True)
+            logger.warning("%d 个回复任务未在 %.0f 秒内完成，已取消", len(pending), timeout)
+        self._tasks = []
+        logger.info("回复发件箱 worker 已停止")
+
+    def notify(self) -> None:
+        """有新任务入队时唤醒空闲的 worker"""
+        if self._wakeup is not None:
+            self._wakeup.set()
+
+    async def _run(self, index: int) -> None:
+        outbox = get_reply_outbox()
+        while not self._stopping:
+            try:
+                job = await asyncio.to_thread(outbox.claim_next)
+            except Exception as e:
+                logger.error("领取回复任务失败: %s", str(e))
+                job = None
+            if job is None:
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout=self.poll_interval)
+                except asyncio.TimeoutError:
+                    pass
+                if not self._stopping:
+                    self._wakeup.clear()
+                continue
+            await self._process(outbox, job)
+
+    async def _process(self, outbox, job: Dict[str, Any]) -> None:
+        try:
+            result = await reply_to_comment(
+                job["oid"], job["rpid"], job["message"], job["root"], job["idempotency_key"]
+            )
+        except asyncio.CancelledError:
+            await self._interrupted(outbox, job)
+            raise
+        except Exception as e:
+            result = ReplyResponse(success=False, message=f"回复评论时发生错误: {str(e)}")
+
+        if result.success:
+            await asyncio.to_thread(outbox.complete, job["id"], result)
+            self.sent += 1
+            for listener in self._listeners:
+                try:
+                    listener(result)
+                except Exception as e:
+                    logger.warning("回复成功回调执行失败: %s", str(e))
+        elif not result.retryable:
+            # 幂等键冲突或结果未知，重试也不会成功
+            await asyncio.to_thread(outbox.fail, job["id"], result.message, result)
+            self.failed += 1
+            logger.error("回复任务 %s 发送失败且不可重试: %s", job["id"], result.message)
+            self._notify_failure(job, result)
+        elif job["attempts"] >= self.max_attempts:
+            await asyncio.to_thread(outbox.fail, job["id"], result.message, result)
+            self.failed += 1
+            logger.error("回复任务 %s 发送 %d 次均失败: %s", job["id"], job["attempts"], result.message)
+            self._notify_failure(job, result)
+        else:
+            delay = backoff_delay(job["attempts"] - 1, base=OUTBOX_RETRY_BASE_DELAY, cap=OUTBOX_RETRY_MAX_DELAY)
+            await asyncio.to_thread(outbox.retry, job["id"], result.message, delay)
+            self.retried += 1
+            logger.warning("回复任务 %s 第 %d 次发送失败，%.1f 秒后重试: %s",
+                           job["id"], job["attempts"], delay, result.message)
+
+    def _notify_failure(self, job: Dict[str, Any], result: ReplyResponse) -> None:
+        for listener in self._failure_listeners:
+            try:
+                listener(job, result)
+            except Exception as e:
+                logger.warning("回复失败回调执行失败: %s", str(e))
+
+    async def _interrupted(self, outbox, job: Dict[str, Any]) -> None:
+        """发送被取消：请求可能已经发出时标记为失败，否则重新排队"""
+        try:
+            status = await asyncio.to_thread(get_reply_ledger().get_status, job["idempotency_key"])
+        except Exception as e:
+            logger.error("查询回复任务 %s 的幂等记录失败: %s", job["id"], str(e))
+            status = STATUS_UNKNOWN
+        if status == STATUS_UNKNOWN:
+            await asyncio.to_thread(outbox.fail, job["id"], "发送过程中被取消，回复可能已经发出，不会自动重试")
+            self.failed += 1
+            logger.error("回复任务 %s 在发送过程中被取消，结果未知，已标记为失败", job["id"])
+        else:
+            await asyncio.to_thread(outbox.requeue, job["id"])
+            logger.warning("回复任务 %s 在发送前被取消，已重新排队", job["id"])
+
+    def status(self) -> Dict[str, Any]:
+        """worker 运行状态和发件箱各状态任务数"""
+        return {
+            "running": self.running,
+            "workers": self.workers,
+            "sent": self.sent,
+            "failed": self.failed,
+            "retried": self.retried,
+            "jobs": get_reply_outbox().counts()
+        }
+
+
+# 全局发件箱 worker 池
+reply_worker_pool = ReplyWorkerPool()
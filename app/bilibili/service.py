@@ -1,85 +1,475 @@
 """
 Bilibili API 服务 - 处理与B站相关的所有业务逻辑
 """
+import asyncio
 import logging
+import time
+from typing import Any, Dict, List, Optional, Set, Tuple
+import httpx
 from bilibili_api import creative_center, comment, Credential
-from app.config import BILIBILI_SESSDATA, BILIBILI_BILI_JCT, BILIBILI_MID
-from app.models import CommentInfo, UnrepliedCommentsResponse, ReplyResponse
+from bilibili_api.exceptions import NetworkException, ResponseCodeException
+from app.config import (
+    BILIBILI_SESSDATA,
+    BILIBILI_BILI_JCT,
+    BILIBILI_MID,
+    COMMENT_PAGE_SIZE,
+    COMMENT_MAX_PAGES,
+    COMMENT_FETCH_CONCURRENCY,
+    COMMENT_MAX_AGE_HOURS,
+    COMMENT_STORE_PATH,
+    REPLY_RATE_PER_SECOND,
+    REPLY_BURST,
+    REPLY_CONCURRENCY,
+    REPLY_IDEMPOTENCY_TTL_HOURS,
+    REPLY_INFLIGHT_TIMEOUT,
+    BILIBILI_MAX_RETRIES,
+    BILIBILI_HEDGE_DELAY,
+    CLAIM_LEASE_SECONDS,
+    OUTBOX_RETENTION_HOURS,
+    PREFILTER_ENABLED
+)
+from app.models import (
+    CommentInfo,
+    UnrepliedCommentsResponse,
+    ClaimCommentsResponse,
+    ReplyCommentRequest,
+    ReplyResponse
+)
+from app.bilibili.detector import detect_unreplied, page_comments
+from app.bilibili.store import CommentStore
+from app.bilibili.idempotency import ReplyLedger, STATUS_CONFLICT, STATUS_UNKNOWN, message_hash
+from app.bilibili.claims import ClaimStore
+from app.bilibili.outbox import ACTIVE_STATUSES, STATUS_FAILED, ReplyOutbox
+from app.bilibili.prefilter import PrefilterDecision, comment_prefilter
+from app.ratelimit import TokenBucket
+from app.resilience import call_with_resilience
+from app.lifecycle import drain_controller
+from app.metrics import BILIBILI_REQUEST_SECONDS, REPLIES_TOTAL
+from app.timing import stage
+from app.serialization import trusted_model
+
+try:
+    from curl_cffi import CurlECode
+    from curl_cffi.requests import exceptions as curl_errors
+except ImportError:  # curl_cffi 是 bilibili_api 默认客户端的依赖，只使用 httpx 客户端时可以不安装
+    CurlECode = curl_errors = None
 
 logger = logging.getLogger(__name__)
 
+# 进程内共享的B站凭据
+_credential: Optional[Credential] = None
+
+# 本地评论存储
+_comment_store: Optional[CommentStore] = None
+
+# 回复幂等记录，以及本进程内正在发送的回复（同一幂等键的并发请求共享结果）
+_reply_ledger: Optional[ReplyLedger] = None
+_inflight_replies: Dict[str, Tuple[asyncio.Future, str]] = {}
+
+# 评论认领租约
+_claim_store: Optional[ClaimStore] = None
+
+# 回复发件箱
+_reply_outbox: Optional[ReplyOutbox] = None
+
+# 所有回复共享的限流器和并发上限，避免突发请求被B站风控
+reply_limiter = TokenBucket(rate=REPLY_RATE_PER_SECOND, burst=REPLY_BURST)
+reply_semaphore = asyncio.Semaphore(max(1, REPLY_CONCURRENCY))
+
+# 表示服务端繁忙或限频的业务错误码，请求未被处理，可以退避后重试
+TRANSIENT_CODES = {-500, -503, -504, -509, -799}
+# 触发风控的错误码，不应立即重试，但说明上游当前不可用，计入熔断
+RISK_CONTROL_CODES = {-352, -412}
+
+
+def _is_curl_transport_error(error: BaseException) -> bool:
+    """curl_cffi 客户端的网络错误（没有收到完整的 HTTP 响应）"""
+    return (curl_errors is not None and isinstance(error, curl_errors.RequestException)
+            and not isinstance(error, curl_errors.HTTPError))
+
+
+def _is_curl_connect_error(error: BaseException) -> bool:
+    """curl_cffi 客户端在建立连接阶段失败，请求没有发出"""
+    if not _is_curl_transport_error(error):
+        return False
+    if isinstance(error, (curl_errors.DNSError, curl_errors.ProxyError, curl_errors.ConnectTimeout)):
+        return True
+    return getattr(error, "code", None) == CurlECode.COULDNT_CONNECT
+
+
+def is_transient_read_error(error: BaseException) -> bool:
+    """读请求（拉取评论）是否值得重试"""
+    if isinstance(error, httpx.TransportError) or _is_curl_transport_error(error):
+        return True
+    if isinstance(error, NetworkException):
+        return error.status == 429 or error.status >= 500
+    if isinstance(error, ResponseCodeException):
+        return error.code in TRANSIENT_CODES
+    return False
+
+
+def is_transient_write_error(error: BaseException) -> bool:
+    """
+    写请求（发送回复）是否值得重试
+
+    只重试能确定请求未被处理的错误（连接失败、限频），读超时等情况下回复可能已经发出
+    """
+    if isinstance(error, (httpx.ConnectError, httpx.ConnectTimeout, httpx.PoolTimeout)) or _is_curl_connect_error(error):
+        return True
+    if isinstance(error, NetworkException):
+        return error.status == 429
+    if isinstance(error, ResponseCodeException):
+        return error.code in TRANSIENT_CODES
+    return False
+
+
+def is_ambiguous_write_error(error: BaseException) -> bool:
+    """写请求失败后无法确定回复是否已经发出（请求已发送但没有收到完整响应）"""
+    transport_error = isinstance(error, httpx.TransportError) or _is_curl_transport_error(error)
+    return transport_error and not is_transient_write_error(error)
+
+
+class ReplyOutcomeUnknown(Exception):
+    """发送回复的结果未知"""
+
+
+class SendProgress:
+    """记录一次回复的请求是否可能已经发出，用于判断被取消时能否释放幂等键"""
+
+    __slots__ = ("maybe_sent",)
+
+    def __init__(self):
+        self.maybe_sent = False
+
+
+def is_upstream_failure(error: BaseException) -> bool:
+    """错误是否说明B站当前不健康（计入熔断）"""
+    if isinstance(error, NetworkException) and error.status == 412:
+        return True
+    if isinstance(error, ResponseCodeException) and error.code in RISK_CONTROL_CODES:
+        return True
+    return is_transient_read_error(error)
+
+
 def analyze_comments(result, mid):
     """
     分析评论数据，找出没有回复的评论
     """
-    comments_list = result.get('list', [])
-    
-    # 存储所有评论信息
-    all_comments = []
-    replies = []  # 我的回复
-    
-    for comment in comments_list:
-        comment_info = {
-            'rpid': comment.get('rpid'),
-            'mid': str(comment.get('mid')),
-            'oid': comment.get('oid'),
-            'root': comment.get('root'),
-            'parent': comment.get('parent'),
-            'content': comment.get('content', {}).get('message', ''),
-            'title': comment.get('title', ''),  # 直接从评论对象获取标题
-            'uname': comment.get('member', {}).get('uname', ''),
-            "bvid": comment.get('bvid', '')
-        }
-        all_comments.append(comment_info)
-        
-        # 如果是我的评论，加入回复列表
-        if str(comment.get('mid')) == mid:
-            replies.append({
-                'root': comment.get('root'),
-                'parent': comment.get('parent')
-            })
-    
-    # 找出没有回复的评论
-    unreplied_comments = []
-    for comment in all_comments:
-        # 跳过我自己的评论
-        if comment['mid'] == mid:
-            continue
-            
-        # 检查是否已经回复过
-        has_reply = False
-        for reply in replies:
-            # 如果回复的 root 是该评论的 rpid，或者 parent 是该评论的 rpid
-            if reply['root'] == comment['rpid'] or reply['parent'] == comment['rpid']:
-                has_reply = True
-                break
-        
-        if not has_reply:
-            unreplied_comments.append(comment)
-    print(f"未回复的评论: {unreplied_comments}")
+    with stage("analyze"):
+        unreplied_comments = detect_unreplied([result], mid)
+    logger.debug("未回复的评论数量: %d", len(unreplied_comments))
     return unreplied_comments
 
 
-async def get_unreplied_comments() -> UnrepliedCommentsResponse:
-    """获取未回复的评论"""
-    try:
-        """获取B站认证凭据"""
-        credential=Credential(
+def get_credential() -> Credential:
+    """获取B站认证凭据（进程内复用同一个实例）"""
+    global _credential
+    if _credential is None:
+        _credential = Credential(
             sessdata=BILIBILI_SESSDATA,
             bili_jct=BILIBILI_BILI_JCT
         )
-        # 获取创作中心评论
-        result = await creative_center.get_comments(credential=credential, order=creative_center.CommentManagerOrder.RECENTLY, ps=20)        
+    return _credential
+
 
+def get_comment_store() -> CommentStore:
+    """获取本地评论存储（首次调用时打开数据库）"""
+    global _comment_store
+    if _comment_store is None:
+        _comment_store = CommentStore(COMMENT_STORE_PATH)
+    return _comment_store
+
+
+def get_comment_arrival_rate(window_minutes: float) -> float:
+    """
+    最近 window_minutes 分钟内他人评论的到达速率（条/小时）
+
+    基于本地评论存储统计，存储由未回复评论查询和后台轮询保持更新
+    """
+    since_ctime = int(time.time() - window_minutes * 60)
+    count = get_comment_store().count_comments_since(since_ctime, exclude_mid=BILIBILI_MID)
+    return count * 60 / window_minutes if window_minutes > 0 else 0.0
+
+
+def get_reply_ledger() -> ReplyLedger:
+    """获取回复幂等记录（与评论存储共用同一个数据库文件）"""
+    global _reply_ledger
+    if _reply_ledger is None:
+        _reply_ledger = ReplyLedger(
+            COMMENT_STORE_PATH,
+            ttl=REPLY_IDEMPOTENCY_TTL_HOURS * 3600,
+            inflight_timeout=REPLY_INFLIGHT_TIMEOUT
+        )
+    return _reply_ledger
+
+
+def get_claim_store() -> ClaimStore:
+    """获取评论认领记录（与评论存储共用同一个数据库文件）"""
+    global _claim_store
+    if _claim_store is None:
+        _claim_store = ClaimStore(COMMENT_STORE_PATH)
+    return _claim_store
+
+
+def get_reply_outbox() -> ReplyOutbox:
+    """获取回复发件箱（与评论存储共用同一个数据库文件）"""
+    global _reply_outbox
+    if _reply_outbox is None:
+        _reply_outbox = ReplyOutbox(
+            COMMENT_STORE_PATH,
+            sending_timeout=REPLY_INFLIGHT_TIMEOUT,
+            retention=OUTBOX_RETENTION_HOURS * 3600
+        )
+    return _reply_outbox
+
+
+def close_comment_store():
+    """关闭本地评论存储，以及共用同一数据库文件的幂等记录、认领记录和发件箱"""
+    global _comment_store, _reply_ledger, _claim_store, _reply_outbox
+    if _comment_store is not None:
+        _comment_store.close()
+        _comment_store = None
+    if _reply_ledger is not None:
+        _reply_ledger.close()
+        _reply_ledger = None
+    if _claim_store is not None:
+        _claim_store.close()
+        _claim_store = None
+    if _reply_outbox is not None:
+        _reply_outbox.close()
+        _reply_outbox = None
+
+
+def _should_stop(page: Dict[str, Any], page_size: int, since_ctime: Optional[int],
+                 known_rpids: Optional[Set[int]]) -> bool:
+    """
+    判断拉取到该页后是否可以停止翻页
+
+    满足以下任一条件即停止：已到最后一页、该页包含早于 since_ctime 的评论、
+    该页包含 known_rpids 中已知的评论。
+    """
+    comments = page_comments(page)
+    if len(comments) < page_size:
+        return True
+    if since_ctime is not None and any((c.get('ctime') or 0) < since_ctime for c in comments):
+        return True
+    if known_rpids and any(c.get('rpid') in known_rpids for c in comments):
+        return True
+    return False
+
+
+async def fetch_comment_pages(
+    credential: Credential,
+    max_pages: int = COMMENT_MAX_PAGES,
+    page_size: int = COMMENT_PAGE_SIZE,
+    concurrency: int = COMMENT_FETCH_CONCURRENCY,
+    since_ctime: Optional[int] = None,
+    known_rpids: Optional[Set[int]] = None,
+    probe_first: bool = False
+) -> List[Dict[str, Any]]:
+    """
+    并发拉取创作中心最近评论的多页数据
+
+    所有页同时创建任务，由信号量限制同时在途的请求数；按页码顺序检查停止条件，
+    一旦满足就取消尚未完成的后续页。
+
+    Args:
+        credential: B站凭据
+        max_pages: 最多拉取的页数
+        page_size: 每页评论数
+        concurrency: 同时在途的最大请求数
+        since_ctime: 遇到早于该时间戳的评论后停止翻页
+        known_rpids: 遇到其中任一评论后停止翻页
+        probe_first: 先单独拉取第一页，未满足停止条件时才并发拉取后续页，
+            适合增量同步这种通常一页即可结束的场景
+
+    Returns:
+        List[Dict]: 按页码顺序排列的原始分页数据
+    """
+    semaphore = asyncio.Semaphore(max(1, concurrency))
+
+    async def fetch_page(pn: int) -> Dict[str, Any]:
+        async with semaphore:
+            page = await call_with_resilience(
+                "bilibili",
+                lambda: BILIBILI_REQUEST_SECONDS.time(
+                    creative_center.get_comments(
+                        credential=credential,
+                        order=creative_center.CommentManagerOrder.RECENTLY,
+                        pn=pn,
+                        ps=page_size
+                    ),
+                    "get_comments"
+                ),
+                retries=BILIBILI_MAX_RETRIES,
+                is_retryable=is_transient_read_error,
+                is_failure=is_upstream_failure,
+                hedge_delay=BILIBILI_HEDGE_DELAY
+            )
         # 检查返回数据是否有效
-        if not isinstance(result, dict) or 'list' not in result:
-            raise Exception(f"API返回数据格式不正确: {result}")
-        
-        # 分析评论数据 - 直接使用返回的数据
-        unreplied_comments = analyze_comments(result, BILIBILI_MID)
+        if not isinstance(page, dict) or 'list' not in page:
+            raise Exception(f"API返回数据格式不正确: {page}")
+        return page
+
+    pages = []
+    first_pn = 1
+    if probe_first:
+        page = await fetch_page(1)
+        pages.append(page)
+        if _should_stop(page, page_size, since_ctime, known_rpids):
+            return pages
+        first_pn = 2
+
+    tasks = [asyncio.create_task(fetch_page(pn)) for pn in range(first_pn, max(1, max_pages) + 1)]
+    try:
+        for task in tasks:
+            page = await task
+            pages.append(page)
+            if _should_stop(page, page_size, since_ctime, known_rpids):
+                break
+    finally:
+        for task in tasks:
+            if not task.done():
+                task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    logger.debug("共拉取评论 %d 页", len(pages))
+    return pages
+
+
+def merge_comment_pages(pages: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """
+    合并多页评论并按 rpid 去重
+
+    翻页期间有新评论到达时，后一页会重复出现前一页末尾的评论，这里保留首次出现的那条。
+    """
+    seen = set()
+    merged = []
+    for page in pages:
+        for item in page_comments(page):
+            rpid = item.get('rpid')
+            if rpid in seen:
+                continue
+            seen.add(rpid)
+            merged.append(item)
+    return {'list': merged}
+
+
+@drain_controller.tracked("fetch")
+async def sync_comments(credential: Credential, store: CommentStore) -> int:
+    """
+    将最近的评论增量同步到本地存储
+
+    以存储中的高水位为界：翻页遇到早于高水位的评论即停止，稳态下通常只需拉取一页。
+    首次同步受 COMMENT_MAX_PAGES 限制，更早的评论与全量拉取时一样不会被看到。
+
+    Returns:
+        int: 本次写入的评论数
+    """
+    since_ctime = None
+    if COMMENT_MAX_AGE_HOURS > 0:
+        since_ctime = int(time.time() - COMMENT_MAX_AGE_HOURS * 3600)
+    high_water_mark = await asyncio.to_thread(store.get_high_water_mark)
+    incremental = high_water_mark is not None
+    if incremental:
+        since_ctime = max(since_ctime or 0, high_water_mark)
+
+    pages = await fetch_comment_pages(credential, since_ctime=since_ctime, probe_first=incremental)
+    comments = merge_comment_pages(pages)['list']
+    written = await asyncio.to_thread(store.upsert_comments, comments)
+
+    if comments:
+        await asyncio.to_thread(store.set_high_water_mark, max(item.get('ctime') or 0 for item in comments))
+
+    logger.debug("同步评论 %d 条（拉取 %d 页，增量: %s）", written, len(pages), incremental)
+    return written
+
+
+async def prefilter_comments(
+        comment_infos: List[CommentInfo]) -> Tuple[List[CommentInfo], List[Tuple[CommentInfo, PrefilterDecision]]]:
+    """
+    预过滤未回复评论（只读，不写入发件箱）
+
+    跳过垃圾和无意义评论；判定为固定回复的评论在发件箱中有排队中、发送中或已成功的任务时由 worker 负责，不再列出，
+    任务最终失败的评论改为交给 LLM（重启后同样按发件箱中的任务状态判断）。
+
+    Returns:
+        (仍需列出的评论, 其中判定为固定回复但还没有发件箱任务的评论及其判定结果)
+    """
+    keep, canned = comment_prefilter.apply(comment_infos)
+    pending = []
+    if canned:
+        statuses = await asyncio.to_thread(
+            get_reply_outbox().latest_statuses, [str(comment.rpid) for comment, _ in canned]
+        )
+        for comment, decision in canned:
+            status = statuses.get(str(comment.rpid))
+            if status == STATUS_FAILED:
+                comment_prefilter.demote(comment.rpid)
+                keep.append(comment)
+            elif status not in ACTIVE_STATUSES:
+                pending.append((comment, decision))
+    if len(keep) + len(pending) == len(comment_infos):
+        return comment_infos, pending
+    listed = {comment.rpid for comment in keep}
+    listed.update(comment.rpid for comment, _ in pending)
+    return [comment for comment in comment_infos if comment.rpid in listed], pending
+
+
+async def dispatch_canned_replies(comment_infos: List[CommentInfo]) -> List[CommentInfo]:
+    """
+    把判定为固定回复的评论写入回复发件箱，由后台 worker 发送（同一评论按幂等键去重）
+
+    Returns:
+        List[CommentInfo]: 去掉已写入发件箱的固定回复评论后的其余评论
+    """
+    _, pending = await prefilter_comments(comment_infos)
+    if not pending:
+        return comment_infos
+    outbox = get_reply_outbox()
+    dispatched: Set[int] = set()
+    for comment, decision in pending:
+        try:
+            await asyncio.to_thread(outbox.enqueue, ReplyCommentRequest(
+                oid=comment.oid,
+                rpid=comment.rpid,
+                message=decision.reply,
+                root=comment.root or comment.rpid
+            ))
+            dispatched.add(comment.rpid)
+        except Exception as e:
+            # 写入失败的评论继续列出，下次轮询时重新写入
+            logger.warning("固定回复写入发件箱失败 (rpid: %s): %s", comment.rpid, str(e))
+    if dispatched:
+        logger.info("预过滤：%d 条评论使用固定回复", len(dispatched))
+    return [comment for comment in comment_infos if comment.rpid not in dispatched]
+
+
+async def get_unreplied_comments() -> UnrepliedCommentsResponse:
+    """获取未回复的评论"""
+    try:
+        credential = get_credential()
+        store = get_comment_store()
+
+        # 增量同步最近评论到本地存储
+        with stage("fetch"):
+            await sync_comments(credential, store)
+
+        # 从本地存储查询未回复的评论
+        since_ctime = None
+        if COMMENT_MAX_AGE_HOURS > 0:
+            since_ctime = int(time.time() - COMMENT_MAX_AGE_HOURS * 3600)
+        with stage("analyze"):
+            unreplied_comments = await asyncio.to_thread(store.unreplied_comments, BILIBILI_MID, since_ctime)
         
-        # 转换为 CommentInfo 对象
-        comment_infos = [CommentInfo(**comment) for comment in unreplied_comments]
+        # 转换为 CommentInfo 对象（本地存储中的字段类型已确定，不再逐条校验）
+        with stage("validate"):
+            comment_infos = [trusted_model(CommentInfo, comment) for comment in unreplied_comments]
+
+        # 预过滤：跳过垃圾和无意义评论，已写入回复发件箱的固定回复评论不再列出
+        if PREFILTER_ENABLED:
+            with stage("prefilter"):
+                comment_infos, _ = await prefilter_comments(comment_infos)
         
         return UnrepliedCommentsResponse(
             result=comment_infos,
@@ -91,34 +481,251 @@ async def get_unreplied_comments() -> UnrepliedCommentsResponse:
         raise e
 
 
-async def reply_to_comment(oid: int, rpid: int, message: str, root: int) -> ReplyResponse:
-    """回复评论"""
+async def poll_unreplied_comments() -> UnrepliedCommentsResponse:
+    """获取未回复的评论，并把其中判定为固定回复的评论写入回复发件箱（评论轮询器使用）"""
+    response = await get_unreplied_comments()
+    if not PREFILTER_ENABLED:
+        return response
+    comment_infos = await dispatch_canned_replies(response.result)
+    if len(comment_infos) == response.count:
+        return response
+    return UnrepliedCommentsResponse(result=comment_infos, count=len(comment_infos))
+
+
+async def claim_unreplied_comments(limit: Optional[int] = None,
+                                   lease_seconds: float = CLAIM_LEASE_SECONDS,
+                                   consumer: Optional[str] = None,
+                                   unreplied: Optional[UnrepliedCommentsResponse] = None) -> ClaimCommentsResponse:
+    """
+    认领一批未回复的评论
+
+    同一时刻不同消费者认领到的评论互不重叠；回复成功后自动释放，租约到期仍未回复的评论会重新分配。
+
+    Args:
+        limit: 最多认领的条数，None 表示全部可认领的评论
+        lease_seconds: 租约有效期（秒）
+        consumer: 消费者标识，仅用于排查
+        unreplied: 候选的未回复评论，默认实时获取
+    """
+    if unreplied is None:
+        unreplied = await get_unreplied_comments()
+    by_rpid = {item.rpid: item for item in unreplied.result}
+    lease_id, expires_at, claimed = await asyncio.to_thread(
+        get_claim_store().claim, by_rpid, limit, lease_seconds, consumer
+    )
+    logger.info("认领评论 %d 条（候选 %d 条，租约 %s，消费者 %s）",
+                len(claimed), unreplied.count, lease_id, consumer)
+    return ClaimCommentsResponse(
+        lease_id=lease_id,
+        expires_at=expires_at,
+        lease_seconds=lease_seconds,
+        result=[by_rpid[rpid] for rpid in claimed],
+        count=len(claimed)
+    )
+
+
+async def release_claim(lease_id: str) -> int:
+    """释放整个认领租约，返回释放的评论数"""
+    return await asyncio.to_thread(get_claim_store().release_lease, lease_id)
+
+
+async def renew_claim(lease_id: str, lease_seconds: float = CLAIM_LEASE_SECONDS) -> int:
+    """续期认领租约，返回续期的评论数"""
+    return await asyncio.to_thread(get_claim_store().renew_lease, lease_id, lease_seconds)
+
+
+@drain_controller.tracked("reply")
+async def _send_reply(oid: int, rpid: int, message: str, root: int,
+                      progress: Optional[SendProgress] = None) -> ReplyResponse:
+    """
+    发送回复（不做幂等检查）
+
+    progress 在请求发出前置为可能已发出，请求确定失败（连接失败、业务错误码等）后恢复，
+    调用方据此判断在发送过程中被取消时回复是否可能已经发出
+    """
+    progress = progress or SendProgress()
     try:
-        credential = credential=Credential(
-            sessdata=BILIBILI_SESSDATA,
-            bili_jct=BILIBILI_BILI_JCT
-        )
+        credential = get_credential()
         
-        # 发送回复
-        reply_result = await comment.send_comment(
-            text=message,
-            oid=oid,
-            type_=comment.CommentResourceType.VIDEO,
-            root=root,
-            parent=rpid,
-            credential=credential
+        async def send():
+            async with reply_semaphore:
+                await reply_limiter.acquire()
+                progress.maybe_sent = True
+                try:
+                    return await BILIBILI_REQUEST_SECONDS.time(
+                        comment.send_comment(
+                            text=message,
+                            oid=oid,
+                            type_=comment.CommentResourceType.VIDEO,
+                            root=root,
+                            parent=rpid,
+                            credential=credential
+                        ),
+                        "send_comment"
+                    )
+                except Exception as e:
+                    if not is_ambiguous_write_error(e):
+                        progress.maybe_sent = False
+                    raise
+
+        # 发送回复：每次尝试都重新占用并发名额和令牌，重试前的退避等待不占用并发名额
+        reply_result = await call_with_resilience(
+            "bilibili",
+            send,
+            retries=BILIBILI_MAX_RETRIES,
+            is_retryable=is_transient_write_error,
+            is_failure=is_upstream_failure
         )
         logger.info(f"成功回复评论 {rpid}: {message}, {reply_result}")
+        reply_rpid = reply_result.get('rpid') or reply_result.get('data', {}).get('rpid')
+
+        # 记录到本地存储，下一次查询无需等待同步即可识别为已回复
+        if reply_rpid:
+            try:
+                await asyncio.to_thread(
+                    get_comment_store().record_reply,
+                    reply_rpid, BILIBILI_MID, oid, root or rpid, rpid, message, int(time.time())
+                )
+            except Exception as e:
+                logger.warning("记录回复到本地存储失败: %s", str(e))
+
+        # 已回复的评论不再需要认领租约
+        try:
+            await asyncio.to_thread(get_claim_store().release, [rpid])
+        except Exception as e:
+            logger.warning("释放评论认领失败: %s", str(e))
+
         return ReplyResponse(
             success=True,
             message="回复成功",
-            rpid=reply_result.get('data', {}).get('rpid')
+            rpid=reply_rpid
         )
             
     except Exception as e:
+        if is_ambiguous_write_error(e):
+            raise ReplyOutcomeUnknown(f"回复评论 {rpid} 的结果未知: {type(e).__name__}: {str(e)}") from e
         error_msg = f"回复评论时发生错误: {str(e)}"
         logger.error(error_msg)
         return ReplyResponse(
             success=False,
             message=error_msg
-        ) 
\ No newline at end of file
+        )
+
+
+def _idempotency_conflict(key: str) -> ReplyResponse:
+    logger.warning("幂等键 %s 已用于内容不同的回复，拒绝发送", key)
+    REPLIES_TOTAL.inc("conflict")
+    return ReplyResponse(
+        success=False,
+        message=f"幂等键 {key} 已用于内容不同的回复，请更换幂等键或使用相同的回复内容",
+        retryable=False
+    )
+
+
+def _ledger_hit(key: str, status: Optional[str], previous: Optional[ReplyResponse]) -> ReplyResponse:
+    """幂等键已被占用时返回的结果"""
+    if status == STATUS_CONFLICT:
+        return _idempotency_conflict(key)
+    REPLIES_TOTAL.inc("deduplicated")
+    if status == STATUS_UNKNOWN:
+        logger.warning("评论 %s 上次回复的结果未知，不再自动发送", key)
+        return ReplyResponse(
+            success=False,
+            message="该评论上次回复的结果未知（可能已经发出），为避免重复回复不再自动发送",
+            retryable=False
+        )
+    if previous is not None:
+        logger.info("评论 %s 已回复过，返回首次结果", key)
+        return previous
+    logger.warning("评论 %s 的回复正在其他进程中处理（状态: %s）", key, status)
+    return ReplyResponse(
+        success=False,
+        message="该评论的回复正在处理中，请勿重复提交"
+    )
+
+
+async def reply_to_comment(oid: int, rpid: int, message: str, root: int,
+                           idempotency_key: Optional[str] = None) -> ReplyResponse:
+    """
+    回复评论（幂等）
+
+    同一幂等键（默认为被回复评论的 rpid）只会真正发送一次：重复请求直接返回首次的 ReplyResponse，
+    本进程内的并发重复请求等待同一次发送的结果。确定未发出的失败释放幂等键，允许重试；
+    读超时等无法确定是否发出的失败、以及请求发出后被取消（如停机时超时）都保留幂等键（unknown），
+    在记录过期前不再自动发送。
+    同一幂等键携带不同回复内容时返回失败，不发送也不返回首次结果。
+    """
+    key = idempotency_key or str(rpid)
+    digest = message_hash(message)
+
+    inflight = _inflight_replies.get(key)
+    if inflight is not None and inflight[1] != digest:
+        return _idempotency_conflict(key)
+    if inflight is not None:
+        logger.info("评论 %s 的回复正在发送，等待同一次结果", key)
+        REPLIES_TOTAL.inc("deduplicated")
+        return await asyncio.shield(inflight[0])
+
+    # 先登记本进程内的发送，查询幂等记录期间到达的重复请求等待同一个结果
+    ledger = get_reply_ledger()
+    future = asyncio.get_running_loop().create_future()
+    _inflight_replies[key] = (future, digest)
+    progress = SendProgress()
+    try:
+        acquired, status, previous = await asyncio.to_thread(ledger.begin, key, rpid, message)
+        if not acquired:
+            result = _ledger_hit(key, status, previous)
+            future.set_result(result)
+            return result
+
+        result = await _send_reply(oid, rpid, message, root, progress)
+        if result.success:
+            await asyncio.to_thread(ledger.complete, key, result)
+            REPLIES_TOTAL.inc("sent")
+        else:
+            await asyncio.to_thread(ledger.release, key)
+            REPLIES_TOTAL.inc("failed")
+        future.set_result(result)
+        return result
+    except ReplyOutcomeUnknown as e:
+        REPLIES_TOTAL.inc("unknown")
+        logger.error("%s，保留幂等键 %s 避免重复发送", str(e), key)
+        result = ReplyResponse(success=False, message=f"{str(e)}，可能已经发出，不会自动重试", retryable=False)
+        future.set_result(result)
+        await asyncio.to_thread(ledger.mark_unknown, key)
+        return result
+    except BaseException as e:
+        # 先让等待者拿到结果，再更新幂等记录（后台线程中的写入即使再次被取消也会完成）
+        if progress.maybe_sent:
+            # 请求可能已经发出（例如在等待响应时被取消），与结果未知一样保留幂等键
+            REPLIES_TOTAL.inc("unknown")
+            logger.error("回复评论 %s 时被中断（%s），回复可能已经发出，保留幂等键 %s",
+                         rpid, type(e).__name__, key)
+            if not future.done():
+                future.set_result(ReplyResponse(
+                    success=False,
+                    message=f"回复评论 {rpid} 时被中断，可能已经发出，不会自动重试",
+                    retryable=False
+                ))
+            await asyncio.to_thread(ledger.mark_unknown, key)
+            raise
+        if not future.done():
+            future.set_exception(e)
+            # 避免没有其他等待者时出现 "exception was never retrieved" 警告
+            future.exception()
+        await asyncio.to_thread(ledger.release, key)
+        raise
+    finally:
+        _inflight_replies.pop(key, None)
+
+
+async def reply_to_comments(requests: List[ReplyCommentRequest]) -> List[ReplyResponse]:
+    """
+    批量回复评论
+
+    所有回复并发提交，实际发送节奏由共享的令牌桶和并发上限控制，结果与请求顺序一致
+    """
+    return await asyncio.gather(*[
+        reply_to_comment(request.oid, request.rpid, request.message, request.root, request.idempotency_key)
+        for request in requests
+    ])
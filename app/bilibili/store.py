@@ -0,0 +1,183 @@
+"""
+本地评论存储 - 基于 SQLite (WAL) 持久化创作中心评论，支持增量同步
+"""
+import sqlite3
+import threading
+from typing import Any, Dict, Iterable, List, Optional
+
+from app.bilibili.detector import build_comment_info
+
+COMMENT_FIELDS = ('rpid', 'mid', 'oid', 'root', 'parent', 'content', 'title', 'uname', 'bvid')
+
+# 查询结果中空值的替代值（SQL 字面量），保证每个字段的类型与 CommentInfo 一致，可以跳过逐条校验
+_NULL_DEFAULTS = {'oid': '0', 'root': '0', 'parent': '0', 'content': "''", 'title': "''", 'uname': "''", 'bvid': "''"}
+_COMMENT_SELECT = ', '.join(
+    f"COALESCE(c.{field}, {_NULL_DEFAULTS[field]}) AS {field}" if field in _NULL_DEFAULTS else f"c.{field}"
+    for field in COMMENT_FIELDS
+)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS comments (
+    rpid INTEGER PRIMARY KEY,
+    mid TEXT NOT NULL,
+    oid INTEGER,
+    root INTEGER,
+    parent INTEGER,
+    content TEXT,
+    title TEXT,
+    uname TEXT,
+    bvid TEXT,
+    ctime INTEGER NOT NULL DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS idx_comments_root ON comments(root);
+CREATE INDEX IF NOT EXISTS idx_comments_parent ON comments(parent);
+CREATE INDEX IF NOT EXISTS idx_comments_oid ON comments(oid);
+CREATE INDEX IF NOT EXISTS idx_comments_ctime ON comments(ctime);
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT
+);
+"""
+
+
+class CommentStore:
+    """
+    评论存储
+
+    所有评论（包括我的回复）按 rpid 去重保存。判断是否已回复通过 root / parent 索引完成，
+    因此评论滚出最近窗口后，“已回复”的信息依然保留。
+    方法都是同步的，在事件循环中应通过 asyncio.to_thread 调用。
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(SCHEMA)
+        self._conn.commit()
+
+    def close(self) -> None:
+        """关闭数据库连接"""
+        with self._lock:
+            self._conn.close()
+
+    def upsert_comments(self, comments: Iterable[Dict[str, Any]]) -> int:
+        """
+        写入一批创作中心原始评论，已存在的评论会被更新
+
+        Returns:
+            int: 写入的评论数
+        """
+        rows = []
+        for item in comments:
+            info = build_comment_info(item)
+            rows.append(tuple(info[field] for field in COMMENT_FIELDS) + (item.get('ctime') or 0,))
+        if not rows:
+            return 0
+        with self._lock:
+            self._conn.executemany(
+                """
+                INSERT INTO comments (rpid, mid, oid, root, parent, content, title, uname, bvid, ctime)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+                ON CONFLICT(rpid) DO UPDATE SET
+                    content = excluded.content,
+                    title = excluded.title,
+                    uname = excluded.uname,
+                    bvid = excluded.bvid
+                """,
+                rows
+            )
+            self._conn.commit()
+        return len(rows)
+
+    def record_reply(self, rpid: int, mid: str, oid: int, root: int, parent: int,
+                     content: str, ctime: int) -> None:
+        """
+        记录一条刚发出的回复，使被回复的评论立即从未回复列表中消失
+        """
+        with self._lock:
+            self._conn.execute(
+                """
+                INSERT OR IGNORE INTO comments (rpid, mid, oid, root, parent, content, title, uname, bvid, ctime)
+                VALUES (?, ?, ?, ?, ?, ?, '', '', '', ?)
+                """,
+                (rpid, str(mid), oid, root, parent, content, ctime)
+            )
+            self._conn.commit()
+
+    def unreplied_comments(self, mid: str, since_ctime: Optional[int] = None,
+                           limit: Optional[int] = None) -> List[Dict[str, Any]]:
+        """
+        查询未回复的评论（最新的在前）
+
+        Args:
+            mid: 我的用户ID
+            since_ctime: 只返回不早于该时间戳的评论
+            limit: 最多返回的条数
+        """
+        sql = f"""
+            SELECT {_COMMENT_SELECT}
+            FROM comments c
+            WHERE c.mid != :mid
+              AND c.ctime >= :since
+              AND NOT EXISTS (SELECT 1 FROM comments r WHERE r.root = c.rpid AND r.mid = :mid)
+              AND NOT EXISTS (SELECT 1 FROM comments r WHERE r.parent = c.rpid AND r.mid = :mid)
+            ORDER BY c.ctime DESC, c.rpid DESC
+        """
+        params = {"mid": str(mid), "since": since_ctime or 0}
+        if limit is not None:
+            sql += " LIMIT :limit"
+            params["limit"] = limit
+        with self._lock:
+            rows = self._conn.execute(sql, params).fetchall()
+        return [dict(row) for row in rows]
+
+    def count_comments_since(self, since_ctime: int, exclude_mid: Optional[str] = None) -> int:
+        """统计不早于 since_ctime 的评论数，可排除指定用户（通常是我自己）"""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT COUNT(*) FROM comments WHERE ctime >= ? AND mid != ?",
+                (since_ctime, str(exclude_mid) if exclude_mid is not None else "")
+            ).fetchone()
+        return row[0]
+
+    def is_replied(self, rpid: int, mid: str) -> bool:
+        """判断评论是否已被我回复"""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT 1 FROM comments WHERE (root = ? OR parent = ?) AND mid = ? LIMIT 1",
+                (rpid, rpid, str(mid))
+            ).fetchone()
+        return row is not None
+
+    def get_meta(self, key: str) -> Optional[str]:
+        """读取元数据"""
+        with self._lock:
+            row = self._conn.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        return row["value"] if row else None
+
+    def set_meta(self, key: str, value: str) -> None:
+        """写入元数据"""
+        with self._lock:
+            self._conn.execute(
+                "INSERT INTO meta (key, value) VALUES (?, ?) "
+                "ON CONFLICT(key) DO UPDATE SET value = excluded.value",
+                (key, value)
+            )
+            self._conn.commit()
+
+    def get_high_water_mark(self) -> Optional[int]:
+        """
+        获取增量同步的高水位：早于该时间戳的评论已经完整同步过
+        """
+        value = self.get_meta("high_water_mark")
+        return int(value) if value is not None else None
+
+    def set_high_water_mark(self, ctime: int) -> None:
+        """更新增量同步的高水位（只前进不后退）"""
+        current = self.get_high_water_mark()
+        if current is None or ctime > current:
+            self.set_meta("high_water_mark", str(ctime))
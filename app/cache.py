@@ -0,0 +1,85 @@
+"""
+进程内缓存 - 带 TTL 的单飞（single-flight）缓存
+"""
+import asyncio
+import hashlib
+import time
+from typing import Any, Awaitable, Callable, Dict, Hashable, Optional
+
+
+def make_etag(body: bytes) -> str:
+    """根据响应体生成强 ETag"""
+    return '"' + hashlib.blake2b(body, digest_size=16).hexdigest() + '"'
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """
+    判断 If-None-Match 请求头是否命中当前 ETag（按弱比较处理 W/ 前缀）
+    """
+    if not if_none_match:
+        return False
+    candidates = [tag.strip() for tag in if_none_match.split(",")]
+    if "*" in candidates:
+        return True
+    return etag in (tag[2:] if tag.startswith("W/") else tag for tag in candidates)
+
+
+class SingleFlightCache:
+    """
+    带 TTL 的单飞缓存
+
+    缓存未过期时直接返回缓存值；过期后第一个调用者触发加载，
+    同一时刻的其他调用者等待同一个加载结果，而不是各自再请求一次上游。
+    加载失败时异常会传递给所有等待者，且不写入缓存。
+    """
+
+    def __init__(self, ttl: float):
+        self.ttl = ttl
+        self._values: Dict[Hashable, Any] = {}
+        self._expires: Dict[Hashable, float] = {}
+        self._inflight: Dict[Hashable, asyncio.Future] = {}
+        self._generation = 0
+
+    async def get(self, key: Hashable, loader: Callable[[], Awaitable[Any]]) -> Any:
+        """
+        获取缓存值，缺失或过期时通过 loader 加载
+        """
+        if key in self._values and time.monotonic() < self._expires[key]:
+            return self._values[key]
+
+        future = self._inflight.get(key)
+        if future is None:
+            future = asyncio.ensure_future(self._load(key, loader))
+            self._inflight[key] = future
+        # shield: 单个调用者被取消时不影响其他等待者共享的加载任务
+        return await asyncio.shield(future)
+
+    async def _load(self, key: Hashable, loader: Callable[[], Awaitable[Any]]) -> Any:
+        generation = self._generation
+        try:
+            value = await loader()
+            # 加载期间缓存被失效过，结果可能已过时，只返回给本轮等待者而不写入缓存
+            if self.ttl > 0 and generation == self._generation:
+                self._values[key] = value
+                self._expires[key] = time.monotonic() + self.ttl
+            return value
+        finally:
+            if self._inflight.get(key) is asyncio.current_task():
+                del self._inflight[key]
+
+    def invalidate(self, key: Optional[Hashable] = None) -> None:
+        """
+        使缓存失效，key 为空时清空全部缓存
+
+        进行中的加载仍会返回给已在等待的调用者，但其结果不会写入缓存，
+        之后的调用者会触发新的加载。
+        """
+        self._generation += 1
+        if key is None:
+            self._values.clear()
+            self._expires.clear()
+            self._inflight.clear()
+        else:
+            self._values.pop(key, None)
+            self._expires.pop(key, None)
+            self._inflight.pop(key, None)
@@ -13,11 +13,123 @@ BILIBILI_BILI_JCT = {BILIBILI_BILI_JCT}
 BILIBILI_MID = {BILIBILI_MID}
 
 # 日志配置
-LOG_LEVEL = "INFO"
-LOG_FILE = "dify_scheduler.log"
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO")
+LOG_FILE = os.getenv("LOG_FILE", "dify_scheduler.log")
 LOG_FORMAT = '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+LOG_JSON = os.getenv("LOG_JSON", "false").lower() == "true"  # 是否以 JSON 行格式输出日志
+LOG_MAX_BYTES = int(os.getenv("LOG_MAX_BYTES", 10 * 1024 * 1024))  # 日志文件达到该大小后轮转（字节）
+LOG_BACKUP_COUNT = int(os.getenv("LOG_BACKUP_COUNT", 5))  # 保留的历史日志文件数
+LOG_MAX_MESSAGE_LENGTH = int(os.getenv("LOG_MAX_MESSAGE_LENGTH", 2000))  # 单条日志消息的最大长度，超出部分截断，0 表示不截断
 
 # API配置
 API_TITLE = "Bilibili API Server"
 API_DESCRIPTION = "B站评论管理API服务"
-API_VERSION = "1.0.0" 
\ No newline at end of file
+API_VERSION = "1.0.0"
+
+# 评论拉取配置
+COMMENT_PAGE_SIZE = int(os.getenv("COMMENT_PAGE_SIZE", 20))  # 每页评论数
+COMMENT_MAX_PAGES = int(os.getenv("COMMENT_MAX_PAGES", 5))  # 单次轮询最多拉取的页数
+COMMENT_FETCH_CONCURRENCY = int(os.getenv("COMMENT_FETCH_CONCURRENCY", 3))  # 并发拉取的最大页数
+COMMENT_MAX_AGE_HOURS = float(os.getenv("COMMENT_MAX_AGE_HOURS", 24))  # 只回看该时间窗口内的评论，0 表示不限制
+
+# 本地评论存储配置
+COMMENT_STORE_PATH = os.getenv("COMMENT_STORE_PATH", "comments.db")  # SQLite 数据库文件
+
+# 未回复评论接口缓存配置
+UNREPLIED_CACHE_TTL = float(os.getenv("UNREPLIED_CACHE_TTL", 10))  # 缓存有效期（秒），0 表示只合并并发请求不缓存
+
+# 响应序列化配置
+FAST_SERIALIZATION = os.getenv("FAST_SERIALIZATION", "true").lower() == "true"  # 本地存储中的评论跳过重复校验，安装 orjson 时用其序列化
+RESPONSE_GZIP_MIN_SIZE = int(os.getenv("RESPONSE_GZIP_MIN_SIZE", 16384))  # 评论列表响应体达到该大小且客户端支持时 gzip 压缩（字节），0 表示不压缩
+RESPONSE_GZIP_LEVEL = int(os.getenv("RESPONSE_GZIP_LEVEL", 5))  # gzip 压缩级别（1~9）
+
+# 评论预热轮询配置
+COMMENT_POLLER_ENABLED = os.getenv("COMMENT_POLLER_ENABLED", "true").lower() == "true"  # 是否在后台预热未回复评论
+COMMENT_POLL_MIN_INTERVAL = float(os.getenv("COMMENT_POLL_MIN_INTERVAL", 15))  # 最短轮询间隔（秒）
+COMMENT_POLL_MAX_INTERVAL = float(os.getenv("COMMENT_POLL_MAX_INTERVAL", 300))  # 最长轮询间隔（秒）
+COMMENT_SNAPSHOT_MAX_AGE = float(os.getenv("COMMENT_SNAPSHOT_MAX_AGE", 600))  # 快照超过该年龄时改为实时拉取（秒）
+
+# 新评论推送配置
+COMMENT_STREAM_QUEUE_SIZE = int(os.getenv("COMMENT_STREAM_QUEUE_SIZE", 100))  # 每个订阅者的队列长度
+COMMENT_STREAM_SLOW_POLICY = os.getenv("COMMENT_STREAM_SLOW_POLICY", "drop")  # 慢消费者处理策略: drop / disconnect
+COMMENT_STREAM_HEARTBEAT = float(os.getenv("COMMENT_STREAM_HEARTBEAT", 15))  # SSE 心跳间隔（秒）
+
+# 回复限流配置
+REPLY_RATE_PER_SECOND = float(os.getenv("REPLY_RATE_PER_SECOND", 0.5))  # 长期回复速率（条/秒），0 表示不限流
+REPLY_BURST = int(os.getenv("REPLY_BURST", 3))  # 允许的突发回复数
+REPLY_CONCURRENCY = int(os.getenv("REPLY_CONCURRENCY", 3))  # 同时在途的回复请求数
+REPLY_BATCH_MAX_SIZE = int(os.getenv("REPLY_BATCH_MAX_SIZE", 100))  # 批量回复单次最多条数
+
+# 回复幂等配置
+REPLY_IDEMPOTENCY_TTL_HOURS = float(os.getenv("REPLY_IDEMPOTENCY_TTL_HOURS", 72))  # 已完成回复记录的保留时间（小时）
+REPLY_INFLIGHT_TIMEOUT = float(os.getenv("REPLY_INFLIGHT_TIMEOUT", 120))  # 进行中记录超过该时间视为中断，可重新发送（秒）
+
+# 回复发件箱配置（异步回复）
+OUTBOX_WORKERS = int(os.getenv("OUTBOX_WORKERS", 3))  # 发件箱并发发送的 worker 数（仍受回复限流和并发上限约束）
+OUTBOX_POLL_INTERVAL = float(os.getenv("OUTBOX_POLL_INTERVAL", 1))  # 发件箱为空时的轮询间隔（秒）
+OUTBOX_MAX_ATTEMPTS = int(os.getenv("OUTBOX_MAX_ATTEMPTS", 5))  # 单个任务最多发送次数
+OUTBOX_RETRY_BASE_DELAY = float(os.getenv("OUTBOX_RETRY_BASE_DELAY", 5))  # 任务重试的退避基数（秒）
+OUTBOX_RETRY_MAX_DELAY = float(os.getenv("OUTBOX_RETRY_MAX_DELAY", 300))  # 任务重试的最长等待（秒）
+OUTBOX_RETENTION_HOURS = float(os.getenv("OUTBOX_RETENTION_HOURS", 72))  # 已结束任务的保留时间（小时）
+
+# 评论认领配置
+CLAIM_LEASE_SECONDS = float(os.getenv("CLAIM_LEASE_SECONDS", 300))  # 认领租约默认有效期（秒），到期未回复的评论重新分配
+CLAIM_MAX_LEASE_SECONDS = float(os.getenv("CLAIM_MAX_LEASE_SECONDS", 3600))  # 认领租约最长有效期（秒）
+CLAIM_MAX_LIMIT = int(os.getenv("CLAIM_MAX_LIMIT", 100))  # 单次最多认领的评论数
+
+# 进程内回复流水线配置（拉取 → 过滤 → 生成 → 回复）
+PIPELINE_ENABLED = os.getenv("PIPELINE_ENABLED", "false").lower() == "true"  # 是否在 leader 进程中运行回复流水线
+PIPELINE_GENERATOR = os.getenv("PIPELINE_GENERATOR", "dify")  # 回复生成方式: dify / openai / template
+PIPELINE_FETCH_INTERVAL = float(os.getenv("PIPELINE_FETCH_INTERVAL", 30))  # 没有新评论推送时两次认领的间隔（秒）
+PIPELINE_FETCH_BATCH = int(os.getenv("PIPELINE_FETCH_BATCH", 20))  # 每次最多认领的评论数
+PIPELINE_LEASE_SECONDS = float(os.getenv("PIPELINE_LEASE_SECONDS", 600))  # 认领租约（秒），生成失败或跳过的评论在租约到期后重新处理
+PIPELINE_MAX_INFLIGHT = int(os.getenv("PIPELINE_MAX_INFLIGHT", 50))  # 流水线中同时处理的评论数上限
+PIPELINE_QUEUE_SIZE = int(os.getenv("PIPELINE_QUEUE_SIZE", 20))  # 相邻阶段之间的队列长度，下游处理不过来时上游阻塞
+PIPELINE_GENERATE_CONCURRENCY = int(os.getenv("PIPELINE_GENERATE_CONCURRENCY", 4))  # 同时生成的回复数
+PIPELINE_REPLY_CONCURRENCY = int(os.getenv("PIPELINE_REPLY_CONCURRENCY", 2))  # 同时发送的回复数（仍受回复限流约束）
+PIPELINE_REPLY_TEMPLATE = os.getenv("PIPELINE_REPLY_TEMPLATE", "谢谢{uname}的评论！")  # template 生成器的回复模板
+PIPELINE_TEMPLATE_LATENCY = float(os.getenv("PIPELINE_TEMPLATE_LATENCY", 0))  # template 生成器模拟的生成耗时（秒），用于压测
+
+# OpenAI 兼容接口配置（PIPELINE_GENERATOR=openai）
+LLM_BASE_URL = os.getenv("LLM_BASE_URL", "https://api.openai.com/v1")  # 接口地址，请求发往 {LLM_BASE_URL}/chat/completions
+LLM_API_KEY = os.getenv("LLM_API_KEY", "")
+LLM_MODEL = os.getenv("LLM_MODEL", "gpt-4o-mini")
+LLM_SYSTEM_PROMPT = os.getenv("LLM_SYSTEM_PROMPT", "你是一名B站UP主，请用简短、友好的语气回复观众在视频下的评论，不超过50字。")
+LLM_TEMPERATURE = float(os.getenv("LLM_TEMPERATURE", 0.7))
+LLM_MAX_TOKENS = int(os.getenv("LLM_MAX_TOKENS", 200))
+LLM_TIMEOUT = float(os.getenv("LLM_TIMEOUT", 60))  # 单次生成超时（秒）
+LLM_HTTP_MAX_CONNECTIONS = int(os.getenv("LLM_HTTP_MAX_CONNECTIONS", 20))  # 共享连接池最大连接数
+LLM_HTTP_MAX_KEEPALIVE = int(os.getenv("LLM_HTTP_MAX_KEEPALIVE", 10))  # 共享连接池最大空闲长连接数
+
+# 评论预过滤配置（跳过垃圾和无意义评论，简单评论直接发送固定回复，其余评论才交给 LLM 生成）
+PREFILTER_ENABLED = os.getenv("PREFILTER_ENABLED", "false").lower() == "true"  # 是否在获取未回复评论时预过滤
+PREFILTER_RULES_FILE = os.getenv("PREFILTER_RULES_FILE", "prefilter_rules.json")  # 规则文件（JSON），其中的字段覆盖默认规则
+
+# B站请求连接池配置
+BILIBILI_HTTP_CLIENT = os.getenv("BILIBILI_HTTP_CLIENT", "")  # 留空使用 bilibili_api 默认客户端（curl_cffi，模拟浏览器指纹）；httpx: 使用共享连接池会话
+BILIBILI_HTTP_MAX_CONNECTIONS = int(os.getenv("BILIBILI_HTTP_MAX_CONNECTIONS", 10))  # 最大连接数
+BILIBILI_HTTP_MAX_KEEPALIVE = int(os.getenv("BILIBILI_HTTP_MAX_KEEPALIVE", 5))  # 最大空闲长连接数
+BILIBILI_HTTP2 = os.getenv("BILIBILI_HTTP2", "false").lower() == "true"  # 是否启用 HTTP/2（需要安装 h2）
+BILIBILI_API_BASE_URL = os.getenv("BILIBILI_API_BASE_URL", "")  # 把B站接口请求转发到该地址（例如本地替身服务），留空表示直连B站
+
+# 上游容错配置（Dify 和 B站共用）
+RETRY_BASE_DELAY = float(os.getenv("RETRY_BASE_DELAY", 0.5))  # 首次重试的退避基数（秒）
+RETRY_MAX_DELAY = float(os.getenv("RETRY_MAX_DELAY", 8))  # 单次退避的最长等待（秒）
+CIRCUIT_FAILURE_THRESHOLD = int(os.getenv("CIRCUIT_FAILURE_THRESHOLD", 5))  # 连续失败多少次后熔断
+CIRCUIT_RECOVERY_TIMEOUT = float(os.getenv("CIRCUIT_RECOVERY_TIMEOUT", 30))  # 熔断后多久放行探测请求（秒）
+BILIBILI_MAX_RETRIES = int(os.getenv("BILIBILI_MAX_RETRIES", 2))  # B站请求最多重试次数
+BILIBILI_HEDGE_DELAY = float(os.getenv("BILIBILI_HEDGE_DELAY", 0))  # 评论拉取的对冲延迟（秒），0 表示不启用
+
+# 多进程 leader 选举配置（uvicorn --workers N 时只有 leader 运行调度器和轮询器）
+LEADER_ELECTION_ENABLED = os.getenv("LEADER_ELECTION_ENABLED", "true").lower() == "true"
+LEADER_LEASE_PATH = os.getenv("LEADER_LEASE_PATH", COMMENT_STORE_PATH)  # 存放租约的 SQLite 数据库文件，需所有进程共享
+LEADER_LEASE_TTL = float(os.getenv("LEADER_LEASE_TTL", 15))  # 租约有效期（秒），leader 失联超过该时间后由备用进程接管
+LEADER_HEARTBEAT_INTERVAL = float(os.getenv("LEADER_HEARTBEAT_INTERVAL", 5))  # 续约 / 竞选的间隔（秒）
+
+# 请求剖析配置（X-Profile 请求头或 ?profile= 查询参数触发）
+PROFILING_ENABLED = os.getenv("PROFILING_ENABLED", "false").lower() == "true"  # 是否允许按请求开启 cProfile 剖析
+PROFILING_TOKEN = os.getenv("PROFILING_TOKEN", "")  # 剖析标记需要匹配的令牌，留空时任意非 0 值均可触发
+PROFILING_OUTPUT_DIR = os.getenv("PROFILING_OUTPUT_DIR", "profiles")  # 剖析结果（.prof）的保存目录
+
+# 优雅关闭配置
+SHUTDOWN_DRAIN_TIMEOUT = float(os.getenv("SHUTDOWN_DRAIN_TIMEOUT", 30))  # 关闭时等待进行中的回复、拉取和 workflow 运行的最长时间（秒）
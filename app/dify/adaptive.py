@@ -0,0 +1,111 @@
+"""
+自适应调度触发器
+根据近期评论到达速率在分钟级上下限之间调整 Dify workflow 的执行间隔，并支持静默时段
+"""
+from datetime import datetime, timedelta
+from typing import Any, Callable, Dict, Optional, Set
+
+from apscheduler.triggers.base import BaseTrigger
+
+
+def parse_hours(expr: str) -> Set[int]:
+    """
+    解析 cron 风格的小时字段，例如 "1-7"、"23-6"、"0,1,2"、"*/2"
+
+    与 cron 不同的是，起点大于终点的区间（如 23-6）表示跨越午夜
+    """
+    hours: Set[int] = set()
+    for part in (expr or "").split(","):
+        part = part.strip()
+        if not part:
+            continue
+        step = 1
+        if "/" in part:
+            part, step_text = part.split("/", 1)
+            step = max(1, int(step_text))
+        if part == "*":
+            start, end = 0, 23
+        elif "-" in part:
+            start_text, end_text = part.split("-", 1)
+            start, end = int(start_text), int(end_text)
+        else:
+            start = end = int(part)
+        if not (0 <= start <= 23 and 0 <= end <= 23):
+            raise ValueError(f"小时必须在 0-23 之间: {part}")
+        span = (end - start) % 24
+        hours.update((start + offset) % 24 for offset in range(0, span + 1, step))
+    return hours
+
+
+class AdaptiveTrigger(BaseTrigger):
+    """
+    自适应触发器
+
+    间隔 = target_batch / 每小时评论到达数 × 60 分钟，即期望每次运行大约处理 target_batch 条新评论，
+    并限制在 [min_minutes, max_minutes] 之间：评论密集（例如视频刚发布）时缩短间隔，
+    安静时退避到上限。落在静默时段内的触发时间推迟到静默时段结束。
+    """
+
+    def __init__(self, rate_source: Callable[[], float], min_minutes: float, max_minutes: float,
+                 target_batch: float, quiet_hours: str = ""):
+        """
+        Args:
+            rate_source: 返回近期评论到达速率（条/小时）的函数
+            min_minutes: 最短间隔（分钟）
+            max_minutes: 最长间隔（分钟）
+            target_batch: 期望每次运行处理的评论数
+            quiet_hours: cron 风格的静默小时，例如 "1-7"
+        """
+        self.rate_source = rate_source
+        self.min_minutes = min_minutes
+        self.max_minutes = max(min_minutes, max_minutes)
+        self.target_batch = target_batch
+        self.quiet_hours = parse_hours(quiet_hours)
+        self.last_rate: Optional[float] = None
+        self.last_interval: Optional[float] = None
+
+    def current_interval_minutes(self) -> float:
+        """根据当前到达速率计算间隔（分钟）"""
+        try:
+            rate = max(0.0, float(self.rate_source()))
+        except Exception:
+            rate = 0.0
+        if rate <= 0:
+            minutes = self.max_minutes
+        else:
+            minutes = self.target_batch / rate * 60
+        minutes = min(self.max_minutes, max(self.min_minutes, minutes))
+        self.last_rate = rate
+        self.last_interval = minutes
+        return minutes
+
+    def _skip_quiet_hours(self, fire_time: datetime) -> datetime:
+        """触发时间落在静默时段内时，推迟到第一个非静默小时的整点"""
+        if len(self.quiet_hours) >= 24:
+            return fire_time
+        while fire_time.hour in self.quiet_hours:
+            fire_time = (fire_time + timedelta(hours=1)).replace(minute=0, second=0, microsecond=0)
+        return fire_time
+
+    def get_next_fire_time(self, previous_fire_time, now):
+        # 以当前时间为起点计算，使间隔随到达速率的变化立即生效
+        fire_time = now + timedelta(minutes=self.current_interval_minutes())
+        return self._skip_quiet_hours(fire_time)
+
+    def status(self) -> Dict[str, Any]:
+        return {
+            "mode": "adaptive",
+            "min_minutes": self.min_minutes,
+            "max_minutes": self.max_minutes,
+            "target_batch": self.target_batch,
+            "quiet_hours": sorted(self.quiet_hours),
+            "arrival_rate_per_hour": round(self.last_rate, 3) if self.last_rate is not None else None,
+            "interval_minutes": round(self.last_interval, 3) if self.last_interval is not None else None
+        }
+
+    def __str__(self):
+        return f"adaptive[{self.min_minutes}-{self.max_minutes}min]"
+
+    def __repr__(self):
+        return (f"<AdaptiveTrigger (min_minutes={self.min_minutes}, max_minutes={self.max_minutes}, "
+                f"target_batch={self.target_batch})>")
@@ -3,40 +3,192 @@ Dify Workflow 服务模块
 提供workflow调用和定时调度功能
 """
 import json
+import time
 import asyncio
+import logging
+from collections import deque
 from datetime import datetime
-from typing import Optional, Dict, Any
+from typing import Optional, Dict, Any, List, Set
 import httpx
 from apscheduler.schedulers.asyncio import AsyncIOScheduler
 from apscheduler.triggers.interval import IntervalTrigger
 
 from dify_config import (
     DIFY_API_KEY, 
+    MAX_RETRIES,
     DIFY_WORKFLOW_ENDPOINT, 
     REQUEST_TIMEOUT,
-    DEFAULT_INTERVAL_HOURS
+    DEFAULT_INTERVAL_HOURS,
+    DIFY_RESPONSE_MODE,
+    DIFY_STREAM_IDLE_TIMEOUT,
+    DIFY_EXECUTION_MODE,
+    DIFY_FANOUT_CHUNK_SIZE,
+    DIFY_FANOUT_CONCURRENCY,
+    DIFY_FANOUT_INPUT_KEY,
+    SCHEDULER_MODE,
+    ADAPTIVE_MIN_MINUTES,
+    ADAPTIVE_MAX_MINUTES,
+    ADAPTIVE_TARGET_BATCH,
+    ADAPTIVE_RATE_WINDOW_MINUTES,
+    SCHEDULER_QUIET_HOURS
 )
-from app.utils import setup_logging
-from app.models import DifyCallResponse
+from app.config import CLAIM_LEASE_SECONDS
+from app.models import CommentInfo, DifyCallResponse
+from app.http_client import get_dify_client
+from app.dify.stream import WorkflowRunProgress, iter_sse_events
+from app.dify.adaptive import AdaptiveTrigger, parse_hours
+from app.resilience import CircuitOpenError, UpstreamStatusError, call_with_resilience
+from app.lifecycle import drain_controller
+from app.metrics import DIFY_RUN_SECONDS, SCHEDULED_RUNS_TOTAL
 
-# 设置日志
-logger = setup_logging()
+logger = logging.getLogger(__name__)
 
 # 全局调度器实例
 scheduler: Optional[AsyncIOScheduler] = None
 scheduler_running = False
+scheduler_mode: Optional[str] = None
+scheduler_trigger = None
+# 静默小时，启动调度器时解析一次
+scheduler_quiet_hours: Set[int] = set()
 
+# 定时调用统计（进程内累计）
+scheduler_stats: Dict[str, Any] = {
+    "call_count": 0,
+    "error_count": 0,
+    "last_call_time": None,
+    "last_call_status": None
+}
 
-async def call_dify_workflow(inputs: Dict[str, Any] = None) -> DifyCallResponse:
+# 表示 Dify 暂时不可用、workflow 尚未开始执行的状态码，可以安全重试
+RETRYABLE_STATUS_CODES = {429, 502, 503, 504}
+
+
+def is_retryable_dify_error(error: BaseException) -> bool:
+    """
+    Dify 调用是否值得重试
+
+    workflow 运行会回复评论，不是幂等操作，只重试能确定运行尚未开始的错误
+    """
+    if isinstance(error, (httpx.ConnectError, httpx.ConnectTimeout, httpx.PoolTimeout)):
+        return True
+    return isinstance(error, UpstreamStatusError) and error.status_code in RETRYABLE_STATUS_CODES
+
+
+def is_dify_failure(error: BaseException) -> bool:
+    """错误是否说明 Dify 当前不健康（计入熔断）"""
+    return isinstance(error, httpx.TransportError) or is_retryable_dify_error(error)
+
+
+def _dify_headers() -> Dict[str, str]:
+    return {
+        "Authorization": f"Bearer {DIFY_API_KEY}",
+        "Content-Type": "application/json"
+    }
+
+
+# 流式运行进度：正在进行的运行和最近完成的运行摘要
+active_runs: Dict[int, WorkflowRunProgress] = {}
+recent_runs: deque = deque(maxlen=20)
+
+
+async def _call_dify_workflow_streaming(request_data: Dict[str, Any], call_time: datetime) -> DifyCallResponse:
+    """
+    以流式（SSE）模式调用Dify workflow
+
+    事件到达时增量更新运行进度，只保留精简摘要；超时只针对两个事件之间的间隔，
+    因此长时间的迭代不会因为总时长超过 REQUEST_TIMEOUT 而失败。
+    """
+    progress = WorkflowRunProgress()
+    active_runs[id(progress)] = progress
+    client = get_dify_client()
+
+    async def open_stream() -> httpx.Response:
+        request = client.build_request(
+            "POST",
+            DIFY_WORKFLOW_ENDPOINT,
+            headers=_dify_headers(),
+            json=request_data,
+            timeout=httpx.Timeout(REQUEST_TIMEOUT, read=DIFY_STREAM_IDLE_TIMEOUT)
+        )
+        response = await client.send(request, stream=True)
+        if response.status_code != 200:
+            content = (await response.aread()).decode("utf-8", errors="replace")
+            await response.aclose()
+            raise UpstreamStatusError("dify", response.status_code, content)
+        return response
+
+    try:
+        response = await call_with_resilience(
+            "dify",
+            open_stream,
+            retries=MAX_RETRIES,
+            is_retryable=is_retryable_dify_error,
+            is_failure=is_dify_failure
+        )
+        logger.info("Dify API响应状态码: %d", response.status_code)
+        try:
+            async for event in iter_sse_events(response.aiter_lines()):
+                progress.apply(event)
+                if event.get("event") in ("iteration_next", "workflow_finished"):
+                    logger.debug("Dify运行进度: %s", progress.summary())
+        finally:
+            await response.aclose()
+
+        summary = progress.summary()
+        if progress.status == "succeeded":
+            logger.info("Dify调用成功，运行 %s 耗时 %.1f 秒，共 %d 个事件",
+                        progress.workflow_run_id, summary["duration"], progress.event_count)
+            return DifyCallResponse(
+                success=True,
+                message="Workflow执行成功",
+                response_data=summary,
+                call_time=call_time
+            )
+
+        error_msg = f"Workflow执行未成功，状态: {progress.status}，错误: {progress.error}"
+        logger.error(error_msg)
+        return DifyCallResponse(
+            success=False,
+            message=error_msg,
+            response_data=summary,
+            call_time=call_time
+        )
+    finally:
+        active_runs.pop(id(progress), None)
+        recent_runs.append(progress.summary())
+
+
+def get_workflow_progress() -> Dict[str, List[Dict[str, Any]]]:
+    """获取流式运行进度：进行中的运行和最近完成的运行"""
+    return {
+        "active": [progress.summary() for progress in active_runs.values()],
+        "recent": list(recent_runs)
+    }
+
+
+@drain_controller.tracked("dify")
+async def call_dify_workflow(inputs: Dict[str, Any] = None,
+                             response_mode: Optional[str] = None) -> DifyCallResponse:
     """
     调用Dify workflow
     
     Args:
         inputs: workflow输入参数，默认为空字典
+        response_mode: blocking 或 streaming，默认取 DIFY_RESPONSE_MODE
         
     Returns:
         DifyCallResponse: 调用结果
     """
+    response_mode = response_mode or DIFY_RESPONSE_MODE
+    started = time.perf_counter()
+    result = await _call_dify_workflow(inputs, response_mode)
+    DIFY_RUN_SECONDS.observe(time.perf_counter() - started, response_mode,
+                             "success" if result.success else "error")
+    return result
+
+
+async def _call_dify_workflow(inputs: Optional[Dict[str, Any]], response_mode: str) -> DifyCallResponse:
+    """调用Dify workflow（不记录指标）"""
     if inputs is None:
         inputs = {}
     
@@ -48,50 +200,88 @@ async def call_dify_workflow(inputs: Dict[str, Any] = None) -> DifyCallResponse:
         # 准备请求数据
         request_data = {
             "inputs": inputs,
-            "response_mode": "blocking",
+            "response_mode": response_mode,
             "user": "bilibili-api-server"
         }
         
-        logger.info("请求参数: %s", json.dumps(request_data, ensure_ascii=False))
+        logger.debug("请求参数: %s", request_data)
+        
+        if response_mode == "streaming":
+            return await _call_dify_workflow_streaming(request_data, call_time)
         
-        # 发送请求
-        async with httpx.AsyncClient(timeout=REQUEST_TIMEOUT) as client:
+        # 发送请求（复用共享连接池，可重试的错误按退避策略重试）
+        client = get_dify_client()
+
+        async def post() -> httpx.Response:
             response = await client.post(
                 DIFY_WORKFLOW_ENDPOINT,
-                headers={
-                    "Authorization": f"Bearer {DIFY_API_KEY}",
-                    "Content-Type": "application/json"
-                },
+                headers=_dify_headers(),
                 json=request_data
             )
+            if response.status_code in RETRYABLE_STATUS_CODES:
+                raise UpstreamStatusError("dify", response.status_code, response.text)
+            return response
+
+        response = await call_with_resilience(
+            "dify",
+            post,
+            retries=MAX_RETRIES,
+            is_retryable=is_retryable_dify_error,
+            is_failure=is_dify_failure
+        )
+        
+        logger.info("Dify API响应状态码: %d", response.status_code)
+        
+        if response.status_code == 200:
+            response_data = response.json()
+            run_data = response_data.get("data") or {}
+            logger.info("Dify调用成功，运行 %s 状态: %s，耗时: %s 秒",
+                        response_data.get("workflow_run_id"), run_data.get("status"), run_data.get("elapsed_time"))
+            logger.debug("Dify响应数据: %s", response_data)
+            
+            return DifyCallResponse(
+                success=True,
+                message="Workflow执行成功",
+                response_data=response_data,
+                call_time=call_time
+            )
+        else:
+            error_msg = f"Dify API调用失败，状态码: {response.status_code}"
+            logger.error(error_msg)
+            logger.error("响应内容: %s", response.text)
             
-            logger.info("Dify API响应状态码: %d", response.status_code)
+            return DifyCallResponse(
+                success=False,
+                message=error_msg,
+                response_data={"status_code": response.status_code, "content": response.text},
+                call_time=call_time
+            )
             
-            if response.status_code == 200:
-                response_data = response.json()
-                logger.info("Dify调用成功，响应数据: %s", 
-                          json.dumps(response_data, indent=2, ensure_ascii=False))
-                
-                return DifyCallResponse(
-                    success=True,
-                    message="Workflow执行成功",
-                    response_data=response_data,
-                    call_time=call_time
-                )
-            else:
-                error_msg = f"Dify API调用失败，状态码: {response.status_code}"
-                logger.error(error_msg)
-                logger.error("响应内容: %s", response.text)
-                
-                return DifyCallResponse(
-                    success=False,
-                    message=error_msg,
-                    response_data={"status_code": response.status_code, "content": response.text},
-                    call_time=call_time
-                )
-                
+    except UpstreamStatusError as e:
+        error_msg = f"Dify API调用失败，状态码: {e.status_code}"
+        logger.error(error_msg)
+        logger.error("响应内容: %s", e.content)
+        return DifyCallResponse(
+            success=False,
+            message=error_msg,
+            response_data={"status_code": e.status_code, "content": e.content},
+            call_time=call_time
+        )
+        
+    except CircuitOpenError as e:
+        error_msg = f"Dify暂时不可用: {str(e)}"
+        logger.warning(error_msg)
+        return DifyCallResponse(
+            success=False,
+            message=error_msg,
+            call_time=call_time
+        )
+        
     except httpx.TimeoutException:
-        error_msg = f"Dify API调用超时（超过{REQUEST_TIMEOUT}秒）"
+        if response_mode == "streaming":
+            error_msg = f"Dify API调用超时（超过{DIFY_STREAM_IDLE_TIMEOUT}秒未收到事件）"
+        else:
+            error_msg = f"Dify API调用超时（超过{REQUEST_TIMEOUT}秒）"
         logger.error(error_msg)
         return DifyCallResponse(
             success=False,
@@ -109,62 +299,223 @@ async def call_dify_workflow(inputs: Dict[str, Any] = None) -> DifyCallResponse:
         )
 
 
+def _chunk_comments(comments: List[CommentInfo], chunk_size: int) -> List[List[CommentInfo]]:
+    """按 chunk_size 切分评论列表"""
+    chunk_size = max(1, chunk_size)
+    return [comments[i:i + chunk_size] for i in range(0, len(comments), chunk_size)]
+
+
+def _compact_run_result(index: int, size: int, result: DifyCallResponse) -> Dict[str, Any]:
+    """单个分块运行的精简结果，汇总时不保留完整的响应数据"""
+    data = result.response_data or {}
+    run_data = data.get("data") or data
+    return {
+        "chunk": index,
+        "comments": size,
+        "success": result.success,
+        "message": result.message,
+        "workflow_run_id": data.get("workflow_run_id") or run_data.get("id"),
+        "status": run_data.get("status"),
+        "elapsed_time": run_data.get("elapsed_time")
+    }
+
+
+@drain_controller.tracked("dify")
+async def call_dify_workflow_fanout(chunk_size: int = DIFY_FANOUT_CHUNK_SIZE,
+                                    concurrency: int = DIFY_FANOUT_CONCURRENCY) -> DifyCallResponse:
+    """
+    分块并发调用Dify workflow
+
+    由服务端获取未回复评论，按 chunk_size 切分后，每块作为一次独立 workflow 运行的输入
+    （inputs[DIFY_FANOUT_INPUT_KEY]，JSON 字符串），最多 concurrency 个运行同时进行。
+    单个慢 LLM 调用只会拖慢所在的块，总耗时取决于最慢的块而不是全部工作量之和。
+    评论通过认领租约获取，与其他消费者（手动调用、外部脚本）同时运行时不会重复处理同一条评论；
+    运行期间定期续期租约（流式运行没有总时长上限），运行结束后释放租约。
+    """
+    from app.bilibili.service import claim_unreplied_comments, release_claim
+
+    call_time = datetime.now()
+    try:
+        unreplied = await claim_unreplied_comments(lease_seconds=CLAIM_LEASE_SECONDS, consumer="dify-fanout")
+    except Exception as e:
+        error_msg = f"获取未回复评论失败: {str(e)}"
+        logger.error(error_msg)
+        return DifyCallResponse(success=False, message=error_msg, call_time=call_time)
+
+    started = time.perf_counter()
+    keeper = asyncio.create_task(_keep_claim(unreplied.lease_id, CLAIM_LEASE_SECONDS))
+    try:
+        result = await _run_fanout_chunks(unreplied.result, chunk_size, concurrency, call_time)
+    finally:
+        keeper.cancel()
+        await release_claim(unreplied.lease_id)
+    DIFY_RUN_SECONDS.observe(time.perf_counter() - started, "fanout", "success" if result.success else "error")
+    return result
+
+
+async def _keep_claim(lease_id: str, lease_seconds: float) -> None:
+    """每隔三分之一租约时长续期一次，运行超过租约时长时评论不会被其他消费者重新认领"""
+    from app.bilibili.service import renew_claim
+
+    while True:
+        await asyncio.sleep(lease_seconds / 3)
+        try:
+            renewed = await renew_claim(lease_id, lease_seconds)
+            logger.debug("续期认领租约 %s: %d 条评论", lease_id, renewed)
+        except Exception as e:
+            logger.warning("续期认领租约 %s 失败: %s", lease_id, str(e))
+
+
+async def _run_fanout_chunks(comments: List[CommentInfo], chunk_size: int, concurrency: int,
+                             call_time: datetime) -> DifyCallResponse:
+    """将认领到的评论分块并发交给Dify workflow处理"""
+    chunks = _chunk_comments(comments, chunk_size)
+    if not chunks:
+        logger.info("没有未回复的评论，跳过Dify workflow调用")
+        return DifyCallResponse(
+            success=True,
+            message="没有未回复的评论",
+            response_data={"chunks": 0, "comments": 0, "succeeded": 0, "failed": 0, "runs": []},
+            call_time=call_time
+        )
+
+    logger.info("分块调用Dify workflow: %d 条评论，%d 块，并发 %d",
+                len(comments), len(chunks), concurrency)
+    semaphore = asyncio.Semaphore(max(1, concurrency))
+
+    async def run_chunk(index: int, chunk: List[CommentInfo]) -> Dict[str, Any]:
+        async with semaphore:
+            payload = json.dumps([item.model_dump() for item in chunk], ensure_ascii=False)
+            result = await call_dify_workflow({DIFY_FANOUT_INPUT_KEY: payload})
+        return _compact_run_result(index, len(chunk), result)
+
+    runs = await asyncio.gather(*[run_chunk(index, chunk) for index, chunk in enumerate(chunks)])
+    succeeded = sum(1 for run in runs if run["success"])
+    failed = len(runs) - succeeded
+    duration = (datetime.now() - call_time).total_seconds()
+
+    return DifyCallResponse(
+        success=failed == 0,
+        message=f"分块执行完成: {succeeded}/{len(runs)} 块成功，耗时 {duration:.1f} 秒",
+        response_data={
+            "chunks": len(runs),
+            "comments": len(comments),
+            "succeeded": succeeded,
+            "failed": failed,
+            "duration": round(duration, 3),
+            "runs": runs
+        },
+        call_time=call_time
+    )
+
+
+async def run_dify_workflow() -> DifyCallResponse:
+    """按配置的执行模式（DIFY_EXECUTION_MODE）调用Dify workflow"""
+    if DIFY_EXECUTION_MODE == "fanout":
+        return await call_dify_workflow_fanout()
+    return await call_dify_workflow()
+
+
 async def scheduled_dify_call():
     """定时执行的Dify workflow调用"""
+    if drain_controller.draining:
+        logger.info("服务正在关闭，跳过本次定时Dify workflow调用")
+        return
+
+    if datetime.now().hour in scheduler_quiet_hours:
+        logger.info("当前处于静默时段，跳过本次定时Dify workflow调用")
+        return
+
     logger.info("🚀 开始执行定时Dify workflow调用")
+    scheduler_stats["call_count"] += 1
+    scheduler_stats["last_call_time"] = datetime.now()
     
     try:
-        result = await call_dify_workflow()
+        result = await run_dify_workflow()
+        scheduler_stats["last_call_status"] = "success" if result.success else "failed"
+        SCHEDULED_RUNS_TOTAL.inc(scheduler_stats["last_call_status"])
         
         if result.success:
             logger.info("✅ 定时Dify workflow调用成功")
-            # 打印执行结果
-            print(f"[{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}] Dify Workflow执行成功")
-            if result.response_data:
-                print(f"响应数据: {json.dumps(result.response_data, indent=2, ensure_ascii=False)}")
         else:
             logger.error("❌ 定时Dify workflow调用失败: %s", result.message)
-            print(f"[{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}] Dify Workflow执行失败: {result.message}")
+            scheduler_stats["error_count"] += 1
             
     except Exception as e:
+        scheduler_stats["last_call_status"] = "error"
+        SCHEDULED_RUNS_TOTAL.inc("error")
+        scheduler_stats["error_count"] += 1
         logger.error("定时调用Dify workflow时发生异常: %s", str(e))
-        print(f"[{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}] 定时调用异常: {str(e)}")
 
 
-def start_scheduler(interval_hours: int = DEFAULT_INTERVAL_HOURS):
+def get_comment_arrival_rate() -> float:
+    """最近 ADAPTIVE_RATE_WINDOW_MINUTES 分钟内的评论到达速率（条/小时），数据来自本地评论存储"""
+    from app.bilibili.service import get_comment_arrival_rate as arrival_rate
+    return arrival_rate(ADAPTIVE_RATE_WINDOW_MINUTES)
+
+
+def start_scheduler(interval_hours: float = DEFAULT_INTERVAL_HOURS,
+                    mode: Optional[str] = None,
+                    interval_minutes: Optional[float] = None,
+                    min_minutes: float = ADAPTIVE_MIN_MINUTES,
+                    max_minutes: float = ADAPTIVE_MAX_MINUTES):
     """
     启动定时调度器
     
     Args:
-        interval_hours: 调度间隔（小时）
+        interval_hours: 调度间隔（小时），interval 模式使用
+        mode: interval（固定间隔）或 adaptive（按评论到达速率自适应），默认使用配置 SCHEDULER_MODE
+        interval_minutes: 调度间隔（分钟），指定时优先于 interval_hours
+        min_minutes: adaptive 模式的最短间隔（分钟）
+        max_minutes: adaptive 模式的最长间隔（分钟）
     """
-    global scheduler, scheduler_running
+    global scheduler, scheduler_running, scheduler_mode, scheduler_trigger, scheduler_quiet_hours
     
     if scheduler_running:
         logger.warning("调度器已经在运行中")
         return False
     
+    mode = mode or SCHEDULER_MODE
     try:
+        # 配置错误时直接启动失败，而不是在每次触发时报错
+        scheduler_quiet_hours = parse_hours(SCHEDULER_QUIET_HOURS)
+        if mode == "adaptive":
+            trigger = AdaptiveTrigger(
+                get_comment_arrival_rate,
+                min_minutes=min_minutes,
+                max_minutes=max_minutes,
+                target_batch=ADAPTIVE_TARGET_BATCH,
+                quiet_hours=SCHEDULER_QUIET_HOURS
+            )
+            description = f"自适应间隔 {trigger.min_minutes:g}-{trigger.max_minutes:g} 分钟"
+        else:
+            minutes = interval_minutes if interval_minutes else interval_hours * 60
+            trigger = IntervalTrigger(minutes=minutes)
+            description = f"每{minutes:g}分钟"
+
         scheduler = AsyncIOScheduler()
         
-        # 添加定时任务
+        # 添加定时任务：同一时间只允许一个实例运行，错过的多次触发合并为一次；
+        # next_run_time 为当前时间表示启动后立即执行一次（同样受 max_instances 约束）
         scheduler.add_job(
             scheduled_dify_call,
-            trigger=IntervalTrigger(hours=interval_hours),
+            trigger=trigger,
             id="dify_workflow_scheduler",
-            name=f"Dify Workflow定时执行 (每{interval_hours}小时)",
-            replace_existing=True
+            name=f"Dify Workflow定时执行 ({description})",
+            replace_existing=True,
+            max_instances=1,
+            coalesce=True,
+            next_run_time=datetime.now()
         )
         
         # 启动调度器
         scheduler.start()
         scheduler_running = True
+        scheduler_mode = mode
+        scheduler_trigger = trigger
         
-        logger.info("🎯 Dify workflow调度器已启动，每%d小时执行一次", interval_hours)
-        print(f"✅ Dify调度器已启动，每{interval_hours}小时执行一次")
-        
-        # 立即执行一次
-        asyncio.create_task(scheduled_dify_call())
+        logger.info("🎯 Dify workflow调度器已启动，%s", description)
+        print(f"✅ Dify调度器已启动，{description}")
         
         return True
         
@@ -176,7 +527,7 @@ def start_scheduler(interval_hours: int = DEFAULT_INTERVAL_HOURS):
 
 def stop_scheduler():
     """停止定时调度器"""
-    global scheduler, scheduler_running
+    global scheduler, scheduler_running, scheduler_trigger
     
     if not scheduler_running or scheduler is None:
         logger.warning("调度器未运行")
@@ -186,6 +537,7 @@ def stop_scheduler():
         scheduler.shutdown()
         scheduler = None
         scheduler_running = False
+        scheduler_trigger = None
         
         logger.info("🛑 Dify workflow调度器已停止")
         print("✅ Dify调度器已停止")
@@ -196,6 +548,17 @@ def stop_scheduler():
         return False
 
 
+def _scheduler_stats_summary() -> Dict[str, Any]:
+    """定时调用统计（与 SchedulerStatusResponse 的字段对应）"""
+    last_call_time = scheduler_stats["last_call_time"]
+    return {
+        "call_count": scheduler_stats["call_count"],
+        "error_count": scheduler_stats["error_count"],
+        "last_call_time": last_call_time.isoformat() if last_call_time else None,
+        "last_call_status": scheduler_stats["last_call_status"]
+    }
+
+
 def get_scheduler_status() -> Dict[str, Any]:
     """获取调度器状态"""
     global scheduler, scheduler_running
@@ -210,12 +573,17 @@ def get_scheduler_status() -> Dict[str, Any]:
         jobs = scheduler.get_jobs()
         if jobs:
             job = jobs[0]
-            return {
+            status = {
                 "running": True,
+                "mode": scheduler_mode,
                 "job_name": job.name,
                 "next_run_time": job.next_run_time.isoformat() if job.next_run_time else None,
-                "message": "调度器正常运行"
+                "message": "调度器正常运行",
+                **_scheduler_stats_summary()
             }
+            if isinstance(scheduler_trigger, AdaptiveTrigger):
+                status["adaptive"] = scheduler_trigger.status()
+            return status
         else:
             return {
                 "running": True,
@@ -230,10 +598,20 @@ def get_scheduler_status() -> Dict[str, Any]:
         }
 
 
-async def manual_call_dify() -> DifyCallResponse:
+async def manual_call_dify(response_mode: Optional[str] = None,
+                           execution_mode: Optional[str] = None) -> DifyCallResponse:
     """手动调用Dify workflow（用于测试）"""
     logger.info("执行手动Dify workflow调用")
-    return await call_dify_workflow()
+    if (execution_mode or DIFY_EXECUTION_MODE) == "fanout":
+        return await call_dify_workflow_fanout()
+    return await call_dify_workflow(response_mode=response_mode)
+
+
+def pause_scheduler():
+    """暂停调度器：不再触发新的运行，正在执行的运行不受影响"""
+    if scheduler_running and scheduler is not None:
+        scheduler.pause()
+        logger.info("Dify调度器已暂停")
 
 
 # 应用关闭时的清理函数
@@ -242,10 +620,11 @@ def cleanup_scheduler():
     global scheduler, scheduler_running
     
     if scheduler_running and scheduler is not None:
-        logger.info("✅ Dify调度器已停止")
         try:
-            scheduler.shutdown()
-        except:
-            pass
+            # 正在执行的运行会被取消，需要等待其完成时先调用 pause_scheduler 并排空
+            scheduler.shutdown(wait=False)
+            logger.info("✅ Dify调度器已停止")
+        except Exception as e:
+            logger.warning("停止Dify调度器时发生错误: %s", str(e))
         scheduler = None
         scheduler_running = False 
\ No newline at end of file
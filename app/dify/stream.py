@@ -0,0 +1,127 @@
+"""
+Dify 流式响应解析
+增量解析 workflow 的 SSE 事件，只在内存中保留精简的运行进度
+"""
+import json
+import logging
+import time
+from typing import Any, AsyncIterator, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+
+async def iter_sse_events(lines: AsyncIterator[str]) -> AsyncIterator[Dict[str, Any]]:
+    """
+    将 SSE 文本行解析为事件字典
+
+    Dify 每个事件只有一行 data，这里仍按 SSE 规范拼接多行 data，空行表示事件结束
+    """
+    data_lines = []
+    async for line in lines:
+        if line.startswith("data:"):
+            data_lines.append(line[5:].lstrip())
+            continue
+        if line == "" and data_lines:
+            payload = "\n".join(data_lines)
+            data_lines = []
+            try:
+                yield json.loads(payload)
+            except json.JSONDecodeError:
+                logger.warning("无法解析的Dify事件: %s", payload[:200])
+    if data_lines:
+        try:
+            yield json.loads("\n".join(data_lines))
+        except json.JSONDecodeError:
+            logger.warning("无法解析的Dify事件: %s", "\n".join(data_lines)[:200])
+
+
+class WorkflowRunProgress:
+    """
+    单次 workflow 运行的进度
+
+    每收到一个事件只更新计数和少量字段，不保存事件本身，
+    内存占用与运行中的节点数和迭代次数无关。
+    """
+
+    def __init__(self):
+        self.workflow_run_id: Optional[str] = None
+        self.task_id: Optional[str] = None
+        self.status = "pending"
+        self.event_count = 0
+        self.nodes_started = 0
+        self.nodes_finished = 0
+        self.nodes_failed = 0
+        self.iterations: Dict[str, Dict[str, Any]] = {}
+        self.current_node: Optional[str] = None
+        self.outputs: Optional[Dict[str, Any]] = None
+        self.error: Optional[str] = None
+        self.elapsed_time: Optional[float] = None
+        self.total_tokens: Optional[int] = None
+        self.started_at = time.time()
+        self.updated_at = self.started_at
+
+    @property
+    def finished(self) -> bool:
+        return self.status not in ("pending", "running")
+
+    def apply(self, event: Dict[str, Any]) -> None:
+        """根据一个 SSE 事件更新进度"""
+        self.event_count += 1
+        self.updated_at = time.time()
+        name = event.get("event")
+        data = event.get("data") or {}
+        self.task_id = event.get("task_id") or self.task_id
+        self.workflow_run_id = event.get("workflow_run_id") or self.workflow_run_id
+
+        if name == "workflow_started":
+            self.status = "running"
+        elif name == "node_started":
+            self.nodes_started += 1
+            self.current_node = data.get("title") or data.get("node_id")
+        elif name == "node_finished":
+            self.nodes_finished += 1
+            if data.get("status") == "failed":
+                self.nodes_failed += 1
+        elif name == "iteration_started":
+            self.iterations[data.get("node_id", "")] = {
+                "title": data.get("title"),
+                "index": 0,
+                "total": (data.get("metadata") or {}).get("iterator_length"),
+                "completed": False
+            }
+        elif name == "iteration_next":
+            iteration = self.iterations.setdefault(data.get("node_id", ""), {"index": 0, "completed": False})
+            iteration["index"] = data.get("index", iteration["index"] + 1)
+        elif name == "iteration_completed":
+            iteration = self.iterations.setdefault(data.get("node_id", ""), {"index": 0})
+            iteration["completed"] = True
+            iteration["total"] = data.get("steps") or iteration.get("total")
+        elif name == "workflow_finished":
+            self.status = data.get("status") or "succeeded"
+            self.outputs = data.get("outputs")
+            self.error = data.get("error")
+            self.elapsed_time = data.get("elapsed_time")
+            self.total_tokens = data.get("total_tokens")
+            self.current_node = None
+        elif name == "error":
+            self.status = "failed"
+            self.error = event.get("message") or data.get("error")
+
+    def summary(self) -> Dict[str, Any]:
+        """精简的运行摘要"""
+        return {
+            "workflow_run_id": self.workflow_run_id,
+            "task_id": self.task_id,
+            "status": self.status,
+            "current_node": self.current_node,
+            "event_count": self.event_count,
+            "nodes_started": self.nodes_started,
+            "nodes_finished": self.nodes_finished,
+            "nodes_failed": self.nodes_failed,
+            "iterations": self.iterations,
+            "outputs": self.outputs,
+            "error": self.error,
+            "elapsed_time": self.elapsed_time,
+            "total_tokens": self.total_tokens,
+            "duration": round(self.updated_at - self.started_at, 3)
+        }
@@ -0,0 +1,173 @@
+"""
+共享 HTTP 客户端 - 进程内复用连接池，避免每次调用重新建立 TCP / TLS 连接
+"""
+import logging
+from typing import Optional
+
+import httpx
+
+from app.config import (
+    BILIBILI_API_BASE_URL,
+    BILIBILI_HTTP_CLIENT,
+    BILIBILI_HTTP_MAX_CONNECTIONS,
+    BILIBILI_HTTP_MAX_KEEPALIVE,
+    BILIBILI_HTTP2,
+    LLM_TIMEOUT,
+    LLM_HTTP_MAX_CONNECTIONS,
+    LLM_HTTP_MAX_KEEPALIVE
+)
+from dify_config import (
+    REQUEST_TIMEOUT,
+    DIFY_HTTP_MAX_CONNECTIONS,
+    DIFY_HTTP_MAX_KEEPALIVE,
+    DIFY_HTTP_KEEPALIVE_EXPIRY,
+    DIFY_HTTP2
+)
+
+logger = logging.getLogger(__name__)
+
+# Dify 共享客户端
+_dify_client: Optional[httpx.AsyncClient] = None
+
+# OpenAI 兼容接口共享客户端（回复流水线的 openai 生成器）
+_llm_client: Optional[httpx.AsyncClient] = None
+
+# 由本模块创建并交给 bilibili_api 使用的会话
+_bilibili_session: Optional[httpx.AsyncClient] = None
+
+
+def _http2_available(enabled: bool) -> bool:
+    """HTTP/2 需要额外安装 h2（pip install 'httpx[http2]'），未安装时回退到 HTTP/1.1"""
+    if not enabled:
+        return False
+    try:
+        import h2  # noqa: F401
+        return True
+    except ImportError:
+        logger.warning("未安装 h2，HTTP/2 已禁用，请执行 pip install 'httpx[http2]'")
+        return False
+
+
+def create_dify_client() -> httpx.AsyncClient:
+    """按配置创建 Dify 客户端"""
+    return httpx.AsyncClient(
+        timeout=REQUEST_TIMEOUT,
+        limits=httpx.Limits(
+            max_connections=DIFY_HTTP_MAX_CONNECTIONS,
+            max_keepalive_connections=DIFY_HTTP_MAX_KEEPALIVE,
+            keepalive_expiry=DIFY_HTTP_KEEPALIVE_EXPIRY
+        ),
+        http2=_http2_available(DIFY_HTTP2)
+    )
+
+
+def get_dify_client() -> httpx.AsyncClient:
+    """
+    获取 Dify 共享客户端
+
+    正常情况下由应用生命周期创建；在脚本等未经过 lifespan 的场景中首次调用时创建
+    """
+    global _dify_client
+    if _dify_client is None or _dify_client.is_closed:
+        _dify_client = create_dify_client()
+    return _dify_client
+
+
+def get_llm_client() -> httpx.AsyncClient:
+    """
+    获取 OpenAI 兼容接口共享客户端
+
+    只有使用 openai 生成器时才需要，首次调用时创建，应用关闭时随其他共享客户端一起释放
+    """
+    global _llm_client
+    if _llm_client is None or _llm_client.is_closed:
+        _llm_client = httpx.AsyncClient(
+            timeout=LLM_TIMEOUT,
+            limits=httpx.Limits(
+                max_connections=LLM_HTTP_MAX_CONNECTIONS,
+                max_keepalive_connections=LLM_HTTP_MAX_KEEPALIVE,
+                keepalive_expiry=DIFY_HTTP_KEEPALIVE_EXPIRY
+            )
+        )
+    return _llm_client
+
+
+def redirect_to(base_url: str):
+    """
+    生成 httpx 请求钩子：把发往 *.bilibili.com 的请求改写到 base_url（保留路径和查询参数）
+
+    用于把 bilibili_api 指向本地替身服务做压测，无需修改 bilibili_api 内置的接口地址
+    """
+    target = httpx.URL(base_url)
+
+    async def hook(request: httpx.Request) -> None:
+        host = request.url.host
+        if host == "bilibili.com" or host.endswith(".bilibili.com"):
+            request.url = request.url.copy_with(scheme=target.scheme, host=target.host, port=target.port)
+            request.headers["Host"] = request.url.netloc.decode("ascii")
+
+    return hook
+
+
+def create_bilibili_session() -> httpx.AsyncClient:
+    """按配置创建供 bilibili_api 使用的 httpx 会话（超时、代理等沿用 bilibili_api 的请求设置）"""
+    from bilibili_api import request_settings
+
+    proxy = request_settings.get("proxy")
+    event_hooks = {"request": [redirect_to(BILIBILI_API_BASE_URL)]} if BILIBILI_API_BASE_URL else None
+    return httpx.AsyncClient(
+        event_hooks=event_hooks,
+        timeout=request_settings.get("timeout"),
+        proxy=proxy or None,
+        verify=request_settings.get("verify_ssl"),
+        trust_env=request_settings.get("trust_env"),
+        limits=httpx.Limits(
+            max_connections=BILIBILI_HTTP_MAX_CONNECTIONS,
+            max_keepalive_connections=BILIBILI_HTTP_MAX_KEEPALIVE
+        ),
+        http2=_http2_available(BILIBILI_HTTP2)
+    )
+
+
+async def setup_bilibili_session() -> None:
+    """
+    让 bilibili_api 在当前事件循环中使用带连接池配置的共享会话
+
+    BILIBILI_HTTP_CLIENT 为空时保持 bilibili_api 的默认请求客户端不变
+    """
+    global _bilibili_session
+    if BILIBILI_HTTP_CLIENT != "httpx":
+        if BILIBILI_API_BASE_URL:
+            logger.warning("BILIBILI_API_BASE_URL 只在 BILIBILI_HTTP_CLIENT=httpx 时生效，已忽略")
+        return
+    from bilibili_api import select_client, get_session, set_session
+
+    select_client("httpx")
+    # set_session 只能替换当前事件循环中已存在的会话，先让 bilibili_api 创建默认会话再替换并关闭它
+    default_session = get_session()
+    _bilibili_session = create_bilibili_session()
+    set_session(_bilibili_session)
+    await default_session.aclose()
+    logger.info("B站请求已切换为共享 httpx 会话（最大连接数 %d）", BILIBILI_HTTP_MAX_CONNECTIONS)
+    if BILIBILI_API_BASE_URL:
+        logger.warning("B站接口请求将转发到 %s", BILIBILI_API_BASE_URL)
+
+
+async def init_http_clients() -> None:
+    """应用启动时创建共享客户端"""
+    get_dify_client()
+    await setup_bilibili_session()
+
+
+async def close_http_clients() -> None:
+    """应用关闭时释放连接池"""
+    global _dify_client, _llm_client, _bilibili_session
+    if _dify_client is not None:
+        await _dify_client.aclose()
+        _dify_client = None
+    if _llm_client is not None:
+        await _llm_client.aclose()
+        _llm_client = None
+    if _bilibili_session is not None:
+        await _bilibili_session.aclose()
+        _bilibili_session = None
@@ -0,0 +1,213 @@
+"""
+多进程 leader 选举 - 基于 SQLite 租约和心跳
+同一主机上的多个 uvicorn worker 共享一个数据库文件，只有持有租约的进程运行调度器和后台轮询器
+"""
+import asyncio
+import inspect
+import logging
+import os
+import socket
+import sqlite3
+import threading
+import time
+import uuid
+from typing import Any, Callable, Dict, List, Optional
+
+from app.config import (
+    LEADER_ELECTION_ENABLED,
+    LEADER_LEASE_PATH,
+    LEADER_LEASE_TTL,
+    LEADER_HEARTBEAT_INTERVAL
+)
+
+logger = logging.getLogger(__name__)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS leader_lease (
+    name TEXT PRIMARY KEY,
+    holder TEXT NOT NULL,
+    pid INTEGER NOT NULL,
+    hostname TEXT,
+    acquired_at REAL NOT NULL,
+    expires_at REAL NOT NULL
+);
+"""
+
+# 成为 leader / 失去 leader 时的回调，可以是普通函数或协程函数
+Callback = Callable[[], Any]
+
+
+class LeaseStore:
+    """
+    租约存储
+
+    竞选和续约在 BEGIN IMMEDIATE 事务中完成，同一时刻只有一个进程能写入，
+    租约过期（持有者超过 ttl 秒未续约）后其他进程才能接管。
+    """
+
+    def __init__(self, path: str):
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, timeout=5, isolation_level=None, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(SCHEMA)
+
+    def close(self) -> None:
+        """关闭数据库连接"""
+        with self._lock:
+            self._conn.close()
+
+    def try_acquire(self, name: str, holder: str, ttl: float) -> Dict[str, Any]:
+        """
+        竞选或续约
+
+        Returns:
+            Dict[str, Any]: 当前的租约记录（holder 等于自己表示持有租约）
+        """
+        now = time.time()
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                row = self._conn.execute(
+                    "SELECT holder, pid, hostname, acquired_at, expires_at FROM leader_lease WHERE name = ?",
+                    (name,)
+                ).fetchone()
+                if row is None or row[0] == holder or row[4] < now:
+                    acquired_at = row[3] if row is not None and row[0] == holder else now
+                    row = (holder, os.getpid(), socket.gethostname(), acquired_at, now + ttl)
+                    self._conn.execute(
+                        "INSERT INTO leader_lease (name, holder, pid, hostname, acquired_at, expires_at) "
+                        "VALUES (?, ?, ?, ?, ?, ?) "
+                        "ON CONFLICT(name) DO UPDATE SET holder = excluded.holder, pid = excluded.pid, "
+                        "hostname = excluded.hostname, acquired_at = excluded.acquired_at, "
+                        "expires_at = excluded.expires_at",
+                        (name,) + row
+                    )
+                self._conn.execute("COMMIT")
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+        return dict(zip(("holder", "pid", "hostname", "acquired_at", "expires_at"), row))
+
+    def release(self, name: str, holder: str) -> None:
+        """主动释放租约，备用进程在下一次心跳时即可接管"""
+        with self._lock:
+            self._conn.execute("DELETE FROM leader_lease WHERE name = ? AND holder = ?", (name, holder))
+
+
+class LeaderElector:
+    """
+    leader 选举器
+
+    每 heartbeat_interval 秒竞选或续约一次；成为 leader 时依次调用 on_elected 回调，
+    失去租约（例如事件循环长时间阻塞导致续约超时）或停止时调用 on_demoted 回调。
+    """
+
+    def __init__(self, path: str = LEADER_LEASE_PATH, name: str = "scheduler",
+                 ttl: float = LEADER_LEASE_TTL, heartbeat_interval: float = LEADER_HEARTBEAT_INTERVAL,
+                 enabled: bool = LEADER_ELECTION_ENABLED):
+        self.path = path
+        self.name = name
+        self.ttl = ttl
+        self.heartbeat_interval = min(heartbeat_interval, ttl / 2)
+        self.enabled = enabled
+        self.holder = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self.is_leader = False
+        self.lease: Optional[Dict[str, Any]] = None
+        self.last_error: Optional[str] = None
+        self._on_elected: List[Callback] = []
+        self._on_demoted: List[Callback] = []
+        self._store: Optional[LeaseStore] = None
+        self._task: Optional[asyncio.Task] = None
+
+    def on_elected(self, callback: Callback) -> None:
+        """注册成为 leader 时的回调"""
+        self._on_elected.append(callback)
+
+    def on_demoted(self, callback: Callback) -> None:
+        """注册失去 leader 身份时的回调"""
+        self._on_demoted.append(callback)
+
+    async def start(self) -> None:
+        """开始竞选；未启用选举时当前进程直接成为 leader（单进程部署）"""
+        if not self.enabled:
+            await self._set_leader(True)
+            return
+        if self._task is not None and not self._task.done():
+            return
+        self._store = LeaseStore(self.path)
+        await self._heartbeat()
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        """停止竞选，释放租约并执行 on_demoted 回调"""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await self._set_leader(False)
+        if self._store is not None:
+            try:
+                await asyncio.to_thread(self._store.release, self.name, self.holder)
+            except Exception as e:
+                logger.warning("释放leader租约失败: %s", str(e))
+            self._store.close()
+            self._store = None
+
+    async def _run(self) -> None:
+        while True:
+            await asyncio.sleep(self.heartbeat_interval)
+            await self._heartbeat()
+
+    async def _heartbeat(self) -> None:
+        try:
+            self.lease = await asyncio.to_thread(self._store.try_acquire, self.name, self.holder, self.ttl)
+            self.last_error = None
+            leader = self.lease["holder"] == self.holder
+        except Exception as e:
+            # 数据库暂时不可用时无法确认租约，超过租约有效期后主动让出
+            self.last_error = str(e)
+            logger.warning("leader 续约失败: %s", str(e))
+            leader = self.is_leader and self.lease is not None and self.lease["expires_at"] > time.time()
+        await self._set_leader(leader)
+
+    async def _set_leader(self, leader: bool) -> None:
+        if leader == self.is_leader:
+            return
+        self.is_leader = leader
+        if leader:
+            logger.info("👑 进程 %d 成为 leader，启动调度器和后台任务", os.getpid())
+        else:
+            logger.info("进程 %d 不再是 leader，停止调度器和后台任务", os.getpid())
+        for callback in (self._on_elected if leader else self._on_demoted):
+            try:
+                result = callback()
+                if inspect.isawaitable(result):
+                    await result
+            except Exception as e:
+                logger.error("leader 切换回调 %s 执行失败: %s",
+                             getattr(callback, "__name__", repr(callback)), str(e))
+
+    def status(self) -> Dict[str, Any]:
+        """当前进程与 leader 的信息"""
+        if not self.enabled:
+            return {"enabled": False, "is_leader": self.is_leader, "pid": os.getpid(), "leader_pid": os.getpid()}
+        lease = self.lease or {}
+        expires_at = lease.get("expires_at")
+        return {
+            "enabled": True,
+            "is_leader": self.is_leader,
+            "pid": os.getpid(),
+            "leader_pid": lease.get("pid"),
+            "leader_hostname": lease.get("hostname"),
+            "leader_since": lease.get("acquired_at"),
+            "lease_expires_in": round(expires_at - time.time(), 3) if expires_at else None,
+            "last_error": self.last_error
+        }
+
+
+# 全局 leader 选举器
+leader_elector = LeaderElector()
@@ -0,0 +1,152 @@
+"""
+优雅关闭 - 记录进行中的回复、评论拉取和 workflow 运行，关闭时等待它们完成
+"""
+import asyncio
+import functools
+import json
+import logging
+import signal
+import time
+from contextlib import asynccontextmanager
+from typing import Any, Awaitable, Callable, Dict, List, Optional, TypeVar
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+
+class DrainController:
+    """
+    排空控制器
+
+    进入排空状态后不再接受新的工作（接口返回 503，健康检查报告 draining），
+    关闭流程通过 wait_idle 等待进行中的操作在截止时间前完成。
+    """
+
+    def __init__(self):
+        self.draining = False
+        self.draining_since: Optional[float] = None
+        self._inflight: Dict[str, int] = {}
+        self._listeners: List[Callable[[], Any]] = []
+
+    def on_drain(self, listener: Callable[[], Any]) -> None:
+        """注册进入排空状态时的回调（例如关闭长连接推送）"""
+        self._listeners.append(listener)
+
+    def begin(self) -> None:
+        """进入排空状态（可重复调用）"""
+        if self.draining:
+            return
+        self.draining = True
+        self.draining_since = time.time()
+        logger.info("开始排空：不再接受新的工作，进行中: %s", self._inflight)
+        for listener in self._listeners:
+            try:
+                listener()
+            except Exception as e:
+                logger.warning("排空回调执行失败: %s", str(e))
+
+    @asynccontextmanager
+    async def track(self, kind: str):
+        """在 with 块内把一个操作计为进行中"""
+        self._inflight[kind] = self._inflight.get(kind, 0) + 1
+        try:
+            yield
+        finally:
+            self._inflight[kind] -= 1
+
+    def tracked(self, kind: str):
+        """装饰器：异步函数执行期间计为进行中的 kind 操作"""
+        def decorator(func: Callable[..., Awaitable[T]]) -> Callable[..., Awaitable[T]]:
+            @functools.wraps(func)
+            async def wrapper(*args, **kwargs) -> T:
+                async with self.track(kind):
+                    return await func(*args, **kwargs)
+            return wrapper
+        return decorator
+
+    def inflight(self) -> Dict[str, int]:
+        """各类进行中的操作数"""
+        return {kind: count for kind, count in self._inflight.items() if count > 0}
+
+    async def wait_idle(self, timeout: float, poll_interval: float = 0.1) -> bool:
+        """
+        等待进行中的操作全部完成
+
+        Returns:
+            bool: 是否在 timeout 秒内全部完成
+        """
+        deadline = time.monotonic() + timeout
+        while self.inflight():
+            if time.monotonic() >= deadline:
+                return False
+            await asyncio.sleep(poll_interval)
+        return True
+
+    def install_signal_handlers(self) -> None:
+        """
+        在 uvicorn 的 SIGTERM / SIGINT 处理函数之前进入排空状态
+
+        uvicorn 收到信号后会先等待所有连接关闭再执行 lifespan 关闭流程，
+        提前进入排空状态可以让 SSE / WebSocket 推送及时结束，避免关闭被长连接卡住。
+        """
+        loop = asyncio.get_running_loop()
+        for sig in (signal.SIGTERM, signal.SIGINT):
+            try:
+                previous = signal.getsignal(sig)
+            except ValueError:
+                # 非主线程中无法设置信号处理函数
+                return
+
+            def handler(signum, frame, previous=previous):
+                loop.call_soon_threadsafe(self.begin)
+                if callable(previous):
+                    previous(signum, frame)
+                elif previous is not None:
+                    signal.signal(signum, previous)
+                    signal.raise_signal(signum)
+
+            try:
+                signal.signal(sig, handler)
+            except ValueError:
+                return
+
+    def status(self) -> Dict[str, Any]:
+        return {
+            "draining": self.draining,
+            "draining_since": self.draining_since,
+            "inflight": self.inflight()
+        }
+
+
+class DrainMiddleware:
+    """
+    排空期间拒绝新的写请求（返回 503 和 Retry-After），GET 请求和健康检查照常处理
+
+    使用纯 ASGI 实现，不影响流式响应和 WebSocket
+    """
+
+    def __init__(self, app, controller: "DrainController", retry_after: int = 5):
+        self.app = app
+        self.controller = controller
+        self.retry_after = retry_after
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "http" and self.controller.draining and scope["method"] not in ("GET", "HEAD", "OPTIONS"):
+            body = json.dumps({"detail": "服务正在关闭，请稍后重试"}, ensure_ascii=False).encode("utf-8")
+            await send({
+                "type": "http.response.start",
+                "status": 503,
+                "headers": [
+                    (b"content-type", b"application/json"),
+                    (b"content-length", str(len(body)).encode()),
+                    (b"retry-after", str(self.retry_after).encode())
+                ]
+            })
+            await send({"type": "http.response.body", "body": body})
+            return
+        await self.app(scope, receive, send)
+
+
+# 全局排空控制器
+drain_controller = DrainController()
@@ -0,0 +1,288 @@
+"""
+进程内指标 - 计数器、仪表和直方图，以 Prometheus 文本格式导出
+
+记录指标只是在字典中累加，没有锁和后台线程；仪表可以注册回调，在抓取时才计算
+"""
+import bisect
+import math
+import time
+from typing import Any, Awaitable, Callable, Dict, Iterable, List, Optional, Tuple, TypeVar
+
+T = TypeVar("T")
+
+# 默认的耗时分桶（秒），覆盖从本地缓存命中到 Dify 长时间运行的范围
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+
+LabelValues = Tuple[str, ...]
+
+
+def _escape(value: Any) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_value(value: float) -> str:
+    if value == math.inf:
+        return "+Inf"
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return repr(value)
+
+
+def _format_labels(names: Iterable[str], values: Iterable[Any]) -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class Metric:
+    """指标基类"""
+
+    type = "untyped"
+
+    def __init__(self, name: str, documentation: str, labelnames: Iterable[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+
+    def samples(self) -> List[Tuple[str, LabelValues, Tuple[str, ...], float]]:
+        """(指标名, 标签名, 标签值, 数值) 列表"""
+        raise NotImplementedError
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.type}"]
+        for name, labelnames, values, value in self.samples():
+            lines.append(f"{name}{_format_labels(labelnames, values)} {_format_value(value)}")
+        return lines
+
+
+class Counter(Metric):
+    """只增不减的计数器"""
+
+    type = "counter"
+
+    def __init__(self, name: str, documentation: str, labelnames: Iterable[str] = ()):
+        super().__init__(name, documentation, labelnames)
+        self._values: Dict[LabelValues, float] = {}
+
+    def inc(self, *labels: str, amount: float = 1) -> None:
+        self._values[labels] = self._values.get(labels, 0) + amount
+
+    def get(self, *labels: str) -> float:
+        return self._values.get(labels, 0)
+
+    def samples(self):
+        return [(self.name, self.labelnames, labels, value) for labels, value in self._values.items()]
+
+
+class Gauge(Metric):
+    """
+    仪表
+
+    可以直接 set，也可以通过 set_function 注册回调，在抓取时计算当前值；
+    带标签的仪表回调返回 {标签值元组: 数值}
+    """
+
+    type = "gauge"
+
+    def __init__(self, name: str, documentation: str, labelnames: Iterable[str] = ()):
+        super().__init__(name, documentation, labelnames)
+        self._values: Dict[LabelValues, float] = {}
+        self._function: Optional[Callable[[], Any]] = None
+
+    def set(self, value: float, *labels: str) -> None:
+        self._values[labels] = value
+
+    def set_function(self, function: Callable[[], Any]) -> None:
+        self._function = function
+
+    def samples(self):
+        values = self._values
+        if self._function is not None:
+            try:
+                result = self._function()
+            except Exception:
+                return []
+            if result is None:
+                return []
+            values = result if isinstance(result, dict) else {(): result}
+        return [(self.name, self.labelnames, labels, float(value)) for labels, value in values.items()]
+
+
+class Histogram(Metric):
+    """直方图：按分桶累计观测值的次数，并记录总和与总数"""
+
+    type = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: Iterable[str] = (),
+                 buckets: Iterable[float] = DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # 每组标签: [各分桶计数..., 总和, 总数]
+        self._values: Dict[LabelValues, List[float]] = {}
+
+    def observe(self, value: float, *labels: str) -> None:
+        state = self._values.get(labels)
+        if state is None:
+            state = self._values[labels] = [0] * (len(self.buckets) + 2)
+        index = bisect.bisect_left(self.buckets, value)
+        if index < len(self.buckets):
+            state[index] += 1
+        state[-2] += value
+        state[-1] += 1
+
+    async def time(self, awaitable: Awaitable[T], *labels: str) -> T:
+        """
+        等待 awaitable 并记录耗时，标签末尾追加 outcome（success / error）
+        """
+        started = time.perf_counter()
+        outcome = "error"
+        try:
+            result = await awaitable
+            outcome = "success"
+            return result
+        finally:
+            self.observe(time.perf_counter() - started, *labels, outcome)
+
+    def samples(self):
+        samples = []
+        bucket_labelnames = self.labelnames + ("le",)
+        for labels, state in self._values.items():
+            cumulative = 0
+            for bound, count in zip(self.buckets, state):
+                cumulative += count
+                samples.append((f"{self.name}_bucket", bucket_labelnames, labels + (_format_value(bound),), cumulative))
+            samples.append((f"{self.name}_bucket", bucket_labelnames, labels + ("+Inf",), state[-1]))
+            samples.append((f"{self.name}_sum", self.labelnames, labels, state[-2]))
+            samples.append((f"{self.name}_count", self.labelnames, labels, state[-1]))
+        return samples
+
+
+class MetricsRegistry:
+    """指标注册表"""
+
+    def __init__(self):
+        self._metrics: Dict[str, Metric] = {}
+
+    def _register(self, metric: Metric) -> Metric:
+        if metric.name in self._metrics:
+            raise ValueError(f"指标已存在: {metric.name}")
+        self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name: str, documentation: str, labelnames: Iterable[str] = ()) -> Counter:
+        return self._register(Counter(name, documentation, labelnames))
+
+    def gauge(self, name: str, documentation: str, labelnames: Iterable[str] = ()) -> Gauge:
+        return self._register(Gauge(name, documentation, labelnames))
+
+    def histogram(self, name: str, documentation: str, labelnames: Iterable[str] = (),
+                  buckets: Iterable[float] = DEFAULT_BUCKETS) -> Histogram:
+        return self._register(Histogram(name, documentation, labelnames, buckets))
+
+    def get(self, name: str) -> Optional[Metric]:
+        return self._metrics.get(name)
+
+    def render(self) -> str:
+        """Prometheus 文本格式（version 0.0.4）"""
+        lines: List[str] = []
+        for metric in self._metrics.values():
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+# 全局指标注册表
+registry = MetricsRegistry()
+
+BILIBILI_REQUEST_SECONDS = registry.histogram(
+    "bilibili_request_duration_seconds",
+    "B站接口单次请求耗时（每次重试单独计时）",
+    ("operation", "outcome")
+)
+DIFY_RUN_SECONDS = registry.histogram(
+    "dify_run_duration_seconds",
+    "Dify workflow 运行耗时",
+    ("mode", "outcome")
+)
+REPLIES_TOTAL = registry.counter(
+    "replies_total",
+    "回复结果计数（sent: 已发送，failed: 发送失败，unknown: 结果未知，deduplicated: 幂等去重，conflict: 幂等键内容冲突）",
+    ("result",)
+)
+SCHEDULED_RUNS_TOTAL = registry.counter(
+    "scheduled_runs_total",
+    "定时调度触发的 Dify workflow 运行次数（success / failed / error）",
+    ("result",)
+)
+STAGE_SECONDS = registry.histogram(
+    "request_stage_duration_seconds",
+    "请求处理各阶段耗时（fetch: 上游同步，analyze: 未回复检测，validate: 构造模型，prefilter: 预过滤，serialize: 序列化）",
+    ("stage",)
+)
+PIPELINE_COMMENTS_TOTAL = registry.counter(
+    "pipeline_comments_total",
+    "回复流水线处理的评论数（replied / reply_failed / generate_failed / skipped / filtered）",
+    ("outcome",)
+)
+PIPELINE_STAGE_SECONDS = registry.histogram(
+    "pipeline_stage_duration_seconds",
+    "回复流水线各阶段耗时（generate: 生成回复，reply: 发送回复，total: 从认领到结束）",
+    ("stage",)
+)
+PREFILTER_DECISIONS_TOTAL = registry.counter(
+    "prefilter_decisions_total",
+    "预过滤判定的评论数（action: skip / canned / llm，rule: 命中的规则）",
+    ("action", "rule")
+)
+HTTP_REQUEST_SECONDS = registry.histogram(
+    "http_request_duration_seconds",
+    "HTTP 接口请求耗时（按路由模板统计）",
+    ("method", "route", "status"),
+    buckets=(0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+)
+
+
+class MetricsMiddleware:
+    """
+    按路由模板记录 HTTP 请求耗时（纯 ASGI 实现，流式响应按完整传输时间计）
+
+    路径参数替换为参数名、未匹配到路由的请求统一记为 unmatched，避免标签数量无限增长
+    """
+
+    def __init__(self, app, histogram: Histogram = HTTP_REQUEST_SECONDS):
+        self.app = app
+        self.histogram = histogram
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        started = time.perf_counter()
+        status = 500
+
+        async def send_wrapper(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            self.histogram.observe(time.perf_counter() - started, scope["method"], _route_template(scope), str(status))
+
+
+def _route_template(scope) -> str:
+    """
+    还原请求匹配到的路由模板（例如 /api/comments/reply/jobs/{job_id}）
+
+    被 include_router 挂载的路由在 scope["route"] 中只有子路由自身的路径模板，不含前缀；
+    路径参数不跨片段，前缀就是实际请求路径去掉模板所占片段后剩下的部分（已包含 root_path）
+    """
+    route = scope.get("route")
+    if route is None:
+        return "unmatched"
+    template = getattr(route, "path_format", None)
+    if not template:
+        return scope["path"]
+    depth = template.count("/")
+    prefix = "/".join(scope["path"].split("/")[:-depth])
+    return prefix + template
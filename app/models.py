@@ -1,7 +1,7 @@
 """
 数据模型 - 包含所有的Pydantic模型定义
 """
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
 from typing import List, Optional
 from datetime import datetime
 
@@ -12,6 +12,11 @@ class ReplyCommentRequest(BaseModel):
     rpid: int
     message: str
     root: int
+    idempotency_key: Optional[str] = None  # 默认使用被回复评论的 rpid
+
+
+class BatchReplyRequest(BaseModel):
+    items: List[ReplyCommentRequest]
 
 
 class DifyConfigRequest(BaseModel):
@@ -37,10 +42,46 @@ class UnrepliedCommentsResponse(BaseModel):
     count: int
 
 
+class ClaimCommentsResponse(BaseModel):
+    lease_id: str
+    expires_at: float
+    lease_seconds: float
+    result: List[CommentInfo]
+    count: int
+
+
 class ReplyResponse(BaseModel):
     success: bool
     message: str
     rpid: Optional[int] = None
+    # 失败后重试是否可能成功（幂等键冲突、结果未知时为 False），只在进程内使用，不出现在响应中
+    retryable: bool = Field(default=True, exclude=True)
+
+
+class ReplyJobResponse(BaseModel):
+    job_id: str
+    status: str  # queued / sending / succeeded / failed
+    oid: int
+    rpid: int
+    root: int
+    message: str
+    idempotency_key: str
+    attempts: int
+    next_attempt_at: Optional[float] = None
+    created_at: float
+    updated_at: float
+    result: Optional[ReplyResponse] = None
+    error: Optional[str] = None
+
+
+class BatchReplyJobResponse(BaseModel):
+    jobs: List[ReplyJobResponse]
+
+
+class BatchReplyResponse(BaseModel):
+    results: List[ReplyResponse]
+    success_count: int
+    failure_count: int
 
 
 class DifyCallResponse(BaseModel):
@@ -0,0 +1,3 @@
+"""
+进程内回复流水线模块
+"""
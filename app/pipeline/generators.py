@@ -0,0 +1,160 @@
+"""
+回复生成器 - 为单条评论生成回复内容，可替换为 Dify、OpenAI 兼容接口或本地模板
+"""
+import asyncio
+import logging
+from abc import ABC, abstractmethod
+from typing import Dict, Optional, Type
+
+import httpx
+
+from app.config import (
+    PIPELINE_REPLY_TEMPLATE,
+    PIPELINE_TEMPLATE_LATENCY,
+    LLM_BASE_URL,
+    LLM_API_KEY,
+    LLM_MODEL,
+    LLM_SYSTEM_PROMPT,
+    LLM_TEMPERATURE,
+    LLM_MAX_TOKENS,
+    LLM_TIMEOUT
+)
+from app.models import CommentInfo
+from app.http_client import get_llm_client
+from app.resilience import UpstreamStatusError, call_with_resilience
+from dify_config import MAX_RETRIES, DIFY_REPLY_INPUT_KEY, DIFY_REPLY_OUTPUT_KEY
+
+logger = logging.getLogger(__name__)
+
+# OpenAI 兼容接口暂时不可用的状态码，可以安全重试
+RETRYABLE_STATUS_CODES = {429, 500, 502, 503, 504}
+
+
+class ReplyGenerator(ABC):
+    """
+    回复生成器基类
+
+    generate 返回回复内容；返回 None 或空字符串表示不回复这条评论，抛出异常表示生成失败。
+    """
+
+    name = "base"
+
+    @abstractmethod
+    async def generate(self, comment: CommentInfo) -> Optional[str]:
+        """为评论生成回复内容"""
+
+    async def close(self) -> None:
+        """释放生成器持有的资源"""
+
+
+class DifyReplyGenerator(ReplyGenerator):
+    """
+    每条评论调用一次 Dify workflow（blocking 模式）
+
+    评论以 JSON 字符串传入 inputs[DIFY_REPLY_INPUT_KEY]，回复内容取自 outputs[DIFY_REPLY_OUTPUT_KEY]，
+    workflow 只负责生成，由流水线发送回复
+    """
+
+    name = "dify"
+
+    def __init__(self, input_key: str = DIFY_REPLY_INPUT_KEY, output_key: str = DIFY_REPLY_OUTPUT_KEY):
+        self.input_key = input_key
+        self.output_key = output_key
+
+    async def generate(self, comment: CommentInfo) -> Optional[str]:
+        from app.dify.service import call_dify_workflow
+
+        result = await call_dify_workflow({self.input_key: comment.model_dump_json()}, "blocking")
+        if not result.success:
+            raise RuntimeError(result.message)
+        outputs = ((result.response_data or {}).get("data") or {}).get("outputs") or {}
+        reply = outputs.get(self.output_key)
+        return reply.strip() if isinstance(reply, str) else None
+
+
+class OpenAIReplyGenerator(ReplyGenerator):
+    """
+    调用 OpenAI 兼容的 /chat/completions 接口生成回复
+
+    适用于 OpenAI、各类兼容网关以及本地推理服务（vLLM、Ollama 等），请求经过 "llm" 熔断器和退避重试，
+    使用应用生命周期管理的共享连接池
+    """
+
+    name = "openai"
+
+    def __init__(self, base_url: str = LLM_BASE_URL, api_key: str = LLM_API_KEY, model: str = LLM_MODEL,
+                 system_prompt: str = LLM_SYSTEM_PROMPT, temperature: float = LLM_TEMPERATURE,
+                 max_tokens: int = LLM_MAX_TOKENS, timeout: float = LLM_TIMEOUT):
+        self.endpoint = f"{base_url.rstrip('/')}/chat/completions"
+        self.model = model
+        self.system_prompt = system_prompt
+        self.temperature = temperature
+        self.max_tokens = max_tokens
+        self.timeout = timeout
+        self.headers = {"Content-Type": "application/json"}
+        if api_key:
+            self.headers["Authorization"] = f"Bearer {api_key}"
+
+    def _messages(self, comment: CommentInfo):
+        return [
+            {"role": "system", "content": self.system_prompt},
+            {"role": "user", "content": f"视频：{comment.title}\n观众 {comment.uname} 的评论：{comment.content}"}
+        ]
+
+    async def generate(self, comment: CommentInfo) -> Optional[str]:
+        async def post() -> httpx.Response:
+            response = await get_llm_client().post(self.endpoint, headers=self.headers, timeout=self.timeout, json={
+                "model": self.model,
+                "messages": self._messages(comment),
+                "temperature": self.temperature,
+                "max_tokens": self.max_tokens
+            })
+            if response.status_code in RETRYABLE_STATUS_CODES:
+                raise UpstreamStatusError("llm", response.status_code, response.text)
+            return response
+
+        response = await call_with_resilience(
+            "llm",
+            post,
+            retries=MAX_RETRIES,
+            is_retryable=lambda e: isinstance(e, (UpstreamStatusError, httpx.TransportError))
+        )
+        response.raise_for_status()
+        choices = response.json().get("choices") or []
+        if not choices:
+            return None
+        content = (choices[0].get("message") or {}).get("content")
+        return content.strip() if isinstance(content, str) else None
+
+
+class TemplateReplyGenerator(ReplyGenerator):
+    """
+    本地模板回复，不调用任何上游，用于压测和联调
+
+    模板可以使用 CommentInfo 的字段，例如 "谢谢{uname}的评论！"；latency 模拟生成耗时
+    """
+
+    name = "template"
+
+    def __init__(self, template: str = PIPELINE_REPLY_TEMPLATE, latency: float = PIPELINE_TEMPLATE_LATENCY):
+        self.template = template
+        self.latency = latency
+
+    async def generate(self, comment: CommentInfo) -> Optional[str]:
+        if self.latency > 0:
+            await asyncio.sleep(self.latency)
+        return self.template.format(**comment.model_dump())
+
+
+GENERATORS: Dict[str, Type[ReplyGenerator]] = {
+    generator.name: generator
+    for generator in (DifyReplyGenerator, OpenAIReplyGenerator, TemplateReplyGenerator)
+}
+
+
+def create_generator(name: str) -> ReplyGenerator:
+    """按名称创建回复生成器"""
+    generator = GENERATORS.get(name)
+    if generator is None:
+        raise ValueError(f"未知的回复生成器: {name}，可选: {', '.join(GENERATORS)}")
+    return generator()
@@ -0,0 +1,327 @@
+"""
+回复流水线 - 认领 → 过滤 → 生成 → 回复，各阶段通过有界队列相连，在服务进程内持续运行
+"""
+import asyncio
+import logging
+import time
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, List, Optional
+
+from app.config import (
+    BILIBILI_MID,
+    COMMENT_SNAPSHOT_MAX_AGE,
+    PIPELINE_GENERATOR,
+    PIPELINE_FETCH_INTERVAL,
+    PIPELINE_FETCH_BATCH,
+    PIPELINE_LEASE_SECONDS,
+    PIPELINE_MAX_INFLIGHT,
+    PIPELINE_QUEUE_SIZE,
+    PIPELINE_GENERATE_CONCURRENCY,
+    PIPELINE_REPLY_CONCURRENCY,
+    PREFILTER_ENABLED
+)
+from app.models import CommentInfo, ReplyResponse
+from app.bilibili.idempotency import STATUS_UNKNOWN
+from app.bilibili.service import (
+    claim_unreplied_comments,
+    dispatch_canned_replies,
+    get_claim_store,
+    get_comment_store,
+    get_reply_ledger,
+    reply_to_comment
+)
+from app.bilibili.poller import comment_poller
+from app.bilibili.broadcast import comment_broadcaster
+from app.pipeline.generators import ReplyGenerator, create_generator
+from app.metrics import PIPELINE_COMMENTS_TOTAL, PIPELINE_STAGE_SECONDS
+
+logger = logging.getLogger(__name__)
+
+STAGES = ("filter", "generate", "reply")
+
+
+@dataclass
+class PipelineItem:
+    """流水线中的一条评论"""
+    comment: CommentInfo
+    lease_id: str
+    reply: Optional[str] = None
+    claimed_at: float = field(default_factory=time.monotonic)
+
+
+class ReplyPipeline:
+    """
+    进程内回复流水线
+
+    - 认领：一个任务按容量认领未回复评论（与 Dify、外部脚本共用认领租约，不会重复处理）；
+      评论轮询器推送新评论时立即认领，否则每 fetch_interval 秒认领一次
+    - 过滤：丢弃已经回复过的评论；开启预过滤时，判定为固定回复的评论写入回复发件箱，不再生成回复
+    - 生成：generate_concurrency 个 worker 调用回复生成器
+    - 回复：reply_concurrency 个 worker 通过 reply_to_comment 发送（共享回复限流和幂等记录）
+
+    相邻阶段之间是长度为 queue_size 的有界队列，下游处理不过来时上游阻塞；
+    同时在流水线中的评论不超过 max_inflight 条，认领数随之收缩。
+    生成失败或不需要回复的评论保留认领租约，到期后重新处理，避免反复占用生成资源。
+    """
+
+    def __init__(self, generator: str = PIPELINE_GENERATOR, fetch_interval: float = PIPELINE_FETCH_INTERVAL,
+                 fetch_batch: int = PIPELINE_FETCH_BATCH, lease_seconds: float = PIPELINE_LEASE_SECONDS,
+                 max_inflight: int = PIPELINE_MAX_INFLIGHT, queue_size: int = PIPELINE_QUEUE_SIZE,
+                 generate_concurrency: int = PIPELINE_GENERATE_CONCURRENCY,
+                 reply_concurrency: int = PIPELINE_REPLY_CONCURRENCY,
+                 generator_factory: Callable[[str], ReplyGenerator] = create_generator):
+        self.generator_name = generator
+        self.fetch_interval = fetch_interval
+        self.fetch_batch = max(1, fetch_batch)
+        self.lease_seconds = lease_seconds
+        self.max_inflight = max(1, max_inflight)
+        self.queue_size = max(1, queue_size)
+        self.generate_concurrency = max(1, generate_concurrency)
+        self.reply_concurrency = max(1, reply_concurrency)
+        self._generator_factory = generator_factory
+        self._generator: Optional[ReplyGenerator] = None
+        self._filters: List[Callable[[PipelineItem], Optional[str]]] = []
+        self._listeners: List[Callable[[ReplyResponse], Any]] = []
+        self._queues: Dict[str, asyncio.Queue] = {}
+        self._items: Dict[int, PipelineItem] = {}
+        self._tasks: List[asyncio.Task] = []
+        self._room: Optional[asyncio.Event] = None
+        self._wakeup: Optional[asyncio.Event] = None
+        self._stopping = False
+        self.stats: Dict[str, int] = {}
+        self.last_error: Optional[str] = None
+
+    @property
+    def running(self) -> bool:
+        return any(not task.done() for task in self._tasks)
+
+    @property
+    def inflight(self) -> int:
+        return len(self._items)
+
+    def on_success(self, listener: Callable[[ReplyResponse], Any]) -> None:
+        """注册回复发送成功后的回调"""
+        self._listeners.append(listener)
+
+    def add_filter(self, rule: Callable[[PipelineItem], Optional[str]]) -> None:
+        """
+        注册过滤规则：返回结果名（计入 pipeline_comments_total）表示评论到此为止，返回 None 继续生成；
+        规则也可以直接设置 item.reply，跳过生成阶段
+        """
+        self._filters.append(rule)
+
+    def queue_depths(self) -> Dict[str, int]:
+        """各阶段队列中等待的评论数"""
+        return {stage: queue.qsize() for stage, queue in self._queues.items()}
+
+    def start(self, generator: Optional[str] = None) -> bool:
+        """在当前事件循环中启动流水线，generator 指定本次使用的回复生成器"""
+        if self.running:
+            logger.warning("回复流水线已经在运行中")
+            return False
+        self.generator_name = generator or self.generator_name
+        self._generator = self._generator_factory(self.generator_name)
+        self._stopping = False
+        self._room = asyncio.Event()
+        self._wakeup = asyncio.Event()
+        self._queues = {stage: asyncio.Queue(maxsize=self.queue_size) for stage in STAGES}
+        self._tasks = [
+            asyncio.create_task(self._fetch_loop()),
+            asyncio.create_task(self._watch_new_comments()),
+            asyncio.create_task(self._filter_loop()),
+            *(asyncio.create_task(self._generate_loop()) for _ in range(self.generate_concurrency)),
+            *(asyncio.create_task(self._reply_loop()) for _ in range(self.reply_concurrency))
+        ]
+        logger.info("回复流水线已启动（生成器 %s，生成并发 %d，回复并发 %d）",
+                    self.generator_name, self.generate_concurrency, self.reply_concurrency)
+        return True
+
+    async def stop(self, timeout: float = 0) -> None:
+        """
+        停止流水线：不再认领新评论，最多等待 timeout 秒让已认领的评论处理完，
+        之后取消剩余工作并释放其认领，其他消费者可以立即认领；
+        回复请求可能已经发出的评论保留认领直到租约到期，避免其他消费者再为它生成回复
+        """
+        if not self._tasks:
+            return
+        self._stopping = True
+        self._wakeup.set()
+        deadline = time.monotonic() + timeout
+        while self._items and time.monotonic() < deadline:
+            await asyncio.sleep(0.05)
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+        if self._items:
+            try:
+                ledger = get_reply_ledger()
+                statuses = await asyncio.gather(*[
+                    asyncio.to_thread(ledger.get_status, str(rpid)) for rpid in self._items
+                ])
+                release = [rpid for rpid, status in zip(self._items, statuses) if status != STATUS_UNKNOWN]
+                await asyncio.to_thread(get_claim_store().release, release)
+                logger.warning("%d 条评论未处理完，已释放 %d 条评论的认领", len(self._items), len(release))
+            except Exception as e:
+                logger.warning("释放流水线认领失败: %s", str(e))
+            self._items.clear()
+        if self._generator is not None:
+            await self._generator.close()
+            self._generator = None
+        logger.info("回复流水线已停止")
+
+    def refresh_soon(self) -> None:
+        """唤醒认领阶段立即认领一次"""
+        if self._wakeup is not None:
+            self._wakeup.set()
+
+    def _finish(self, item: PipelineItem, outcome: str) -> None:
+        """评论离开流水线"""
+        self._items.pop(item.comment.rpid, None)
+        self.stats[outcome] = self.stats.get(outcome, 0) + 1
+        PIPELINE_COMMENTS_TOTAL.inc(outcome)
+        PIPELINE_STAGE_SECONDS.observe(time.monotonic() - item.claimed_at, "total")
+        self._room.set()
+
+    async def _claim(self, limit: int) -> List[PipelineItem]:
+        snapshot = comment_poller.snapshot
+        unreplied = None
+        if comment_poller.running and snapshot is not None and snapshot.age <= COMMENT_SNAPSHOT_MAX_AGE:
+            unreplied = snapshot.response
+        claimed = await claim_unreplied_comments(limit, self.lease_seconds, "pipeline", unreplied)
+        return [PipelineItem(comment=comment, lease_id=claimed.lease_id) for comment in claimed.result]
+
+    async def _fetch_loop(self) -> None:
+        while not self._stopping:
+            room = self.max_inflight - len(self._items)
+            if room <= 0:
+                self._room.clear()
+                await self._room.wait()
+                continue
+
+            self._wakeup.clear()
+            limit = min(self.fetch_batch, room)
+            try:
+                items = await self._claim(limit)
+                self.last_error = None
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                items = []
+                self.last_error = str(e)
+                logger.error("流水线认领评论失败: %s", str(e))
+
+            for item in items:
+                self._items[item.comment.rpid] = item
+                self.stats["claimed"] = self.stats.get("claimed", 0) + 1
+                await self._queues["filter"].put(item)
+
+            # 认领满额说明还有积压，继续认领；否则等待新评论推送或下一个间隔
+            if len(items) < limit:
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout=self.fetch_interval)
+                except asyncio.TimeoutError:
+                    pass
+
+    async def _watch_new_comments(self) -> None:
+        """评论轮询器发现新的未回复评论时唤醒认领阶段"""
+        subscriber = comment_broadcaster.subscribe()
+        try:
+            while await subscriber.get() is not None:
+                self.refresh_soon()
+        finally:
+            comment_broadcaster.unsubscribe(subscriber)
+
+    async def _already_replied(self, item: PipelineItem) -> bool:
+        """快照中的评论可能刚被回复过，发送回复时会写入本地存储"""
+        return await asyncio.to_thread(get_comment_store().is_replied, item.comment.rpid, BILIBILI_MID)
+
+    async def _filter_loop(self) -> None:
+        queue = self._queues["filter"]
+        while True:
+            item = await queue.get()
+            try:
+                outcome = "filtered" if await self._already_replied(item) else None
+                if outcome is None:
+                    for rule in self._filters:
+                        outcome = rule(item)
+                        if outcome is not None:
+                            break
+                if outcome is None and PREFILTER_ENABLED and not item.reply:
+                    if not await dispatch_canned_replies([item.comment]):
+                        outcome = "canned"
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning("过滤评论 %s 时发生错误: %s", item.comment.rpid, str(e))
+                outcome = None
+            if outcome is not None:
+                self._finish(item, outcome)
+            elif item.reply:
+                await self._queues["reply"].put(item)
+            else:
+                await self._queues["generate"].put(item)
+
+    async def _generate_loop(self) -> None:
+        queue = self._queues["generate"]
+        while True:
+            item = await queue.get()
+            started = time.monotonic()
+            try:
+                reply = await self._generator.generate(item.comment)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error("为评论 %s 生成回复失败: %s", item.comment.rpid, str(e))
+                self._finish(item, "generate_failed")
+                continue
+            finally:
+                PIPELINE_STAGE_SECONDS.observe(time.monotonic() - started, "generate")
+
+            if not reply:
+                self._finish(item, "skipped")
+                continue
+            item.reply = reply
+            await self._queues["reply"].put(item)
+
+    async def _reply_loop(self) -> None:
+        queue = self._queues["reply"]
+        while True:
+            item = await queue.get()
+            comment = item.comment
+            started = time.monotonic()
+            try:
+                result = await reply_to_comment(comment.oid, comment.rpid, item.reply, comment.root or comment.rpid)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                result = ReplyResponse(success=False, message=f"回复评论时发生错误: {str(e)}")
+            PIPELINE_STAGE_SECONDS.observe(time.monotonic() - started, "reply")
+            if not result.success:
+                self._finish(item, "reply_failed")
+                continue
+            self._finish(item, "replied")
+            for listener in self._listeners:
+                try:
+                    listener(result)
+                except Exception as e:
+                    logger.warning("回复成功回调执行失败: %s", str(e))
+
+    def status(self) -> Dict[str, Any]:
+        """流水线运行状态、各阶段队列长度和累计处理结果"""
+        return {
+            "running": self.running,
+            "generator": self.generator_name,
+            "inflight": self.inflight,
+            "max_inflight": self.max_inflight,
+            "queues": self.queue_depths(),
+            "generate_concurrency": self.generate_concurrency,
+            "reply_concurrency": self.reply_concurrency,
+            "stats": dict(self.stats),
+            "last_error": self.last_error
+        }
+
+
+# 全局回复流水线
+reply_pipeline = ReplyPipeline()
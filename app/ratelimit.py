@@ -0,0 +1,53 @@
+"""
+限流工具 - 令牌桶限流器
+"""
+import asyncio
+import time
+
+
+class TokenBucket:
+    """
+    异步令牌桶
+
+    令牌以 rate 个/秒的速度补充，最多积攒 burst 个。acquire 按调用顺序排队，
+    令牌不足时等待，因此长期吞吐稳定在 rate，短时突发不超过 burst。
+    rate <= 0 表示不限流。
+    """
+
+    def __init__(self, rate: float, burst: int = 1):
+        self.rate = rate
+        self.capacity = max(1, burst)
+        self._tokens = float(self.capacity)
+        self._updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    async def acquire(self, tokens: float = 1) -> float:
+        """
+        获取令牌，必要时等待
+
+        Returns:
+            float: 本次等待的秒数
+        """
+        if self.rate <= 0:
+            return 0.0
+        started = time.monotonic()
+        async with self._lock:
+            while True:
+                self._refill()
+                if self._tokens >= tokens:
+                    self._tokens -= tokens
+                    return time.monotonic() - started
+                await asyncio.sleep((tokens - self._tokens) / self.rate)
+
+    @property
+    def available(self) -> float:
+        """当前可用令牌数"""
+        if self.rate <= 0:
+            return float("inf")
+        self._refill()
+        return self._tokens
@@ -0,0 +1,219 @@
+"""
+上游调用容错 - 指数退避重试、熔断器和对冲请求
+Dify 和 B站服务共用，按上游名称分别维护熔断状态
+"""
+import asyncio
+import logging
+import random
+import time
+from typing import Any, Awaitable, Callable, Dict, Optional, TypeVar
+
+from app.config import (
+    RETRY_BASE_DELAY,
+    RETRY_MAX_DELAY,
+    CIRCUIT_FAILURE_THRESHOLD,
+    CIRCUIT_RECOVERY_TIMEOUT
+)
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+STATE_CLOSED = "closed"
+STATE_OPEN = "open"
+STATE_HALF_OPEN = "half_open"
+
+
+class CircuitOpenError(Exception):
+    """熔断器处于打开状态，调用被直接拒绝"""
+
+    def __init__(self, upstream: str, retry_after: float):
+        super().__init__(f"{upstream} 熔断中，{retry_after:.0f} 秒后重试")
+        self.upstream = upstream
+        self.retry_after = retry_after
+
+
+class UpstreamStatusError(Exception):
+    """上游返回了表示暂时不可用的 HTTP 状态码"""
+
+    def __init__(self, upstream: str, status_code: int, content: str = ""):
+        super().__init__(f"{upstream} 返回状态码 {status_code}")
+        self.upstream = upstream
+        self.status_code = status_code
+        self.content = content
+
+
+class CircuitBreaker:
+    """
+    熔断器
+
+    连续失败 failure_threshold 次后打开，打开期间直接拒绝调用；
+    recovery_timeout 秒后进入半开状态，只放行一个探测请求，成功则关闭，失败则重新打开。
+    """
+
+    def __init__(self, name: str, failure_threshold: int = CIRCUIT_FAILURE_THRESHOLD,
+                 recovery_timeout: float = CIRCUIT_RECOVERY_TIMEOUT):
+        self.name = name
+        self.failure_threshold = max(1, failure_threshold)
+        self.recovery_timeout = recovery_timeout
+        self.state = STATE_CLOSED
+        self.consecutive_failures = 0
+        self.total_failures = 0
+        self.total_successes = 0
+        self.rejected = 0
+        self.opened_at: Optional[float] = None
+        self.last_error: Optional[str] = None
+        self._probing = False
+
+    def before_call(self) -> None:
+        """调用前检查，熔断中时抛出 CircuitOpenError"""
+        if self.state == STATE_OPEN:
+            elapsed = time.monotonic() - self.opened_at
+            if elapsed < self.recovery_timeout:
+                self.rejected += 1
+                raise CircuitOpenError(self.name, self.recovery_timeout - elapsed)
+            self.state = STATE_HALF_OPEN
+            self._probing = False
+        if self.state == STATE_HALF_OPEN:
+            if self._probing:
+                self.rejected += 1
+                raise CircuitOpenError(self.name, self.recovery_timeout)
+            self._probing = True
+
+    def record_success(self) -> None:
+        self.total_successes += 1
+        self.consecutive_failures = 0
+        self._probing = False
+        if self.state != STATE_CLOSED:
+            logger.info("%s 熔断器已恢复", self.name)
+        self.state = STATE_CLOSED
+
+    def record_failure(self, error: BaseException) -> None:
+        self.total_failures += 1
+        self.consecutive_failures += 1
+        self.last_error = str(error)
+        self._probing = False
+        if self.state == STATE_HALF_OPEN or self.consecutive_failures >= self.failure_threshold:
+            if self.state != STATE_OPEN:
+                logger.warning("%s 连续失败 %d 次，熔断 %.0f 秒", self.name,
+                               self.consecutive_failures, self.recovery_timeout)
+            self.state = STATE_OPEN
+            self.opened_at = time.monotonic()
+
+    def release(self) -> None:
+        """调用既未成功也未失败（例如被取消）时释放半开探测名额"""
+        self._probing = False
+
+    def status(self) -> Dict[str, Any]:
+        retry_after = None
+        if self.state == STATE_OPEN:
+            retry_after = round(max(0.0, self.recovery_timeout - (time.monotonic() - self.opened_at)), 3)
+        return {
+            "state": self.state,
+            "consecutive_failures": self.consecutive_failures,
+            "total_failures": self.total_failures,
+            "total_successes": self.total_successes,
+            "rejected": self.rejected,
+            "retry_after": retry_after,
+            "last_error": self.last_error
+        }
+
+
+# 按上游名称维护的熔断器
+breakers: Dict[str, CircuitBreaker] = {}
+
+
+def get_breaker(upstream: str) -> CircuitBreaker:
+    """获取（必要时创建）指定上游的熔断器"""
+    breaker = breakers.get(upstream)
+    if breaker is None:
+        breaker = breakers[upstream] = CircuitBreaker(upstream)
+    return breaker
+
+
+def get_resilience_status() -> Dict[str, Dict[str, Any]]:
+    """所有上游的熔断器状态"""
+    return {name: breaker.status() for name, breaker in breakers.items()}
+
+
+def backoff_delay(attempt: int, base: float = RETRY_BASE_DELAY, cap: float = RETRY_MAX_DELAY) -> float:
+    """第 attempt 次重试前的等待时间：指数退避 + 全抖动"""
+    return random.uniform(0, min(cap, base * (2 ** attempt)))
+
+
+async def hedged(func: Callable[[], Awaitable[T]], delay: float) -> T:
+    """
+    对冲请求：第一次请求 delay 秒内未完成时再发一次，取先成功的结果并取消另一个
+
+    只能用于幂等的读请求
+    """
+    first = asyncio.ensure_future(func())
+    tasks = [first]
+    try:
+        done, _ = await asyncio.wait({first}, timeout=delay)
+        if done:
+            return first.result()
+
+        tasks.append(asyncio.ensure_future(func()))
+        pending = set(tasks)
+        error: Optional[BaseException] = None
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                if task.exception() is None:
+                    return task.result()
+                error = task.exception()
+        raise error
+    finally:
+        # 调用方被取消（包括等待 delay 期间）或已取得结果时，取消所有未完成的请求
+        for task in tasks:
+            if not task.done():
+                task.cancel()
+
+
+async def call_with_resilience(
+    upstream: str,
+    func: Callable[[], Awaitable[T]],
+    retries: int = 0,
+    is_retryable: Callable[[BaseException], bool] = lambda e: False,
+    is_failure: Optional[Callable[[BaseException], bool]] = None,
+    hedge_delay: float = 0
+) -> T:
+    """
+    带重试、熔断和可选对冲的上游调用
+
+    Args:
+        upstream: 上游名称，决定使用哪个熔断器
+        func: 发起一次调用的函数，每次尝试都会重新调用
+        retries: 最多重试次数（不含第一次）
+        is_retryable: 判断异常是否值得重试
+        is_failure: 判断异常是否说明上游不健康（计入熔断），默认与 is_retryable 相同
+        hedge_delay: 大于 0 时对每次尝试启用对冲请求，仅用于幂等读
+    """
+    breaker = get_breaker(upstream)
+    is_failure = is_failure or is_retryable
+    attempt = 0
+    while True:
+        breaker.before_call()
+        try:
+            if hedge_delay > 0:
+                result = await hedged(func, hedge_delay)
+            else:
+                result = await func()
+        except asyncio.CancelledError:
+            breaker.release()
+            raise
+        except Exception as e:
+            if is_failure(e):
+                breaker.record_failure(e)
+            else:
+                breaker.release()
+            if attempt >= retries or not is_retryable(e):
+                raise
+            delay = backoff_delay(attempt)
+            attempt += 1
+            logger.warning("%s 调用失败，%.2f 秒后第 %d 次重试: %s", upstream, delay, attempt, str(e))
+            await asyncio.sleep(delay)
+            continue
+        breaker.record_success()
+        return result
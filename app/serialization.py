@@ -0,0 +1,109 @@
+"""
+响应序列化 - 跳过重复校验构造模型、orjson 序列化和 gzip 压缩
+"""
+import gzip
+import json
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple, Type, TypeVar
+
+from fastapi.responses import JSONResponse
+from pydantic import BaseModel
+
+from app.config import FAST_SERIALIZATION, RESPONSE_GZIP_MIN_SIZE, RESPONSE_GZIP_LEVEL
+
+try:
+    import orjson
+except ImportError:  # orjson 是可选依赖，未安装时使用 pydantic / 标准库序列化
+    orjson = None
+
+Model = TypeVar("Model", bound=BaseModel)
+
+# 同一响应体的压缩结果按 ETag 复用，快照和缓存命中时不重复压缩
+_GZIP_CACHE_SIZE = 4
+_gzip_cache: "OrderedDict[str, bytes]" = OrderedDict()
+
+# 各模型的字段名，trusted_model 只接受字段名与之完全一致的数据
+_MODEL_FIELDS: Dict[type, frozenset] = {}
+
+
+def trusted_model(model: Type[Model], data: Dict[str, Any]) -> Model:
+    """
+    用已知类型正确的数据构造模型，不再逐字段校验
+
+    只用于字段与模型完全一致的可信数据（例如本地存储查询出的评论），
+    比 model_construct 更快；字段名不一致或关闭 FAST_SERIALIZATION 时回退到正常校验。
+    """
+    fields = _MODEL_FIELDS.get(model)
+    if fields is None:
+        fields = _MODEL_FIELDS[model] = frozenset(model.model_fields)
+    if not FAST_SERIALIZATION or data.keys() != fields:
+        return model(**data)
+    instance = model.__new__(model)
+    object.__setattr__(instance, "__dict__", data)
+    object.__setattr__(instance, "__pydantic_fields_set__", set(data))
+    object.__setattr__(instance, "__pydantic_extra__", None)
+    object.__setattr__(instance, "__pydantic_private__", None)
+    return instance
+
+
+def _default(value: Any) -> Any:
+    """orjson 无法直接处理的类型：pydantic 模型按字段展开"""
+    if isinstance(value, BaseModel):
+        return value.__dict__
+    raise TypeError(f"无法序列化 {type(value).__name__}")
+
+
+def dumps(content: Any) -> bytes:
+    """序列化为 UTF-8 JSON"""
+    if orjson is not None and FAST_SERIALIZATION:
+        return orjson.dumps(content, default=_default)
+    if isinstance(content, BaseModel):
+        return content.model_dump_json().encode("utf-8")
+    return json.dumps(content, ensure_ascii=False, separators=(",", ":"), default=_default).encode("utf-8")
+
+
+class FastJSONResponse(JSONResponse):
+    """
+    JSON 响应：content 为 bytes 时视为已序列化的响应体直接返回，否则通过 dumps 序列化
+
+    直接返回模型时 FastAPI 不会再按 response_model 校验和序列化一遍。
+    """
+
+    def render(self, content: Any) -> bytes:
+        if isinstance(content, bytes):
+            return content
+        return dumps(content)
+
+
+def accepts_gzip(accept_encoding: Optional[str]) -> bool:
+    """判断 Accept-Encoding 是否接受 gzip（q=0 表示拒绝）"""
+    for item in (accept_encoding or "").split(","):
+        coding, _, params = item.strip().partition(";")
+        if coding.strip().lower() in ("gzip", "*"):
+            return params.replace(" ", "") not in ("q=0", "q=0.0", "q=0.00", "q=0.000")
+    return False
+
+
+def gzip_body(body: bytes, etag: str, accept_encoding: Optional[str]) -> Tuple[bytes, str, Dict[str, str]]:
+    """
+    响应体足够大且客户端支持时返回 gzip 压缩后的响应体
+
+    返回 (响应体, ETag, 额外响应头)。压缩后的表示使用带 -gzip 后缀的 ETag，
+    以便 If-None-Match 区分不同编码。
+    """
+    if RESPONSE_GZIP_MIN_SIZE <= 0 or len(body) < RESPONSE_GZIP_MIN_SIZE:
+        return body, etag, {}
+    headers = {"Vary": "Accept-Encoding"}
+    if not accepts_gzip(accept_encoding):
+        return body, etag, headers
+
+    compressed = _gzip_cache.get(etag)
+    if compressed is None:
+        compressed = gzip.compress(body, compresslevel=RESPONSE_GZIP_LEVEL, mtime=0)
+        _gzip_cache[etag] = compressed
+        if len(_gzip_cache) > _GZIP_CACHE_SIZE:
+            _gzip_cache.popitem(last=False)
+    else:
+        _gzip_cache.move_to_end(etag)
+    headers["Content-Encoding"] = "gzip"
+    return compressed, etag[:-1] + '-gzip"', headers
@@ -0,0 +1,170 @@
+"""
+请求分阶段计时 - Server-Timing 响应头和按需性能剖析
+"""
+import cProfile
+import logging
+import os
+import re
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Dict, Optional
+from urllib.parse import parse_qs
+
+from app.metrics import STAGE_SECONDS
+
+logger = logging.getLogger(__name__)
+
+# 当前请求的各阶段耗时（秒），由 ServerTimingMiddleware 在每个请求开始时设置
+_request_stages: ContextVar[Optional[Dict[str, float]]] = ContextVar("request_stages", default=None)
+
+
+@contextmanager
+def stage(name: str):
+    """
+    记录一个处理阶段的耗时
+
+    耗时累计到 request_stage_duration_seconds 直方图；在请求上下文中执行时同时写入该请求的
+    Server-Timing 响应头（同名阶段多次执行时累加）。后台任务中执行时只做汇总统计。
+    """
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - started
+        STAGE_SECONDS.observe(elapsed, name)
+        stages = _request_stages.get()
+        if stages is not None:
+            stages[name] = stages.get(name, 0.0) + elapsed
+
+
+def format_server_timing(stages: Dict[str, float], total: float) -> str:
+    """生成 Server-Timing 头（毫秒）"""
+    entries = [f"{name};dur={elapsed * 1000:.1f}" for name, elapsed in stages.items()]
+    entries.append(f"total;dur={total * 1000:.1f}")
+    return ", ".join(entries)
+
+
+class RequestProfiler:
+    """
+    单个请求的 cProfile 剖析
+
+    cProfile 剖析的是整个事件循环线程，请求执行期间并发处理的其他请求和后台任务也会被计入；
+    同一时刻只允许一个剖析，其他带剖析标记的请求照常处理但不剖析。
+    """
+
+    def __init__(self, output_dir: str, token: str = ""):
+        self.output_dir = output_dir
+        self.token = token
+        self._lock = threading.Lock()
+
+    def requested(self, scope) -> bool:
+        """请求是否带有剖析标记（X-Profile 请求头或 profile 查询参数，配置了令牌时需与令牌一致）"""
+        value = None
+        for name, header_value in scope.get("headers", ()):
+            if name == b"x-profile":
+                value = header_value.decode("latin-1")
+                break
+        if value is None:
+            values = parse_qs(scope.get("query_string", b"").decode("latin-1")).get("profile")
+            value = values[0] if values else None
+        if value is None:
+            return False
+        return value == self.token if self.token else value not in ("", "0", "false")
+
+    def acquire(self) -> Optional[cProfile.Profile]:
+        """开始剖析，已有剖析在进行时返回 None"""
+        if not self._lock.acquire(blocking=False):
+            return None
+        profile = cProfile.Profile()
+        try:
+            profile.enable()
+        except ValueError:
+            # 已有其他剖析工具在运行
+            self._lock.release()
+            return None
+        return profile
+
+    def release(self, profile: cProfile.Profile, scope) -> Optional[str]:
+        """结束剖析并保存为 .prof 文件（可用 snakeviz 或 pstats 查看），返回文件路径"""
+        try:
+            profile.disable()
+            os.makedirs(self.output_dir, exist_ok=True)
+            slug = re.sub(r"[^A-Za-z0-9]+", "_", scope["path"]).strip("_") or "root"
+            filename = f"{time.strftime('%Y%m%d-%H%M%S')}-{scope['method'].lower()}-{slug}-{os.getpid()}.prof"
+            path = os.path.join(self.output_dir, filename)
+            profile.dump_stats(path)
+            logger.info("已保存请求剖析: %s %s -> %s", scope["method"], scope["path"], path)
+            return path
+        except Exception as e:
+            logger.warning("保存请求剖析失败: %s", str(e))
+            return None
+        finally:
+            self._lock.release()
+
+
+class ServerTimingMiddleware:
+    """
+    在响应头中附加 Server-Timing（各阶段耗时和响应开始前的总耗时）
+
+    profiler 不为空时，带剖析标记的请求会在 cProfile 下执行，结果保存到磁盘，
+    文件名通过 X-Profile-File 响应头返回（剖析的请求响应体会暂存到剖析结束，不适用于 SSE 等长连接）。
+    纯 ASGI 实现，未剖析的流式响应不受影响。
+    """
+
+    def __init__(self, app, profiler: Optional[RequestProfiler] = None):
+        self.app = app
+        self.profiler = profiler
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        started = time.perf_counter()
+        stages: Dict[str, float] = {}
+        token = _request_stages.set(stages)
+        profile = None
+        if self.profiler is not None and self.profiler.requested(scope):
+            profile = self.profiler.acquire()
+            if profile is None:
+                logger.info("已有请求正在剖析，跳过本次剖析: %s %s", scope["method"], scope["path"])
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                headers = list(message.get("headers", []))
+                headers.append((b"server-timing",
+                                format_server_timing(stages, time.perf_counter() - started).encode("latin-1")))
+                message = {**message, "headers": headers}
+            await send(message)
+
+        try:
+            if profile is None:
+                await self.app(scope, receive, send_wrapper)
+                return
+
+            # 剖析结束前暂存响应体，以便在响应头中返回剖析文件路径
+            start_message = None
+            body_messages = []
+
+            async def profiled_send(message):
+                nonlocal start_message
+                if message["type"] == "http.response.start":
+                    start_message = message
+                else:
+                    body_messages.append(message)
+
+            try:
+                await self.app(scope, receive, profiled_send)
+            finally:
+                path = self.profiler.release(profile, scope)
+            if start_message is not None:
+                headers = list(start_message.get("headers", []))
+                if path:
+                    headers.append((b"x-profile-file", os.path.basename(path).encode("latin-1")))
+                await send_wrapper({**start_message, "headers": headers})
+                for message in body_messages:
+                    await send(message)
+        finally:
+            _request_stages.reset(token)
@@ -1,20 +1,126 @@
 """
 通用工具函数
 """
+import atexit
+import copy
+import json
 import logging
-from app.config import LOG_LEVEL, LOG_FILE, LOG_FORMAT
+import multiprocessing
+import os
+import queue
+import sys
+from datetime import datetime
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
+from typing import Optional
+from app.config import (
+    LOG_LEVEL,
+    LOG_FILE,
+    LOG_FORMAT,
+    LOG_JSON,
+    LOG_MAX_BYTES,
+    LOG_BACKUP_COUNT,
+    LOG_MAX_MESSAGE_LENGTH
+)
+
+# 后台写日志的监听线程，setup_logging 首次调用时创建
+_listener: Optional[QueueListener] = None
+
+
+def truncate_message(message: str, max_length: int = LOG_MAX_MESSAGE_LENGTH) -> str:
+    """截断过长的日志消息，max_length 为 0 时不截断"""
+    if max_length <= 0 or len(message) <= max_length:
+        return message
+    return f"{message[:max_length]}...（已截断，共 {len(message)} 字符）"
+
+
+class TruncatingQueueHandler(QueueHandler):
+    """
+    把日志记录放入队列，由监听线程负责格式化和写入
+
+    入队前在调用方线程完成消息拼接并截断过长的内容，之后的格式化和磁盘 I/O 都不在事件循环上执行
+    """
+
+    def __init__(self, log_queue, max_length: int = LOG_MAX_MESSAGE_LENGTH):
+        super().__init__(log_queue)
+        self.max_length = max_length
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        message = truncate_message(record.getMessage(), self.max_length)
+        record = copy.copy(record)
+        record.message = message
+        record.msg = message
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+        record.exc_info = None
+        return record
+
+
+class JsonFormatter(logging.Formatter):
+    """每条日志输出为一行 JSON"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "time": datetime.fromtimestamp(record.created).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+            "process": record.process
+        }
+        if record.exc_text:
+            entry["exception"] = record.exc_text
+        return json.dumps(entry, ensure_ascii=False)
+
+
+def log_file_path(path: str = LOG_FILE) -> str:
+    """
+    本进程写入的日志文件
+
+    uvicorn --workers N 的 worker 是主进程启动的子进程，各自在文件名后加上进程号（如 dify_scheduler.1234.log），
+    避免多个进程轮转同一个文件时互相覆盖；单进程运行时直接使用 path
+    """
+    if multiprocessing.parent_process() is None:
+        return path
+    stem, ext = os.path.splitext(path)
+    return f"{stem}.{os.getpid()}{ext}"
 
 
 def setup_logging():
     """
-    配置日志系统
+    配置日志系统（只在首次调用时生效）
+
+    根 logger 只挂一个 QueueHandler，文件（按大小轮转）和控制台输出由后台线程的 QueueListener 完成，
+    日志量再大也不会阻塞事件循环。多 worker 部署时每个进程写自己的文件（见 log_file_path）。
+    LOG_JSON 为 true 时输出 JSON 行。
     """
-    logging.basicConfig(
-        level=getattr(logging, LOG_LEVEL),
-        format=LOG_FORMAT,
-        handlers=[
-            logging.FileHandler(LOG_FILE, encoding='utf-8'),
-            logging.StreamHandler()
+    global _listener
+    if _listener is None:
+        formatter = JsonFormatter() if LOG_JSON else logging.Formatter(LOG_FORMAT)
+        handlers = [
+            RotatingFileHandler(log_file_path(), maxBytes=LOG_MAX_BYTES, backupCount=LOG_BACKUP_COUNT, encoding='utf-8'),
+            logging.StreamHandler(sys.stderr)
         ]
-    )
-    return logging.getLogger(__name__) 
\ No newline at end of file
+        for handler in handlers:
+            handler.setFormatter(formatter)
+
+        log_queue = queue.SimpleQueue()
+        root = logging.getLogger()
+        for handler in list(root.handlers):
+            root.removeHandler(handler)
+        root.addHandler(TruncatingQueueHandler(log_queue))
+        root.setLevel(getattr(logging, LOG_LEVEL.upper(), logging.INFO))
+
+        _listener = QueueListener(log_queue, *handlers, respect_handler_level=True)
+        _listener.start()
+        atexit.register(shutdown_logging)
+    return logging.getLogger(__name__)
+
+
+def shutdown_logging():
+    """停止后台日志线程，写完队列中剩余的日志"""
+    global _listener
+    if _listener is not None:
+        listener, _listener = _listener, None
+        listener.stop()
+        for handler in listener.handlers:
+            handler.close()
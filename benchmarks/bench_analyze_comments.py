@@ -0,0 +1,75 @@
+#!/usr/bin/env python3
+"""
+analyze_comments 微基准
+对比旧版嵌套循环实现与哈希索引回复检测引擎在 20 ~ 100k 条评论下的耗时
+
+用法:
+    python benchmarks/bench_analyze_comments.py
+    python benchmarks/bench_analyze_comments.py --sizes 20 1000 100000 --legacy-max 10000
+"""
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.bilibili.detector import build_comment_info, detect_unreplied  # noqa: E402
+from payloads import MY_MID, generate_payload  # noqa: E402
+
+
+def legacy_analyze_comments(result, mid):
+    """旧版实现：每条评论与每条回复逐一比较"""
+    all_comments = []
+    replies = []
+    for comment in result.get('list', []):
+        all_comments.append(build_comment_info(comment))
+        if str(comment.get('mid')) == mid:
+            replies.append({'root': comment.get('root'), 'parent': comment.get('parent')})
+
+    unreplied_comments = []
+    for comment in all_comments:
+        if comment['mid'] == mid:
+            continue
+        has_reply = False
+        for reply in replies:
+            if reply['root'] == comment['rpid'] or reply['parent'] == comment['rpid']:
+                has_reply = True
+                break
+        if not has_reply:
+            unreplied_comments.append(comment)
+    return unreplied_comments
+
+
+def measure(func, *args, repeat: int = 3) -> float:
+    """返回 repeat 次运行中的最短耗时（秒）"""
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func(*args)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description="analyze_comments 微基准")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[20, 100, 1000, 10000, 100000])
+    parser.add_argument("--legacy-max", type=int, default=10000, help="旧实现为平方复杂度，超过该规模时跳过")
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    print(f"{'评论数':>8} | {'旧实现(ms)':>12} | {'索引引擎(ms)':>12} | {'加速比':>8}")
+    print("-" * 52)
+    for size in args.sizes:
+        result = generate_payload(size, reply_ratio=0.3, now=0)
+        fast = measure(detect_unreplied, [result], MY_MID, repeat=args.repeat)
+        if size <= args.legacy_max:
+            assert legacy_analyze_comments(result, MY_MID) == detect_unreplied([result], MY_MID)
+            legacy = measure(legacy_analyze_comments, result, MY_MID, repeat=args.repeat)
+            print(f"{size:>8} | {legacy * 1000:>12.3f} | {fast * 1000:>12.3f} | {legacy / fast:>7.1f}x")
+        else:
+            print(f"{size:>8} | {'skipped':>12} | {fast * 1000:>12.3f} | {'-':>8}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,120 @@
+#!/usr/bin/env python3
+"""
+Dify 调用连接复用基准
+在本地启动一个 /v1/workflows/run 替身服务，对比“每次调用新建 httpx.AsyncClient”（旧行为）
+与“进程内共享连接池客户端”的单次调用延迟
+
+用法:
+    python benchmarks/bench_dify_client.py
+    python benchmarks/bench_dify_client.py --calls 500 --port 18080
+"""
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import httpx  # noqa: E402
+import uvicorn  # noqa: E402
+
+from app.http_client import create_dify_client  # noqa: E402
+from dify_config import REQUEST_TIMEOUT  # noqa: E402
+
+RESPONSE_BODY = json.dumps({
+    "workflow_run_id": "bench",
+    "data": {"status": "succeeded", "outputs": {"result": "ok"}}
+}).encode("utf-8")
+
+
+async def stand_in_app(scope, receive, send):
+    """最小的 Dify workflow 替身：读取请求体后立即返回固定结果"""
+    if scope["type"] != "http":
+        return
+    more_body = True
+    while more_body:
+        message = await receive()
+        more_body = message.get("more_body", False)
+    await send({
+        "type": "http.response.start",
+        "status": 200,
+        "headers": [(b"content-type", b"application/json")]
+    })
+    await send({"type": "http.response.body", "body": RESPONSE_BODY})
+
+
+async def call_with_new_client(url: str) -> None:
+    """旧行为：每次调用创建并关闭一个新客户端"""
+    async with httpx.AsyncClient(timeout=REQUEST_TIMEOUT) as client:
+        response = await client.post(url, json={"inputs": {}, "response_mode": "blocking"})
+        response.json()
+
+
+async def call_with_shared_client(client: httpx.AsyncClient, url: str) -> None:
+    """新行为：复用共享客户端的连接池"""
+    response = await client.post(url, json={"inputs": {}, "response_mode": "blocking"})
+    response.json()
+
+
+def summarize(name: str, samples) -> dict:
+    """计算延迟统计（毫秒）"""
+    ordered = sorted(samples)
+    result = {
+        "name": name,
+        "calls": len(ordered),
+        "mean_ms": statistics.mean(ordered) * 1000,
+        "p50_ms": ordered[len(ordered) // 2] * 1000,
+        "p99_ms": ordered[min(len(ordered) - 1, int(len(ordered) * 0.99))] * 1000
+    }
+    print(f"{name:<12} | {result['mean_ms']:>9.3f} | {result['p50_ms']:>9.3f} | {result['p99_ms']:>9.3f}")
+    return result
+
+
+async def run(calls: int, port: int) -> None:
+    server = uvicorn.Server(uvicorn.Config(stand_in_app, host="127.0.0.1", port=port, log_level="warning"))
+    server_task = asyncio.create_task(server.serve())
+    while not server.started:
+        await asyncio.sleep(0.01)
+
+    url = f"http://127.0.0.1:{port}/v1/workflows/run"
+    try:
+        # 预热
+        await call_with_new_client(url)
+
+        per_call = []
+        for _ in range(calls):
+            start = time.perf_counter()
+            await call_with_new_client(url)
+            per_call.append(time.perf_counter() - start)
+
+        shared = []
+        async with create_dify_client() as client:
+            await call_with_shared_client(client, url)
+            for _ in range(calls):
+                start = time.perf_counter()
+                await call_with_shared_client(client, url)
+                shared.append(time.perf_counter() - start)
+
+        print(f"{'模式':<12} | {'mean(ms)':>9} | {'p50(ms)':>9} | {'p99(ms)':>9}")
+        print("-" * 50)
+        before = summarize("new-client", per_call)
+        after = summarize("shared-pool", shared)
+        print(f"平均延迟降低: {(1 - after['mean_ms'] / before['mean_ms']) * 100:.1f}%")
+    finally:
+        server.should_exit = True
+        await server_task
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Dify 调用连接复用基准")
+    parser.add_argument("--calls", type=int, default=200)
+    parser.add_argument("--port", type=int, default=18080)
+    args = parser.parse_args()
+    asyncio.run(run(args.calls, args.port))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,72 @@
+#!/usr/bin/env python3
+"""
+评论预过滤微基准
+测量 CommentPrefilter 首次判定和命中缓存时每条评论的耗时，并输出各规则的命中率
+
+用法:
+    python benchmarks/bench_prefilter.py
+    python benchmarks/bench_prefilter.py --sizes 1000 100000 --rules prefilter_rules.json
+"""
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.models import CommentInfo  # noqa: E402
+from app.bilibili.prefilter import CommentPrefilter, load_rules  # noqa: E402
+
+# 常见评论样本：感谢、纯表情、刷屏、引流和需要认真回答的问题
+SAMPLES = [
+    "谢谢up主！", "感谢分享[打call]", "支持支持", "太棒了！！", "前排[doge]", "已三连",
+    "[doge][doge]", "😂😂😂", "[呲牙]", "？？？", "6", "哈",
+    "加微信领取全套资料", "VX: abc123 私信领取", "互关互粉，看我主页",
+    "请问这个视频里用的是什么软件？", "这个方法在 Windows 下能用吗，我试了一直报错",
+    "第三步的参数为什么要这样设置？能详细讲讲原理吗", "up主能出一期进阶教程吗，期待",
+    "讲得很清楚，之前一直没搞懂的地方终于明白了，感谢",
+]
+
+
+def generate_comments(size: int, seed: int = 0):
+    rng = random.Random(seed)
+    return [
+        CommentInfo(rpid=index + 1, mid=str(rng.randint(1, 5000)), oid=1, root=0, parent=0,
+                    content=rng.choice(SAMPLES), title="视频标题", uname=f"用户{index}", bvid="BV1xx")
+        for index in range(size)
+    ]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="评论预过滤微基准")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[20, 1000, 10000, 100000])
+    parser.add_argument("--rules", default="", help="规则文件，默认使用内置规则")
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+    rules = load_rules(args.rules) if args.rules else {}
+
+    print(f"{'评论数':>8} | {'首次判定(us/条)':>16} | {'命中缓存(us/条)':>16} | {'命中率':>8}")
+    print("-" * 60)
+    prefilter = None
+    for size in args.sizes:
+        comments = generate_comments(size)
+        cold = cached = float('inf')
+        for _ in range(args.repeat):
+            prefilter = CommentPrefilter(rules)
+            start = time.perf_counter()
+            prefilter.apply(comments)
+            cold = min(cold, time.perf_counter() - start)
+            start = time.perf_counter()
+            prefilter.apply(comments)
+            cached = min(cached, time.perf_counter() - start)
+        hit_rate = prefilter.status()["hit_rate"]
+        print(f"{size:>8} | {cold / size * 1e6:>16.2f} | {cached / size * 1e6:>16.2f} | {hit_rate:>8.1%}")
+
+    print("\n各规则命中次数（最后一个规模）:")
+    for rule, count in prefilter.status()["rules"].items():
+        print(f"  {rule:<20} {count}")
+
+
+if __name__ == "__main__":
+    main()
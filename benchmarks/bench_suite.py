@@ -0,0 +1,218 @@
+#!/usr/bin/env python3
+"""
+离线基准套件
+使用合成的创作中心评论数据，分别测量未回复检测、CommentInfo 校验、响应序列化，
+以及经过 FastAPI ASGI 应用的完整 /api/comments/unreplied 请求吞吐（进程内，不访问B站）。
+结果保存为 JSON，可用 --compare 与其他提交的结果对比。
+
+用法:
+    python benchmarks/bench_suite.py
+    python benchmarks/bench_suite.py --sizes 20 1000 100000 1000000 --request-max-size 10000
+    python benchmarks/bench_suite.py --compare benchmarks/results/<基线>.json
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from payloads import MY_MID, generate_comments, paginate  # noqa: E402
+
+# 导入应用前设置：日志写入临时目录且只输出警告，避免日志 I/O 影响结果
+WORK_DIR = tempfile.mkdtemp(prefix="bench_suite_")
+os.environ.setdefault("LOG_FILE", os.path.join(WORK_DIR, "bench.log"))
+os.environ.setdefault("LOG_LEVEL", "WARNING")
+
+import httpx  # noqa: E402
+
+import main  # noqa: E402
+from app.bilibili import service  # noqa: E402
+from app.api.comments import unreplied_cache  # noqa: E402
+from app.config import BILIBILI_MID, COMMENT_PAGE_SIZE  # noqa: E402
+from app.models import CommentInfo, UnrepliedCommentsResponse  # noqa: E402
+from app.serialization import dumps, trusted_model  # noqa: E402
+
+# 我的 mid 与服务配置保持一致，否则检测不到“我的回复”
+MID = str(BILIBILI_MID or MY_MID)
+
+
+def measure(func, *args, repeat: int = 3) -> float:
+    """返回 repeat 次运行中的最短耗时（秒）"""
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func(*args)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def bench_stages(size: int, comments, repeat: int):
+    """未回复检测、模型校验和序列化三个阶段的耗时"""
+    payload = {'list': comments}
+    unreplied = service.analyze_comments(payload, MID)
+    infos = [trusted_model(CommentInfo, comment) for comment in unreplied]
+    response = UnrepliedCommentsResponse(result=infos, count=len(infos))
+
+    stages = {
+        "analyze": measure(service.analyze_comments, payload, MID, repeat=repeat),
+        "validate": measure(lambda: [trusted_model(CommentInfo, comment) for comment in unreplied], repeat=repeat),
+        "serialize": measure(dumps, response, repeat=repeat)
+    }
+    return [
+        {
+            "name": name,
+            "size": size,
+            "unreplied": len(unreplied),
+            "seconds": seconds,
+            "per_comment_us": seconds / size * 1e6
+        }
+        for name, seconds in stages.items()
+    ]
+
+
+async def bench_request(size: int, comments, requests: int, concurrency: int, accept_encoding: str):
+    """
+    完整请求吞吐：本地存储预先写入 size 条评论，上游 get_comments 返回最新一页（稳态的增量同步），
+    每个请求都绕过接口缓存。客户端与服务在同一进程，解压也会计入耗时，因此默认不请求压缩
+    """
+    # 每个规模使用独立的数据库文件
+    service.close_comment_store()
+    service.COMMENT_STORE_PATH = os.path.join(WORK_DIR, f"comments-{size}.db")
+    store = service.get_comment_store()
+    store.upsert_comments(comments)
+    store.set_high_water_mark(max(comment['ctime'] for comment in comments))
+    first_page = paginate(comments, COMMENT_PAGE_SIZE)[0]
+
+    async def get_comments(**kwargs):
+        return first_page
+
+    service.creative_center.get_comments = get_comments
+    unreplied_cache.ttl = 0
+
+    latencies = []
+    semaphore = asyncio.Semaphore(concurrency)
+    transport = httpx.ASGITransport(app=main.app)
+    headers = {"Accept-Encoding": accept_encoding}
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", headers=headers) as client:
+        async def one():
+            async with semaphore:
+                start = time.perf_counter()
+                response = await client.post("/api/comments/unreplied")
+                latencies.append(time.perf_counter() - start)
+                response.raise_for_status()
+
+        await one()  # 预热
+        latencies.clear()
+        started = time.perf_counter()
+        await asyncio.gather(*(one() for _ in range(requests)))
+        elapsed = time.perf_counter() - started
+
+    latencies.sort()
+    return {
+        "name": "request",
+        "size": size,
+        "requests": requests,
+        "concurrency": concurrency,
+        "seconds": elapsed,
+        "rps": requests / elapsed,
+        "p50_ms": statistics.median(latencies) * 1000,
+        "p99_ms": latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))] * 1000
+    }
+
+
+def git_commit():
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT,
+                                       stderr=subprocess.DEVNULL, text=True).strip()
+    except Exception:
+        return None
+
+
+def primary_metric(result):
+    """对比时使用的指标（请求基准为 req/s，其余为毫秒）及其方向（True 表示越大越好）"""
+    if result["name"] == "request":
+        return result["rps"], True
+    return result["seconds"] * 1000, False
+
+
+def compare(baseline_path: str, results):
+    with open(baseline_path, encoding="utf-8") as f:
+        baseline = json.load(f)
+    previous = {(item["name"], item["size"]): item for item in baseline["results"]}
+    print(f"\n与 {baseline_path}（提交 {baseline['meta'].get('commit')}）对比:")
+    print(f"{'基准':>10} | {'评论数':>8} | {'基线':>12} | {'当前':>12} | {'变化':>8}")
+    print("-" * 62)
+    for item in results:
+        old = previous.get((item["name"], item["size"]))
+        if old is None:
+            continue
+        old_value, higher_is_better = primary_metric(old)
+        new_value, _ = primary_metric(item)
+        change = (new_value / old_value - 1) * 100 if old_value else 0.0
+        if not higher_is_better:
+            change = -change
+        print(f"{item['name']:>10} | {item['size']:>8} | {old_value:>12.3f} | {new_value:>12.3f} | {change:>+7.1f}%")
+    print("（变化为正表示变快）")
+
+
+def main_cli():
+    parser = argparse.ArgumentParser(description="离线基准套件")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[20, 1000, 10000, 100000])
+    parser.add_argument("--reply-ratio", type=float, default=0.3, help="他人评论被我回复的比例")
+    parser.add_argument("--thread-depth", type=int, default=3, help="楼中楼的最大层数")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--requests", type=int, default=200, help="完整请求基准的请求数")
+    parser.add_argument("--concurrency", type=int, default=10, help="完整请求基准的并发数")
+    parser.add_argument("--accept-encoding", default="identity", help="完整请求基准的 Accept-Encoding，gzip 表示测量压缩响应")
+    parser.add_argument("--request-max-size", type=int, default=10000, help="超过该规模时跳过完整请求基准")
+    parser.add_argument("--output", help="结果文件路径，默认 benchmarks/results/<时间>-<提交>.json")
+    parser.add_argument("--compare", help="与之对比的基线结果文件")
+    args = parser.parse_args()
+
+    results = []
+    print(f"{'基准':>10} | {'评论数':>8} | {'耗时(ms)':>12} | {'说明':>24}")
+    print("-" * 64)
+    for size in args.sizes:
+        comments = generate_comments(size, reply_ratio=args.reply_ratio, thread_depth=args.thread_depth, mid=MID)
+        for item in bench_stages(size, comments, args.repeat):
+            results.append(item)
+            print(f"{item['name']:>10} | {size:>8} | {item['seconds'] * 1000:>12.3f} | "
+                  f"{item['per_comment_us']:>10.3f} us/条评论")
+        if size <= args.request_max_size:
+            item = asyncio.run(bench_request(size, comments, args.requests, args.concurrency, args.accept_encoding))
+            results.append(item)
+            print(f"{'request':>10} | {size:>8} | {item['p50_ms']:>12.3f} | "
+                  f"{item['rps']:>8.1f} req/s p99 {item['p99_ms']:.1f}ms")
+
+    commit = git_commit()
+    output = args.output or os.path.join(
+        ROOT, "benchmarks", "results", f"{time.strftime('%Y%m%d-%H%M%S')}-{commit or 'unknown'}.json"
+    )
+    os.makedirs(os.path.dirname(output), exist_ok=True)
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump({
+            "meta": {
+                "commit": commit,
+                "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+                "python": platform.python_version(),
+                "platform": platform.platform(),
+                "args": vars(args)
+            },
+            "results": results
+        }, f, ensure_ascii=False, indent=2)
+    print(f"\n结果已保存: {output}")
+
+    if args.compare:
+        compare(args.compare, results)
+
+
+if __name__ == "__main__":
+    main_cli()
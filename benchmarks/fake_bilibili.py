@@ -0,0 +1,216 @@
+#!/usr/bin/env python3
+"""
+B站接口替身服务
+提供创作中心评论列表和发送评论接口（以及 bilibili_api 请求前会访问的 buvid / wbi 接口），
+可配置延迟、错误率和风控（-412）行为，用于在不访问B站的情况下压测。
+
+服务端设置 BILIBILI_API_BASE_URL=http://127.0.0.1:<端口> 后，B站请求会被转发到这里。
+
+用法:
+    python benchmarks/fake_bilibili.py --port 18001
+    python benchmarks/fake_bilibili.py --port 18001 --latency 0.08 --error-rate 0.01 --reply-rate 2 --risk-mode status
+"""
+import argparse
+import asyncio
+import os
+import random
+import sys
+import time
+from contextlib import asynccontextmanager
+from typing import Any, Dict, List, Optional
+from urllib.parse import parse_qs
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import uvicorn  # noqa: E402
+from fastapi import FastAPI, Query, Request  # noqa: E402
+from fastapi.responses import JSONResponse  # noqa: E402
+
+from app.ratelimit import TokenBucket  # noqa: E402
+from payloads import MY_MID, generate_comments  # noqa: E402
+
+# wbi 签名只从图片文件名中取密钥，不会真正请求这两个地址
+WBI_IMG = {
+    "img_url": "https://i0.hdslb.com/bfs/wbi/7cd084941338484aae1ad9425b84077c.png",
+    "sub_url": "https://i0.hdslb.com/bfs/wbi/4932caff0ff746eab6f01bf08b70ac45.png"
+}
+
+
+class FakeBilibili:
+    """
+    内存中的评论区
+
+    评论按时间倒序保存，发送的回复会写回评论区，后续拉取可以看到；
+    arrival_rate 大于 0 时后台按该速率（条/秒）产生新的一级评论。
+    """
+
+    def __init__(self, mid: str = MY_MID, comments: int = 200, reply_ratio: float = 0.3,
+                 thread_depth: int = 2, latency: float = 0.05, jitter: float = 0.02,
+                 error_rate: float = 0.0, risk_rate: float = 0.0, risk_mode: str = "code",
+                 reply_rate: float = 0.0, reply_burst: int = 5, arrival_rate: float = 0.0, seed: int = 42):
+        self.mid = str(mid)
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.risk_rate = risk_rate
+        self.risk_mode = risk_mode
+        self.arrival_rate = arrival_rate
+        self.reply_limiter = TokenBucket(reply_rate, reply_burst) if reply_rate > 0 else None
+        self.rng = random.Random(seed)
+        self.comments: List[Dict[str, Any]] = generate_comments(
+            comments, reply_ratio=reply_ratio, thread_depth=thread_depth, mid=self.mid, seed=seed
+        )
+        self.next_rpid = max((item['rpid'] for item in self.comments), default=0) + 1
+        self.stats = {"fetches": 0, "replies": 0, "errors": 0, "risk_blocked": 0, "rate_limited": 0, "arrived": 0}
+
+    async def delay(self) -> None:
+        await asyncio.sleep(max(0.0, self.rng.gauss(self.latency, self.jitter)))
+
+    def failure(self) -> Optional[JSONResponse]:
+        """按配置的概率返回服务端错误或风控拦截"""
+        roll = self.rng.random()
+        if roll < self.error_rate:
+            self.stats["errors"] += 1
+            return JSONResponse(status_code=503, content={"code": -503, "message": "服务调用超时"})
+        if roll < self.error_rate + self.risk_rate:
+            self.stats["risk_blocked"] += 1
+            return self.risk_response()
+        return None
+
+    def risk_response(self) -> JSONResponse:
+        """风控拦截：status 模式返回 HTTP 412，code 模式返回业务码 -412"""
+        if self.risk_mode == "status":
+            return JSONResponse(status_code=412, content={"code": -412, "message": "请求被拦截"})
+        return JSONResponse(content={"code": -412, "message": "请求被拦截", "ttl": 1})
+
+    def add_comment(self, author: int, oid: int, root: int, parent: int, message: str, uname: str) -> Dict[str, Any]:
+        comment = {
+            'rpid': self.next_rpid,
+            'oid': oid,
+            'type': 1,
+            'bvid': f'BV1bench{oid:04d}',
+            'title': f'测试视频 {oid}',
+            'mid': author,
+            'root': root,
+            'parent': parent,
+            'ctime': int(time.time()),
+            'like': 0,
+            'content': {'message': message},
+            'member': {'mid': author, 'uname': uname},
+        }
+        self.next_rpid += 1
+        self.comments.insert(0, comment)
+        return comment
+
+    async def produce(self) -> None:
+        """按 arrival_rate 持续产生新评论"""
+        while True:
+            await asyncio.sleep(self.rng.expovariate(self.arrival_rate))
+            author = self.rng.randint(20000, 99999)
+            self.add_comment(author, self.rng.randint(1, 10), 0, 0, f'新评论 {self.next_rpid}', f'user{author}')
+            self.stats["arrived"] += 1
+
+    def unreplied_count(self) -> int:
+        replied = set()
+        for item in self.comments:
+            if str(item['mid']) == self.mid:
+                replied.add(item['root'])
+                replied.add(item['parent'])
+        return sum(1 for item in self.comments if str(item['mid']) != self.mid and item['rpid'] not in replied)
+
+
+def ok(data: Any) -> Dict[str, Any]:
+    return {"code": 0, "message": "0", "ttl": 1, "data": data}
+
+
+def create_app(fake: FakeBilibili) -> FastAPI:
+    @asynccontextmanager
+    async def lifespan(app: FastAPI):
+        producer = asyncio.create_task(fake.produce()) if fake.arrival_rate > 0 else None
+        yield
+        if producer is not None:
+            producer.cancel()
+
+    app = FastAPI(title="Fake Bilibili", lifespan=lifespan)
+
+    @app.get("/x/frontend/finger/spi")
+    async def spi():
+        return ok({"b_3": "FAKE-BUVID3-infoc", "b_4": "FAKE-BUVID4"})
+
+    @app.post("/x/internal/gaia-gateway/ExClimbWuzhi")
+    async def exclimbwuzhi():
+        return ok({})
+
+    @app.get("/x/web-interface/nav")
+    async def nav():
+        return ok({"isLogin": True, "mid": int(fake.mid), "uname": "me", "wbi_img": WBI_IMG})
+
+    @app.get("/x/v2/reply/up/fulllist")
+    async def fulllist(pn: int = Query(default=1), ps: int = Query(default=10)):
+        await fake.delay()
+        fake.stats["fetches"] += 1
+        failure = fake.failure()
+        if failure is not None:
+            return failure
+        start = (pn - 1) * ps
+        return ok({
+            "list": fake.comments[start:start + ps],
+            "page": {"num": pn, "size": ps, "total": len(fake.comments)}
+        })
+
+    @app.post("/x/v2/reply/add")
+    async def add(request: Request):
+        # 表单格式与 bilibili_api 发送的一致（application/x-www-form-urlencoded）
+        form = {key: values[0] for key, values in parse_qs((await request.body()).decode("utf-8")).items()}
+        await fake.delay()
+        failure = fake.failure()
+        if failure is not None:
+            return failure
+        if fake.reply_limiter is not None:
+            if fake.reply_limiter.available < 1:
+                fake.stats["rate_limited"] += 1
+                return fake.risk_response()
+            await fake.reply_limiter.acquire()
+        reply = fake.add_comment(int(fake.mid), int(form["oid"]), int(form.get("root", 0)),
+                                 int(form.get("parent", 0)), form.get("message", ""), "me")
+        fake.stats["replies"] += 1
+        return ok({"rpid": reply['rpid'], "rpid_str": str(reply['rpid']), "reply": reply})
+
+    @app.get("/_fake/stats")
+    async def stats():
+        return {**fake.stats, "comments": len(fake.comments), "unreplied": fake.unreplied_count()}
+
+    return app
+
+
+def main():
+    parser = argparse.ArgumentParser(description="B站接口替身服务")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=18001)
+    parser.add_argument("--mid", default=MY_MID, help="我的 mid，需与服务端 BILIBILI_MID 一致")
+    parser.add_argument("--comments", type=int, default=200, help="初始评论数")
+    parser.add_argument("--reply-ratio", type=float, default=0.3)
+    parser.add_argument("--thread-depth", type=int, default=2)
+    parser.add_argument("--latency", type=float, default=0.05, help="平均响应延迟（秒）")
+    parser.add_argument("--jitter", type=float, default=0.02, help="延迟标准差（秒）")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="返回 503 的概率")
+    parser.add_argument("--risk-rate", type=float, default=0.0, help="随机触发风控的概率")
+    parser.add_argument("--risk-mode", choices=("code", "status"), default="code",
+                        help="风控表现：code 返回业务码 -412，status 返回 HTTP 412")
+    parser.add_argument("--reply-rate", type=float, default=0.0, help="发送回复的限频（条/秒），超出时触发风控，0 表示不限")
+    parser.add_argument("--reply-burst", type=int, default=5)
+    parser.add_argument("--arrival-rate", type=float, default=0.0, help="新评论到达速率（条/秒）")
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    fake = FakeBilibili(
+        mid=args.mid, comments=args.comments, reply_ratio=args.reply_ratio, thread_depth=args.thread_depth,
+        latency=args.latency, jitter=args.jitter, error_rate=args.error_rate, risk_rate=args.risk_rate,
+        risk_mode=args.risk_mode, reply_rate=args.reply_rate, reply_burst=args.reply_burst,
+        arrival_rate=args.arrival_rate, seed=args.seed
+    )
+    uvicorn.run(create_app(fake), host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
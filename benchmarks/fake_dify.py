@@ -0,0 +1,225 @@
+#!/usr/bin/env python3
+"""
+Dify workflow 替身服务
+提供 /v1/workflows/run（blocking 和 streaming 两种模式），模拟评论回复 workflow：
+认领未回复评论 → 逐条“生成”回复（固定延迟代替 LLM）→ 调用服务端回复接口，不消耗 LLM token。
+输入中带有单条评论（回复流水线的 dify 生成器）时只生成回复内容，放在 outputs 中返回。
+
+服务端设置 DIFY_BASE_URL=http://127.0.0.1:<端口>/v1 后，workflow 调用会发到这里。
+
+用法:
+    python benchmarks/fake_dify.py --port 18002 --app-url http://127.0.0.1:8000
+    python benchmarks/fake_dify.py --port 18002 --app-url http://127.0.0.1:8000 --generate-latency 1.5 --error-rate 0.05
+"""
+import argparse
+import asyncio
+import json
+import random
+import statistics
+import time
+import uuid
+from contextlib import asynccontextmanager
+from typing import Any, Dict, List, Optional
+
+import httpx
+import uvicorn
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+
+class FakeDify:
+    """
+    模拟的评论回复 workflow
+
+    fanout 模式下评论列表由服务端通过 input_key 输入变量传入；否则 workflow 自己调用认领接口领取评论。
+    reply_input_key 输入变量存在时（回复流水线逐条生成），只生成回复并通过 reply_output_key 输出。
+    """
+
+    def __init__(self, app_url: str, input_key: str = "comments", reply_input_key: str = "comment",
+                 reply_output_key: str = "reply", batch_size: int = 10,
+                 run_latency: float = 0.2, generate_latency: float = 0.5, jitter: float = 0.1,
+                 concurrency: int = 4, error_rate: float = 0.0, seed: int = 42):
+        self.app_url = app_url.rstrip("/")
+        self.input_key = input_key
+        self.reply_input_key = reply_input_key
+        self.reply_output_key = reply_output_key
+        self.batch_size = batch_size
+        self.run_latency = run_latency
+        self.generate_latency = generate_latency
+        self.jitter = jitter
+        self.concurrency = concurrency
+        self.error_rate = error_rate
+        self.rng = random.Random(seed)
+        self.client: Optional[httpx.AsyncClient] = None
+        self.reply_latencies: List[float] = []
+        self.stats = {"runs": 0, "errors": 0, "replies_sent": 0, "replies_failed": 0, "generated": 0}
+
+    async def sleep(self, mean: float) -> None:
+        await asyncio.sleep(max(0.0, self.rng.gauss(mean, self.jitter)) if mean > 0 else 0)
+
+    async def comments_for(self, inputs: Dict[str, Any]) -> List[Dict[str, Any]]:
+        if self.input_key in inputs:
+            return json.loads(inputs[self.input_key])
+        response = await self.client.post(
+            f"{self.app_url}/api/comments/claim",
+            params={"limit": self.batch_size, "consumer": "fake-dify"}
+        )
+        response.raise_for_status()
+        return response.json()["result"]
+
+    def compose(self, comment: Dict[str, Any]) -> str:
+        return f"谢谢 {comment['uname']} 的评论！"
+
+    async def reply(self, comment: Dict[str, Any]) -> bool:
+        """生成并发送一条回复，返回是否成功"""
+        await self.sleep(self.generate_latency)
+        started = time.perf_counter()
+        try:
+            response = await self.client.post(f"{self.app_url}/api/comments/reply", json={
+                "oid": comment["oid"],
+                "rpid": comment["rpid"],
+                "root": comment["root"] or comment["rpid"],
+                "message": self.compose(comment)
+            })
+            success = response.status_code == 200 and response.json().get("success", False)
+        except httpx.HTTPError:
+            success = False
+        self.reply_latencies.append(time.perf_counter() - started)
+        self.stats["replies_sent" if success else "replies_failed"] += 1
+        return success
+
+    async def run(self, inputs: Dict[str, Any], on_event=None) -> Dict[str, Any]:
+        """执行一次 workflow，返回 outputs"""
+        self.stats["runs"] += 1
+        await self.sleep(self.run_latency)
+        if self.reply_input_key in inputs:
+            await self.sleep(self.generate_latency)
+            self.stats["generated"] += 1
+            return {self.reply_output_key: self.compose(json.loads(inputs[self.reply_input_key]))}
+        comments = await self.comments_for(inputs)
+        semaphore = asyncio.Semaphore(self.concurrency)
+
+        async def one(index: int, comment: Dict[str, Any]) -> bool:
+            async with semaphore:
+                if on_event is not None:
+                    await on_event("node_started", {"node_id": f"reply-{index}", "title": f"回复 {comment['rpid']}"})
+                success = await self.reply(comment)
+                if on_event is not None:
+                    await on_event("node_finished", {"node_id": f"reply-{index}",
+                                                     "status": "succeeded" if success else "failed"})
+                return success
+
+        results = await asyncio.gather(*(one(index, comment) for index, comment in enumerate(comments)))
+        return {"comments": len(comments), "replied": sum(results)}
+
+    def summary(self) -> Dict[str, Any]:
+        latencies = sorted(self.reply_latencies)
+        summary = dict(self.stats)
+        if latencies:
+            summary["reply_p50_ms"] = statistics.median(latencies) * 1000
+            summary["reply_p99_ms"] = latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))] * 1000
+        return summary
+
+
+def create_app(fake: FakeDify) -> FastAPI:
+    @asynccontextmanager
+    async def lifespan(app: FastAPI):
+        fake.client = httpx.AsyncClient(timeout=60)
+        yield
+        await fake.client.aclose()
+
+    app = FastAPI(title="Fake Dify", lifespan=lifespan)
+
+    @app.post("/v1/workflows/run")
+    async def run(request: Request):
+        body = await request.json()
+        inputs = body.get("inputs") or {}
+        run_id = uuid.uuid4().hex
+        task_id = uuid.uuid4().hex
+
+        if fake.rng.random() < fake.error_rate:
+            fake.stats["errors"] += 1
+            return JSONResponse(status_code=503, content={"code": "service_unavailable", "message": "fake overload"})
+
+        if body.get("response_mode") != "streaming":
+            started = time.perf_counter()
+            outputs = await fake.run(inputs)
+            return {
+                "workflow_run_id": run_id,
+                "task_id": task_id,
+                "data": {
+                    "id": run_id,
+                    "status": "succeeded",
+                    "outputs": outputs,
+                    "elapsed_time": time.perf_counter() - started,
+                    "total_tokens": 0
+                }
+            }
+
+        async def events():
+            queue: asyncio.Queue = asyncio.Queue()
+            started = time.perf_counter()
+
+            def event(name: str, data: Dict[str, Any]) -> str:
+                payload = {"event": name, "workflow_run_id": run_id, "task_id": task_id, "data": data}
+                return f"data: {json.dumps(payload, ensure_ascii=False)}\n\n"
+
+            async def on_event(name: str, data: Dict[str, Any]) -> None:
+                await queue.put(event(name, data))
+
+            async def execute():
+                try:
+                    outputs = await fake.run(inputs, on_event)
+                    await queue.put(event("workflow_finished", {
+                        "status": "succeeded", "outputs": outputs,
+                        "elapsed_time": time.perf_counter() - started, "total_tokens": 0
+                    }))
+                except Exception as e:
+                    await queue.put(event("workflow_finished", {"status": "failed", "error": str(e)}))
+                await queue.put(None)
+
+            yield event("workflow_started", {"id": run_id})
+            task = asyncio.create_task(execute())
+            try:
+                while (item := await queue.get()) is not None:
+                    yield item
+            finally:
+                task.cancel()
+
+        return StreamingResponse(events(), media_type="text/event-stream")
+
+    @app.get("/_fake/stats")
+    async def stats():
+        return fake.summary()
+
+    return app
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Dify workflow 替身服务")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=18002)
+    parser.add_argument("--app-url", default="http://127.0.0.1:8000", help="被测服务地址（workflow 回调认领和回复接口）")
+    parser.add_argument("--input-key", default="comments", help="与服务端 DIFY_FANOUT_INPUT_KEY 一致")
+    parser.add_argument("--reply-input-key", default="comment", help="与服务端 DIFY_REPLY_INPUT_KEY 一致")
+    parser.add_argument("--reply-output-key", default="reply", help="与服务端 DIFY_REPLY_OUTPUT_KEY 一致")
+    parser.add_argument("--batch-size", type=int, default=10, help="每次运行认领的评论数")
+    parser.add_argument("--run-latency", type=float, default=0.2, help="workflow 启动开销（秒）")
+    parser.add_argument("--generate-latency", type=float, default=0.5, help="生成一条回复的平均耗时（秒）")
+    parser.add_argument("--jitter", type=float, default=0.1, help="延迟标准差（秒）")
+    parser.add_argument("--concurrency", type=int, default=4, help="单次运行内并行生成的回复数")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="返回 503 的概率")
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    fake = FakeDify(
+        app_url=args.app_url, input_key=args.input_key, reply_input_key=args.reply_input_key,
+        reply_output_key=args.reply_output_key, batch_size=args.batch_size,
+        run_latency=args.run_latency, generate_latency=args.generate_latency, jitter=args.jitter,
+        concurrency=args.concurrency, error_rate=args.error_rate, seed=args.seed
+    )
+    uvicorn.run(create_app(fake), host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,227 @@
+#!/usr/bin/env python3
+"""
+端到端压测
+启动B站替身服务、Dify 替身服务和被测服务（指向两个替身），持续触发 /api/dify/call，
+测量“拉取评论 → 生成回复 → 发送回复”完整链路的运行耗时 p50 / p99 和每秒回复数。
+
+用法:
+    python benchmarks/load_test.py --duration 60 --concurrency 4
+    python benchmarks/load_test.py --comments 2000 --arrival-rate 20 --execution-mode fanout --response-mode streaming
+    python benchmarks/load_test.py --pipeline dify --arrival-rate 20   # 测量进程内回复流水线，不触发 workflow 运行
+    python benchmarks/load_test.py --app-url http://127.0.0.1:8000   # 使用已经启动的服务（需自行配置两个替身地址）
+"""
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Any, Dict, List, Optional
+
+import httpx
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+BENCH_DIR = os.path.join(ROOT, "benchmarks")
+
+
+def default_mid() -> str:
+    """替身服务中“我的” mid 需要与被测服务的 BILIBILI_MID 一致"""
+    sys.path.insert(0, ROOT)
+    try:
+        from app.config import BILIBILI_MID
+        return str(BILIBILI_MID)
+    except Exception:
+        from payloads import MY_MID
+        return MY_MID
+
+
+def spawn(args: List[str], env: Optional[Dict[str, str]] = None, log_path: Optional[str] = None) -> subprocess.Popen:
+    log = open(log_path, "w") if log_path else subprocess.DEVNULL
+    return subprocess.Popen([sys.executable] + args, cwd=ROOT, env={**os.environ, **(env or {})},
+                            stdout=log, stderr=subprocess.STDOUT)
+
+
+async def wait_ready(client: httpx.AsyncClient, url: str, timeout: float = 30) -> None:
+    deadline = time.monotonic() + timeout
+    while True:
+        try:
+            response = await client.get(url)
+            if response.status_code < 500:
+                return
+        except httpx.HTTPError:
+            pass
+        if time.monotonic() > deadline:
+            raise RuntimeError(f"等待 {url} 就绪超时")
+        await asyncio.sleep(0.2)
+
+
+def percentile(values: List[float], fraction: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))] if ordered else 0.0
+
+
+async def drive(args, app_url: str, bilibili_url: str, dify_url: str) -> Dict[str, Any]:
+    latencies: List[float] = []
+    failures = 0
+    params = {key: value for key, value in (("response_mode", args.response_mode),
+                                              ("execution_mode", args.execution_mode)) if value}
+
+    async with httpx.AsyncClient(timeout=args.timeout) as client:
+        for url in (f"{bilibili_url}/_fake/stats", f"{dify_url}/_fake/stats", f"{app_url}/health"):
+            await wait_ready(client, url)
+        if args.warmup > 0:
+            await asyncio.sleep(args.warmup)
+        if args.pipeline:
+            # 流水线模式：停止定时调度器，由流水线持续认领和回复
+            await client.post(f"{app_url}/api/dify/scheduler/stop")
+            await client.post(f"{app_url}/api/pipeline/start", params={"generator": args.pipeline})
+        before = (await client.get(f"{bilibili_url}/_fake/stats")).json()
+
+        deadline = time.monotonic() + args.duration
+        started = time.perf_counter()
+
+        async def worker():
+            nonlocal failures
+            runs = 0
+            while time.monotonic() < deadline and (args.runs is None or runs < args.runs):
+                runs += 1
+                run_started = time.perf_counter()
+                try:
+                    response = await client.post(f"{app_url}/api/dify/call", params=params)
+                    success = response.status_code == 200 and response.json().get("success", False)
+                except httpx.HTTPError:
+                    success = False
+                latencies.append(time.perf_counter() - run_started)
+                if not success:
+                    failures += 1
+
+        if args.pipeline:
+            await asyncio.sleep(args.duration)
+            pipeline = (await client.get(f"{app_url}/api/pipeline/status")).json()
+        else:
+            await asyncio.gather(*(worker() for _ in range(args.concurrency)))
+            pipeline = None
+        elapsed = time.perf_counter() - started
+        after = (await client.get(f"{bilibili_url}/_fake/stats")).json()
+        dify_stats = (await client.get(f"{dify_url}/_fake/stats")).json()
+
+    replies = after["replies"] - before["replies"]
+    return {
+        "duration": elapsed,
+        "runs": len(latencies),
+        "failed_runs": failures,
+        "run_p50_ms": statistics.median(latencies) * 1000 if latencies else 0.0,
+        "run_p99_ms": percentile(latencies, 0.99) * 1000,
+        "replies": replies,
+        "replies_per_second": replies / elapsed if elapsed > 0 else 0.0,
+        "reply_p50_ms": dify_stats.get("reply_p50_ms"),
+        "reply_p99_ms": dify_stats.get("reply_p99_ms"),
+        # 计数器取压测期间的增量，评论总数和未回复数取结束时的值
+        "bilibili": {key: value if key in ("comments", "unreplied") else value - before.get(key, 0)
+                     for key, value in after.items()},
+        "dify": dify_stats,
+        "pipeline": pipeline
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="端到端压测（B站和 Dify 均为本地替身）")
+    parser.add_argument("--duration", type=float, default=30, help="压测时长（秒）")
+    parser.add_argument("--runs", type=int, default=None, help="每个并发最多触发的运行次数")
+    parser.add_argument("--concurrency", type=int, default=2, help="同时进行的 workflow 运行数")
+    parser.add_argument("--warmup", type=float, default=2, help="服务就绪后等待的秒数（跳过启动时的首次定时运行）")
+    parser.add_argument("--timeout", type=float, default=120)
+    parser.add_argument("--response-mode", choices=("blocking", "streaming"))
+    parser.add_argument("--execution-mode", choices=("single", "fanout"))
+    parser.add_argument("--pipeline", choices=("dify", "template"),
+                        help="测量进程内回复流水线（指定生成器），不再触发 /api/dify/call")
+    parser.add_argument("--app-url", help="使用已启动的被测服务，不再自动启动")
+    parser.add_argument("--app-port", type=int, default=18000)
+    parser.add_argument("--bilibili-port", type=int, default=18001)
+    parser.add_argument("--dify-port", type=int, default=18002)
+    parser.add_argument("--app-env", action="append", default=[], metavar="KEY=VALUE",
+                        help="传给被测服务的额外环境变量，可重复")
+    # B站替身
+    parser.add_argument("--mid", default=None, help="我的 mid，默认取 BILIBILI_MID 配置")
+    parser.add_argument("--comments", type=int, default=500, help="初始评论数")
+    parser.add_argument("--arrival-rate", type=float, default=5, help="新评论到达速率（条/秒）")
+    parser.add_argument("--bilibili-latency", type=float, default=0.05)
+    parser.add_argument("--bilibili-error-rate", type=float, default=0.0)
+    parser.add_argument("--risk-rate", type=float, default=0.0)
+    parser.add_argument("--risk-mode", choices=("code", "status"), default="code")
+    parser.add_argument("--bilibili-reply-rate", type=float, default=0.0, help="替身的回复限频（条/秒），超出返回 -412")
+    # Dify 替身
+    parser.add_argument("--batch-size", type=int, default=10)
+    parser.add_argument("--run-latency", type=float, default=0.2)
+    parser.add_argument("--generate-latency", type=float, default=0.5)
+    parser.add_argument("--dify-concurrency", type=int, default=4)
+    parser.add_argument("--dify-error-rate", type=float, default=0.0)
+    parser.add_argument("--output", help="把结果保存为 JSON")
+    args = parser.parse_args()
+
+    work_dir = tempfile.mkdtemp(prefix="load_test_")
+    app_url = args.app_url or f"http://127.0.0.1:{args.app_port}"
+    bilibili_url = f"http://127.0.0.1:{args.bilibili_port}"
+    dify_url = f"http://127.0.0.1:{args.dify_port}"
+
+    processes = [
+        spawn([os.path.join(BENCH_DIR, "fake_bilibili.py"), "--port", str(args.bilibili_port),
+               "--mid", args.mid or default_mid(), "--comments", str(args.comments),
+               "--arrival-rate", str(args.arrival_rate), "--latency", str(args.bilibili_latency),
+               "--error-rate", str(args.bilibili_error_rate), "--risk-rate", str(args.risk_rate),
+               "--risk-mode", args.risk_mode, "--reply-rate", str(args.bilibili_reply_rate)],
+              log_path=os.path.join(work_dir, "fake_bilibili.log")),
+        spawn([os.path.join(BENCH_DIR, "fake_dify.py"), "--port", str(args.dify_port), "--app-url", app_url,
+               "--batch-size", str(args.batch_size), "--run-latency", str(args.run_latency),
+               "--generate-latency", str(args.generate_latency), "--concurrency", str(args.dify_concurrency),
+               "--error-rate", str(args.dify_error_rate)],
+              log_path=os.path.join(work_dir, "fake_dify.log"))
+    ]
+    if not args.app_url:
+        app_env = {
+            "BILIBILI_HTTP_CLIENT": "httpx",
+            "BILIBILI_API_BASE_URL": bilibili_url,
+            "DIFY_BASE_URL": f"{dify_url}/v1",
+            "COMMENT_STORE_PATH": os.path.join(work_dir, "comments.db"),
+            "LEADER_LEASE_PATH": os.path.join(work_dir, "comments.db"),
+            "LOG_FILE": os.path.join(work_dir, "app.log"),
+            # 替身不封号，默认不在服务端限流，测量服务自身的上限
+            "REPLY_RATE_PER_SECOND": "0"
+        }
+        app_env.update(item.split("=", 1) for item in args.app_env)
+        processes.append(spawn(["-m", "uvicorn", "main:app", "--host", "127.0.0.1", "--port", str(args.app_port),
+                                "--no-access-log"], env=app_env, log_path=os.path.join(work_dir, "app.log.out")))
+
+    try:
+        result = asyncio.run(drive(args, app_url, bilibili_url, dify_url))
+    finally:
+        for process in processes:
+            process.terminate()
+        for process in processes:
+            try:
+                process.wait(timeout=args.timeout)
+            except subprocess.TimeoutExpired:
+                process.kill()
+
+    if result["pipeline"] is not None:
+        print(f"回复流水线: {result['pipeline']['stats']}，时长 {result['duration']:.1f} 秒")
+    else:
+        print(f"运行次数: {result['runs']}（失败 {result['failed_runs']}），时长 {result['duration']:.1f} 秒")
+        print(f"单次运行耗时: p50 {result['run_p50_ms']:.1f} ms, p99 {result['run_p99_ms']:.1f} ms")
+    print(f"回复: {result['replies']} 条，{result['replies_per_second']:.2f} 条/秒")
+    if result["reply_p50_ms"] is not None:
+        print(f"单条回复耗时: p50 {result['reply_p50_ms']:.1f} ms, p99 {result['reply_p99_ms']:.1f} ms")
+    print(f"B站替身: {result['bilibili']}")
+    print(f"日志目录: {work_dir}")
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump({"args": vars(args), "result": result}, f, ensure_ascii=False, indent=2)
+        print(f"结果已保存: {args.output}")
+
+
+if __name__ == "__main__":
+    main()
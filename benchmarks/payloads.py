@@ -0,0 +1,88 @@
+"""
+合成的创作中心评论数据 - 供离线基准使用
+
+生成与 creative_center.get_comments 返回结构一致的评论：按主题帖组织，
+每个主题帖下有若干层他人的楼中楼回复，其中一部分评论被我回复过。
+"""
+import random
+import time
+from typing import Any, Dict, List, Optional
+
+MY_MID = "10000"
+
+
+def generate_comments(size: int, reply_ratio: float = 0.3, thread_depth: int = 1, videos: int = 10,
+                      mid: str = MY_MID, seed: int = 42, now: Optional[int] = None) -> List[Dict[str, Any]]:
+    """
+    生成 size 条评论（最新的在前，和 CommentManagerOrder.RECENTLY 一致）
+
+    Args:
+        size: 评论总数（包括我的回复）
+        reply_ratio: 他人评论被我回复的比例
+        thread_depth: 每个主题帖中他人评论的最大层数，1 表示只有一级评论
+        videos: 评论分布的视频数
+        mid: 我的 mid
+        seed: 随机种子，相同参数生成相同的数据
+        now: 最新一条评论的时间戳，默认当前时间
+    """
+    rng = random.Random(seed)
+    now = int(time.time()) if now is None else now
+    my_mid = int(mid)
+    comments: List[Dict[str, Any]] = []
+    rpid = 1
+
+    def add(author: int, oid: int, root: int, parent: int, message: str, uname: str) -> int:
+        nonlocal rpid
+        current = rpid
+        rpid += 1
+        comments.append({
+            'rpid': current,
+            'oid': oid,
+            'type': 1,
+            'bvid': f'BV1bench{oid:04d}',
+            'title': f'测试视频 {oid}',
+            'mid': author,
+            'root': root,
+            'parent': parent,
+            'ctime': 0,
+            'like': rng.randint(0, 50),
+            'content': {'message': message},
+            'member': {'mid': author, 'uname': uname},
+        })
+        return current
+
+    while len(comments) < size:
+        oid = rng.randint(1, max(1, videos))
+        author = rng.randint(20000, 99999)
+        root = add(author, oid, 0, 0, f'评论 {rpid}：这个视频讲得真好，请问用的是什么软件？', f'user{author}')
+        thread = [root]
+        for _ in range(rng.randint(0, max(0, thread_depth - 1))):
+            if len(comments) >= size:
+                break
+            author = rng.randint(20000, 99999)
+            thread.append(add(author, oid, root, thread[-1], f'回复 {thread[-1]}：同问', f'user{author}'))
+        for target in thread:
+            if len(comments) < size and rng.random() < reply_ratio:
+                add(my_mid, oid, root, target, '谢谢支持！', 'me')
+
+    # 时间戳按生成顺序递增，再整体倒序为最新在前
+    for index, comment in enumerate(comments):
+        comment['ctime'] = now - (len(comments) - 1 - index)
+    comments.reverse()
+    return comments
+
+
+def generate_payload(size: int, **kwargs) -> Dict[str, Any]:
+    """生成一份包含 size 条评论的单页返回数据"""
+    comments = generate_comments(size, **kwargs)
+    return {'list': comments, 'page': {'num': 1, 'size': size, 'total': size}}
+
+
+def paginate(comments: List[Dict[str, Any]], page_size: int) -> List[Dict[str, Any]]:
+    """把评论切分为 get_comments 的分页返回"""
+    total = len(comments)
+    return [
+        {'list': comments[start:start + page_size],
+         'page': {'num': start // page_size + 1, 'size': page_size, 'total': total}}
+        for start in range(0, max(total, 1), page_size)
+    ]
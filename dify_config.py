@@ -28,7 +28,33 @@ DIFY_WORKFLOW_ENDPOINT = f"{DIFY_BASE_URL}/workflows/run"
 
 # 请求配置
 REQUEST_TIMEOUT = 30  # 请求超时时间（秒）
+DIFY_RESPONSE_MODE = os.getenv("DIFY_RESPONSE_MODE", "blocking")  # blocking: 阻塞模式；streaming: SSE 流式模式
+DIFY_STREAM_IDLE_TIMEOUT = float(os.getenv("DIFY_STREAM_IDLE_TIMEOUT", 60))  # 流式模式下两个事件之间的最长等待时间（秒）
 MAX_RETRIES = 3  # 最大重试次数
 
+# 自适应调度配置
+SCHEDULER_MODE = os.getenv("SCHEDULER_MODE", "interval")  # interval: 固定间隔；adaptive: 按评论到达速率自适应
+ADAPTIVE_MIN_MINUTES = float(os.getenv("ADAPTIVE_MIN_MINUTES", 5))  # 自适应模式最短间隔（分钟）
+ADAPTIVE_MAX_MINUTES = float(os.getenv("ADAPTIVE_MAX_MINUTES", 60))  # 自适应模式最长间隔（分钟）
+ADAPTIVE_TARGET_BATCH = float(os.getenv("ADAPTIVE_TARGET_BATCH", 5))  # 期望每次运行处理的新评论数
+ADAPTIVE_RATE_WINDOW_MINUTES = float(os.getenv("ADAPTIVE_RATE_WINDOW_MINUTES", 60))  # 计算到达速率的时间窗口（分钟）
+SCHEDULER_QUIET_HOURS = os.getenv("SCHEDULER_QUIET_HOURS", "")  # cron 风格的静默小时，例如 "1-7"，留空表示不静默
+
+# 执行模式配置
+DIFY_EXECUTION_MODE = os.getenv("DIFY_EXECUTION_MODE", "single")  # single: 一次运行处理全部评论；fanout: 服务端分块并发运行
+DIFY_FANOUT_CHUNK_SIZE = int(os.getenv("DIFY_FANOUT_CHUNK_SIZE", 5))  # fanout 模式下每次运行处理的评论数
+DIFY_FANOUT_CONCURRENCY = int(os.getenv("DIFY_FANOUT_CONCURRENCY", 4))  # fanout 模式下同时进行的运行数
+DIFY_FANOUT_INPUT_KEY = os.getenv("DIFY_FANOUT_INPUT_KEY", "comments")  # 传给 workflow 的评论列表输入变量名（JSON 字符串）
+
+# 回复流水线中逐条生成回复的 workflow（PIPELINE_GENERATOR=dify）
+DIFY_REPLY_INPUT_KEY = os.getenv("DIFY_REPLY_INPUT_KEY", "comment")  # 传给 workflow 的单条评论输入变量名（JSON 字符串）
+DIFY_REPLY_OUTPUT_KEY = os.getenv("DIFY_REPLY_OUTPUT_KEY", "reply")  # workflow 输出中回复内容的变量名
+
+# 连接池配置（进程内共享一个客户端）
+DIFY_HTTP_MAX_CONNECTIONS = int(os.getenv("DIFY_HTTP_MAX_CONNECTIONS", 20))  # 最大连接数
+DIFY_HTTP_MAX_KEEPALIVE = int(os.getenv("DIFY_HTTP_MAX_KEEPALIVE", 10))  # 最大空闲长连接数
+DIFY_HTTP_KEEPALIVE_EXPIRY = float(os.getenv("DIFY_HTTP_KEEPALIVE_EXPIRY", 30))  # 空闲长连接保持时间（秒）
+DIFY_HTTP2 = os.getenv("DIFY_HTTP2", "false").lower() == "true"  # 是否启用 HTTP/2（需要安装 h2）
+
 # 日志配置
 DIFY_LOG_FILE = "dify_scheduler.log" 
\ No newline at end of file
@@ -2,26 +2,40 @@
 主应用文件 - FastAPI应用的入口点
 """
 import json
+import time
+import logging
 import asyncio
 from contextlib import asynccontextmanager
 from fastapi import FastAPI
-from app.config import API_TITLE, API_DESCRIPTION, API_VERSION
+from app.config import (
+    API_TITLE,
+    API_DESCRIPTION,
+    API_VERSION,
+    COMMENT_POLLER_ENABLED,
+    PIPELINE_ENABLED,
+    SHUTDOWN_DRAIN_TIMEOUT,
+    PROFILING_ENABLED,
+    PROFILING_TOKEN,
+    PROFILING_OUTPUT_DIR
+)
+from app.lifecycle import drain_controller, DrainMiddleware
+from app.metrics import MetricsMiddleware
+from app.timing import RequestProfiler, ServerTimingMiddleware
 from app.utils import setup_logging
+from app.http_client import init_http_clients, close_http_clients
 from app.api.comments import router as comments_router
 from app.api.health import router as health_router
 from app.api.dify import router as dify_router
+from app.api.metrics import router as metrics_router
+from app.api.pipeline import router as pipeline_router
 
-# 设置日志
-logger = setup_logging()
+# 设置日志（全局只配置一次，由后台线程写文件和控制台）
+setup_logging()
+logger = logging.getLogger(__name__)
 
 
-@asynccontextmanager
-async def lifespan(app: FastAPI):
-    """应用生命周期管理"""
-    # 启动事件
-    logger.info("Bilibili API Server 正在启动...")
-    
-    # 启动Dify定时调度器
+def start_background_tasks():
+    """成为 leader 后启动Dify定时调度器、未回复评论预热轮询器、回复发件箱 worker 和回复流水线"""
     try:
         from app.dify.service import start_scheduler
         success = start_scheduler()
@@ -32,6 +46,107 @@ async def lifespan(app: FastAPI):
     except Exception as e:
         logger.error("启动Dify定时调度器时发生错误: %s", str(e))
     
+    if COMMENT_POLLER_ENABLED:
+        try:
+            from app.bilibili.poller import comment_poller
+            comment_poller.start()
+        except Exception as e:
+            logger.error("启动评论轮询器时发生错误: %s", str(e))
+    
+    try:
+        from app.bilibili.reply_worker import reply_worker_pool
+        reply_worker_pool.start()
+    except Exception as e:
+        logger.error("启动回复发件箱worker时发生错误: %s", str(e))
+    
+    if PIPELINE_ENABLED:
+        try:
+            from app.pipeline.runner import reply_pipeline
+            reply_pipeline.start()
+        except Exception as e:
+            logger.error("启动回复流水线时发生错误: %s", str(e))
+
+
+async def stop_background_tasks(timeout: float = 0):
+    """
+    失去 leader 身份或关闭时停止Dify调度器、回复流水线、回复发件箱 worker 和评论轮询器
+
+    Args:
+        timeout: 等待正在发送的回复、正在进行的拉取和 workflow 运行的总时长（秒），
+                 超时后取消：请求尚未发出的回复重新排队或释放认领；请求可能已经发出的回复保留幂等键（unknown），
+                 发件箱任务标记为失败，不会在重启后重复发送
+    """
+    deadline = time.monotonic() + timeout
+    
+    # 先暂停调度器，不再触发新的 workflow 运行
+    try:
+        from app.dify.service import pause_scheduler
+        pause_scheduler()
+    except Exception as e:
+        logger.warning("暂停Dify调度器时发生错误: %s", str(e))
+    
+    # 流水线不再认领新评论，已认领的评论在剩余时间内处理完，否则释放认领
+    try:
+        from app.pipeline.runner import reply_pipeline
+        await reply_pipeline.stop(timeout=max(0.0, deadline - time.monotonic()))
+    except Exception as e:
+        logger.warning("停止回复流水线时发生错误: %s", str(e))
+    
+    try:
+        from app.bilibili.reply_worker import reply_worker_pool
+        await reply_worker_pool.stop(timeout=max(0.0, deadline - time.monotonic()))
+    except Exception as e:
+        logger.warning("停止回复发件箱worker时发生错误: %s", str(e))
+    
+    try:
+        from app.bilibili.poller import comment_poller
+        await comment_poller.stop(timeout=max(0.0, deadline - time.monotonic()))
+    except Exception as e:
+        logger.warning("停止评论轮询器时发生错误: %s", str(e))
+    
+    # 等待进行中的回复、拉取和 workflow 运行（关闭调度器会取消仍在执行的运行）
+    if timeout > 0:
+        if await drain_controller.wait_idle(max(0.0, deadline - time.monotonic())):
+            logger.info("✅ 进行中的工作已全部完成")
+        else:
+            logger.warning("⚠️ 排空超时，仍有未完成的工作: %s", drain_controller.inflight())
+    
+    try:
+        from app.dify.service import cleanup_scheduler
+        cleanup_scheduler()
+    except Exception as e:
+        logger.warning("清理Dify调度器时发生错误: %s", str(e))
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """应用生命周期管理"""
+    # 启动事件
+    logger.info("Bilibili API Server 正在启动...")
+    
+    # 创建共享HTTP连接池
+    try:
+        await init_http_clients()
+    except Exception as e:
+        logger.error("创建共享HTTP客户端时发生错误: %s", str(e))
+    
+    # 收到 SIGTERM / SIGINT 时立即进入排空状态，结束推送长连接
+    try:
+        from app.bilibili.broadcast import comment_broadcaster
+        drain_controller.on_drain(comment_broadcaster.close_all)
+        drain_controller.install_signal_handlers()
+    except Exception as e:
+        logger.error("注册排空信号处理失败: %s", str(e))
+    
+    # 竞选 leader：多 worker 部署时只有 leader 进程运行调度器和后台轮询器
+    try:
+        from app.leader import leader_elector
+        leader_elector.on_elected(start_background_tasks)
+        leader_elector.on_demoted(stop_background_tasks)
+        await leader_elector.start()
+    except Exception as e:
+        logger.error("leader 选举启动失败: %s", str(e))
+    
     logger.info("应用已成功启动！")
     
     yield
@@ -39,12 +154,29 @@ async def lifespan(app: FastAPI):
     # 关闭事件
     logger.info("正在关闭应用...")
     
-    # 清理Dify调度器
+    # 排空：不再接受新的工作，在 SHUTDOWN_DRAIN_TIMEOUT 内等待进行中的回复、拉取和 workflow 运行完成
+    drain_controller.begin()
+    await stop_background_tasks(timeout=SHUTDOWN_DRAIN_TIMEOUT)
+    
+    # 让出 leader，备用进程可以立即接管
     try:
-        from app.dify.service import cleanup_scheduler
-        cleanup_scheduler()
+        from app.leader import leader_elector
+        await leader_elector.stop()
     except Exception as e:
-        logger.warning("清理Dify调度器时发生错误: %s", str(e))
+        logger.warning("停止leader选举时发生错误: %s", str(e))
+    
+    # 关闭本地评论存储
+    try:
+        from app.bilibili.service import close_comment_store
+        close_comment_store()
+    except Exception as e:
+        logger.warning("关闭本地评论存储时发生错误: %s", str(e))
+    
+    # 释放共享HTTP连接池
+    try:
+        await close_http_clients()
+    except Exception as e:
+        logger.warning("关闭共享HTTP客户端时发生错误: %s", str(e))
     
     logger.info("应用已关闭")
 
@@ -57,10 +189,24 @@ app = FastAPI(
     lifespan=lifespan
 )
 
+# 排空期间拒绝新的写请求
+app.add_middleware(DrainMiddleware, controller=drain_controller)
+
+# 分阶段耗时写入 Server-Timing 响应头；PROFILING_ENABLED 时支持按请求剖析
+app.add_middleware(
+    ServerTimingMiddleware,
+    profiler=RequestProfiler(PROFILING_OUTPUT_DIR, PROFILING_TOKEN) if PROFILING_ENABLED else None
+)
+
+# 按路由记录请求耗时（最后添加，位于最外层，排空返回的 503 也会被统计）
+app.add_middleware(MetricsMiddleware)
+
 # 注册路由
 app.include_router(health_router, tags=["基础功能"])
+app.include_router(metrics_router, tags=["基础功能"])
 app.include_router(comments_router, prefix="/api/comments", tags=["评论管理"])
 app.include_router(dify_router, prefix="/api/dify", tags=["Dify集成"])
+app.include_router(pipeline_router, prefix="/api/pipeline", tags=["回复流水线"])
 
 
 # 保留原有的测试函数（可选）
@@ -21,9 +21,12 @@ if [ ! -z "$PID" ]; then
     echo "⚠️  端口 $PORT 已被进程 $PID 占用"
     echo "🔄 正在终止进程..."
     
-    # 尝试优雅关闭
+    # 尝试优雅关闭，等待进行中的回复和任务完成（最多 STOP_TIMEOUT 秒）
     kill $PID
-    sleep 2
+    for ((i = 0; i < ${STOP_TIMEOUT:-40}; i++)); do
+        kill -0 $PID 2>/dev/null || break
+        sleep 1
+    done
     
     # 检查进程是否还在运行
     if kill -0 $PID 2>/dev/null; then
@@ -7,6 +7,22 @@
 PORT=8000
 APP_NAME="Bilibili API Server"
 PID_FILE="api_server.pid"
+# 等待优雅关闭的最长时间（秒），应大于应用的 SHUTDOWN_DRAIN_TIMEOUT，超时后才强制终止
+STOP_TIMEOUT=${STOP_TIMEOUT:-40}
+
+# 发送 SIGTERM 后等待进程退出，超时后强制终止
+stop_process() {
+    local PID=$1
+    kill $PID 2>/dev/null
+    for ((i = 0; i < STOP_TIMEOUT; i++)); do
+        if ! kill -0 $PID 2>/dev/null; then
+            return 0
+        fi
+        sleep 1
+    done
+    echo "⚡ 进程 $PID 在 $STOP_TIMEOUT 秒内未退出，强制停止..."
+    kill -9 $PID 2>/dev/null
+}
 
 echo "🛑 停止 $APP_NAME..."
 
@@ -16,15 +32,8 @@ if [ -f "$PID_FILE" ]; then
     echo "📝 从PID文件读取到进程ID: $PID"
     
     if kill -0 $PID 2>/dev/null; then
-        echo "🔄 正在停止进程 $PID..."
-        kill $PID
-        sleep 2
-        
-        # 检查进程是否还在运行
-        if kill -0 $PID 2>/dev/null; then
-            echo "⚡ 强制停止进程..."
-            kill -9 $PID
-        fi
+        echo "🔄 正在停止进程 $PID（等待进行中的回复和任务完成，最多 $STOP_TIMEOUT 秒）..."
+        stop_process $PID
         
         echo "✅ 进程已停止"
         rm -f $PID_FILE
@@ -44,14 +53,7 @@ if [ ! -z "$PIDS" ]; then
     echo "⚠️  发现端口 $PORT 上仍有进程: $PIDS"
     for PID in $PIDS; do
         echo "🔄 停止进程 $PID..."
-        kill $PID
-        sleep 1
-        
-        # 检查进程是否还在运行
-        if kill -0 $PID 2>/dev/null; then
-            echo "⚡ 强制停止进程 $PID..."
-            kill -9 $PID
-        fi
+        stop_process $PID
     done
     echo "✅ 所有进程已停止"
 else
@@ -66,14 +68,7 @@ if [ ! -z "$UVICORN_PIDS" ]; then
     echo "⚠️  发现uvicorn进程: $UVICORN_PIDS"
     for PID in $UVICORN_PIDS; do
         echo "🔄 停止uvicorn进程 $PID..."
-        kill $PID
-        sleep 1
-        
-        # 检查进程是否还在运行
-        if kill -0 $PID 2>/dev/null; then
-            echo "⚡ 强制停止进程 $PID..."
-            kill -9 $PID
-        fi
+        stop_process $PID
     done
     echo "✅ 所有uvicorn进程已停止"
 else
@@ -0,0 +1,32 @@
+"""
+测试公共配置
+
+app/config.py 中的B站凭据是部署时填写的占位符（{BILIBILI_SESSDATA} 等），测试时先提供占位值再导入应用模块；
+本地存储指向临时目录，不读写工作目录中的数据库和日志
+"""
+import builtins
+import os
+import sys
+import tempfile
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT_DIR)
+sys.path.insert(0, os.path.join(ROOT_DIR, "benchmarks"))
+
+TEST_MID = "10000"
+
+for name, value in (("BILIBILI_SESSDATA", "test"), ("BILIBILI_BILI_JCT", "test"), ("BILIBILI_MID", TEST_MID)):
+    if not hasattr(builtins, name):
+        setattr(builtins, name, value)
+
+_data_dir = tempfile.mkdtemp(prefix="bilibili_comments_test_")
+os.environ.setdefault("COMMENT_STORE_PATH", os.path.join(_data_dir, "comments.db"))
+os.environ.setdefault("LEADER_LEASE_PATH", os.path.join(_data_dir, "comments.db"))
+os.environ.setdefault("LOG_FILE", os.path.join(_data_dir, "test.log"))
+
+import app.config  # noqa: E402
+
+# 占位符求值为集合，替换为字符串，与填写后的配置一致
+app.config.BILIBILI_SESSDATA = "test"
+app.config.BILIBILI_BILI_JCT = "test"
+app.config.BILIBILI_MID = TEST_MID
@@ -0,0 +1,74 @@
+"""
+评论认领：不同消费者认领的评论互不重叠，租约到期后重新分配，续期后继续持有
+"""
+import time
+
+import pytest
+
+from app.bilibili.claims import ClaimStore
+
+
+@pytest.fixture
+def claims(tmp_path):
+    store = ClaimStore(str(tmp_path / "claims.db"))
+    yield store
+    store.close()
+
+
+def test_claims_do_not_overlap(claims):
+    candidates = list(range(1, 11))
+    _, _, first = claims.claim(candidates, 4, 60, "a")
+    _, _, second = claims.claim(candidates, None, 60, "b")
+    _, _, third = claims.claim(candidates, None, 60, "c")
+    assert first == [1, 2, 3, 4]
+    assert second == [5, 6, 7, 8, 9, 10]
+    assert third == []
+    assert claims.count_active() == 10
+
+
+def test_claims_from_separate_connections_do_not_overlap(tmp_path):
+    """两个进程共享同一个数据库文件（各自的连接）时同样互斥"""
+    path = str(tmp_path / "claims.db")
+    first_store, second_store = ClaimStore(path), ClaimStore(path)
+    try:
+        _, _, first = first_store.claim(range(1, 6), 3, 60, "a")
+        _, _, second = second_store.claim(range(1, 6), None, 60, "b")
+    finally:
+        first_store.close()
+        second_store.close()
+    assert first == [1, 2, 3]
+    assert second == [4, 5]
+
+
+def test_expired_claims_are_reassigned(claims):
+    claims.claim([1, 2, 3], None, 0.05, "a")
+    time.sleep(0.1)
+    assert claims.count_active() == 0
+    _, _, claimed = claims.claim([1, 2, 3], None, 60, "b")
+    assert claimed == [1, 2, 3]
+
+
+def test_release_makes_comments_claimable(claims):
+    lease_id, _, _ = claims.claim([1, 2, 3], None, 60, "a")
+    assert claims.release([2]) == 1
+    _, _, claimed = claims.claim([1, 2, 3], None, 60, "b")
+    assert claimed == [2]
+    assert claims.release_lease(lease_id) == 2
+    _, _, claimed = claims.claim([1, 2, 3], None, 60, "c")
+    assert claimed == [1, 3]
+
+
+def test_renewed_lease_is_kept(claims):
+    lease_id, _, _ = claims.claim([1, 2], None, 0.2, "a")
+    assert claims.renew_lease(lease_id, 60) == 2
+    time.sleep(0.3)
+    _, _, claimed = claims.claim([1, 2], None, 60, "b")
+    assert claimed == []
+
+
+def test_expired_lease_is_not_renewed(claims):
+    lease_id, _, _ = claims.claim([1, 2], None, 0.05, "a")
+    time.sleep(0.1)
+    assert claims.renew_lease(lease_id, 60) == 0
+    _, _, claimed = claims.claim([1, 2], None, 60, "b")
+    assert claimed == [1, 2]
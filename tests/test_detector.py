@@ -0,0 +1,63 @@
+"""
+回复检测：ReplyDetector / detect_unreplied / 本地评论存储与旧版逐条比较实现的结果一致
+"""
+import pytest
+
+from app.bilibili.detector import ReplyDetector, detect_unreplied
+from app.bilibili.store import CommentStore
+from bench_analyze_comments import legacy_analyze_comments
+from payloads import MY_MID, generate_payload, paginate
+
+
+def rpids(comments):
+    return [comment["rpid"] for comment in comments]
+
+
+@pytest.mark.parametrize("size, reply_ratio, thread_depth", [
+    (0, 0.3, 1),
+    (50, 0.0, 1),
+    (200, 0.3, 1),
+    (500, 0.5, 3),
+    (1000, 1.0, 2),
+])
+def test_detect_unreplied_matches_legacy(size, reply_ratio, thread_depth):
+    payload = generate_payload(size, reply_ratio=reply_ratio, thread_depth=thread_depth, seed=size)
+    expected = legacy_analyze_comments(payload, MY_MID)
+    assert detect_unreplied([payload], MY_MID) == expected
+
+
+def test_paginated_feed_matches_single_page():
+    """回复与被回复的评论分在不同页时结果不变"""
+    payload = generate_payload(600, reply_ratio=0.4, thread_depth=2, seed=7)
+    expected = legacy_analyze_comments(payload, MY_MID)
+    pages = paginate(payload["list"], 37)
+    assert len(pages) > 1
+    assert detect_unreplied(iter(pages), MY_MID) == expected
+
+
+def test_detector_indexes_root_and_parent():
+    detector = ReplyDetector(MY_MID)
+    detector.feed({"list": [
+        {"rpid": 1, "mid": 1, "root": 0, "parent": 0, "content": {"message": "a"}},
+        {"rpid": 2, "mid": 2, "root": 0, "parent": 0, "content": {"message": "b"}},
+        {"rpid": 3, "mid": 3, "root": 2, "parent": 2, "content": {"message": "c"}},
+        {"rpid": 4, "mid": int(MY_MID), "root": 1, "parent": 1, "content": {"message": "reply"}},
+        {"rpid": 5, "mid": int(MY_MID), "root": 2, "parent": 3, "content": {"message": "reply"}},
+    ]})
+    assert detector.is_replied(1)
+    assert detector.is_replied(2)
+    assert detector.is_replied(3)
+    assert rpids(detector.unreplied()) == []
+
+
+def test_comment_store_matches_legacy(tmp_path):
+    """本地存储按 root / parent 查询未回复评论，结果集合与旧实现一致（按时间倒序）"""
+    payload = generate_payload(800, reply_ratio=0.35, thread_depth=2, seed=11)
+    expected = legacy_analyze_comments(payload, MY_MID)
+    store = CommentStore(str(tmp_path / "comments.db"))
+    try:
+        store.upsert_comments(payload["list"])
+        unreplied = store.unreplied_comments(MY_MID)
+    finally:
+        store.close()
+    assert sorted(rpids(unreplied)) == sorted(rpids(expected))
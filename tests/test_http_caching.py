@@ -0,0 +1,48 @@
+"""
+条件请求和压缩协商：etag_matches / accepts_gzip
+"""
+import pytest
+
+from app.cache import etag_matches, make_etag
+from app.serialization import accepts_gzip
+
+ETAG = make_etag(b'{"result":[],"count":0}')
+
+
+def test_make_etag_is_quoted_and_stable():
+    assert ETAG.startswith('"') and ETAG.endswith('"')
+    assert make_etag(b'{"result":[],"count":0}') == ETAG
+    assert make_etag(b'{"result":[],"count":1}') != ETAG
+
+
+@pytest.mark.parametrize("if_none_match, expected", [
+    (None, False),
+    ("", False),
+    (ETAG, True),
+    (f"W/{ETAG}", True),
+    (f'"other", {ETAG}', True),
+    (f'"other",W/{ETAG}', True),
+    ('"other"', False),
+    (ETAG.strip('"'), False),
+    ("*", True),
+])
+def test_etag_matches(if_none_match, expected):
+    assert etag_matches(if_none_match, ETAG) is expected
+
+
+@pytest.mark.parametrize("accept_encoding, expected", [
+    (None, False),
+    ("", False),
+    ("gzip", True),
+    ("GZIP", True),
+    ("gzip, deflate, br", True),
+    ("br, gzip;q=0.5", True),
+    ("*", True),
+    ("gzip;q=0", False),
+    ("gzip; q=0.0", False),
+    ("*;q=0", False),
+    ("deflate, br", False),
+    ("identity", False),
+])
+def test_accepts_gzip(accept_encoding, expected):
+    assert accepts_gzip(accept_encoding) is expected
@@ -0,0 +1,178 @@
+"""
+回复幂等：ReplyLedger 的状态转换，以及 reply_to_comment 在失败、结果未知和取消时如何处理幂等键
+"""
+import asyncio
+import time
+
+import httpx
+import pytest
+
+from app.bilibili import service
+from app.bilibili.idempotency import (
+    ReplyLedger,
+    STATUS_COMPLETED,
+    STATUS_CONFLICT,
+    STATUS_IN_FLIGHT,
+    STATUS_UNKNOWN
+)
+from app.models import ReplyResponse
+from app.ratelimit import TokenBucket
+
+
+@pytest.fixture
+def ledger(tmp_path):
+    store = ReplyLedger(str(tmp_path / "ledger.db"), ttl=3600, inflight_timeout=60)
+    yield store
+    store.close()
+
+
+def test_begin_complete_and_duplicate(ledger):
+    assert ledger.begin("k", 1, "hello") == (True, None, None)
+    assert ledger.get_status("k") == STATUS_IN_FLIGHT
+
+    acquired, status, previous = ledger.begin("k", 1, "hello")
+    assert (acquired, status, previous) == (False, STATUS_IN_FLIGHT, None)
+
+    response = ReplyResponse(success=True, message="回复成功", rpid=99)
+    ledger.complete("k", response)
+    acquired, status, previous = ledger.begin("k", 1, "hello")
+    assert (acquired, status) == (False, STATUS_COMPLETED)
+    assert previous == response
+
+
+def test_different_message_is_a_conflict(ledger):
+    ledger.begin("k", 1, "hello")
+    assert ledger.begin("k", 1, "another") == (False, STATUS_CONFLICT, None)
+    ledger.complete("k", ReplyResponse(success=True, message="回复成功"))
+    assert ledger.begin("k", 1, "another") == (False, STATUS_CONFLICT, None)
+
+
+def test_release_allows_retry(ledger):
+    ledger.begin("k", 1, "hello")
+    ledger.release("k")
+    assert ledger.get_status("k") is None
+    assert ledger.begin("k", 1, "hello")[0]
+
+
+def test_unknown_is_kept_and_not_released(ledger):
+    ledger.begin("k", 1, "hello")
+    ledger.mark_unknown("k")
+    ledger.release("k")
+    assert ledger.get_status("k") == STATUS_UNKNOWN
+    assert ledger.begin("k", 1, "hello") == (False, STATUS_UNKNOWN, None)
+
+
+def test_mark_unknown_does_not_override_completed(ledger):
+    ledger.begin("k", 1, "hello")
+    ledger.complete("k", ReplyResponse(success=True, message="回复成功"))
+    ledger.mark_unknown("k")
+    assert ledger.get_status("k") == STATUS_COMPLETED
+
+
+def test_records_expire(tmp_path):
+    ledger = ReplyLedger(str(tmp_path / "ledger.db"), ttl=0.05, inflight_timeout=0.05)
+    try:
+        ledger.begin("done", 1, "hello")
+        ledger.complete("done", ReplyResponse(success=True, message="回复成功"))
+        ledger.begin("stale", 2, "hello")
+        time.sleep(0.1)
+        assert ledger.begin("done", 1, "hello")[0]
+        assert ledger.begin("stale", 2, "hello")[0]
+    finally:
+        ledger.close()
+
+
+class BlockedLimiter:
+    """令牌永远不会到达的限流器：回复停在发出请求之前"""
+
+    async def acquire(self, tokens: float = 1) -> float:
+        await asyncio.Event().wait()
+        return 0.0
+
+
+@pytest.fixture
+def reply_env(ledger, monkeypatch):
+    """reply_to_comment 使用临时幂等记录、不限流，B站发送接口由各测试替换"""
+    monkeypatch.setattr(service, "_reply_ledger", ledger)
+    monkeypatch.setattr(service, "reply_limiter", TokenBucket(rate=0))
+    monkeypatch.setattr(service, "BILIBILI_MAX_RETRIES", 0)
+    calls = []
+
+    def use_send(send):
+        async def send_comment(**kwargs):
+            calls.append(kwargs)
+            return await send(**kwargs)
+        monkeypatch.setattr(service.comment, "send_comment", send_comment)
+    return ledger, calls, use_send
+
+
+async def _cancel_after(coro, delay: float):
+    task = asyncio.create_task(coro)
+    await asyncio.sleep(delay)
+    task.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        await task
+
+
+def test_cancelled_after_request_sent_keeps_key(reply_env):
+    ledger, calls, use_send = reply_env
+
+    async def slow_send(**kwargs):
+        await asyncio.sleep(10)
+    use_send(slow_send)
+
+    async def scenario():
+        await _cancel_after(service.reply_to_comment(1, 7, "hello", 7), 0.1)
+        # 回复可能已经发出，同一评论不再自动发送
+        return await service.reply_to_comment(1, 7, "hello", 7)
+
+    result = asyncio.run(scenario())
+    assert ledger.get_status("7") == STATUS_UNKNOWN
+    assert not result.success and not result.retryable
+    assert len(calls) == 1
+
+
+def test_cancelled_before_request_sent_releases_key(reply_env, monkeypatch):
+    ledger, calls, use_send = reply_env
+
+    async def send(**kwargs):
+        return {"rpid": 100}
+    use_send(send)
+    monkeypatch.setattr(service, "reply_limiter", BlockedLimiter())
+
+    asyncio.run(_cancel_after(service.reply_to_comment(1, 8, "hello", 8), 0.1))
+    assert ledger.get_status("8") is None
+    assert calls == []
+
+
+def test_ambiguous_failure_marks_unknown(reply_env):
+    ledger, calls, use_send = reply_env
+
+    async def timeout(**kwargs):
+        raise httpx.ReadTimeout("read timed out")
+    use_send(timeout)
+
+    first = asyncio.run(service.reply_to_comment(1, 9, "hello", 9))
+    second = asyncio.run(service.reply_to_comment(1, 9, "hello", 9))
+    assert not first.success and not first.retryable
+    assert not second.success and not second.retryable
+    assert ledger.get_status("9") == STATUS_UNKNOWN
+    assert len(calls) == 1
+
+
+def test_definite_failure_releases_key(reply_env):
+    ledger, calls, use_send = reply_env
+
+    async def refused(**kwargs):
+        raise httpx.ConnectError("connection refused")
+    use_send(refused)
+
+    result = asyncio.run(service.reply_to_comment(1, 10, "hello", 10))
+    assert not result.success and result.retryable
+    assert ledger.get_status("10") is None
+
+
+def test_conflict_is_not_retryable(reply_env, ledger):
+    ledger.begin("custom", 11, "hello")
+    result = asyncio.run(service.reply_to_comment(1, 11, "another", 11, "custom"))
+    assert not result.success and not result.retryable
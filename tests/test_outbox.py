@@ -0,0 +1,106 @@
+"""
+回复发件箱：按幂等键去重、领取、重试、中断后重新排队
+"""
+import time
+
+import pytest
+
+from app.bilibili.outbox import (
+    ReplyOutbox,
+    STATUS_FAILED,
+    STATUS_QUEUED,
+    STATUS_SENDING,
+    STATUS_SUCCEEDED
+)
+from app.models import ReplyCommentRequest, ReplyResponse
+
+
+@pytest.fixture
+def outbox(tmp_path):
+    store = ReplyOutbox(str(tmp_path / "outbox.db"), sending_timeout=60, retention=3600)
+    yield store
+    store.close()
+
+
+def request(rpid: int, message: str = "谢谢！", key=None) -> ReplyCommentRequest:
+    return ReplyCommentRequest(oid=1, rpid=rpid, message=message, root=rpid, idempotency_key=key)
+
+
+def test_enqueue_dedupes_on_idempotency_key(outbox):
+    first = outbox.enqueue(request(1))
+    assert first["status"] == STATUS_QUEUED
+    assert first["idempotency_key"] == "1"
+    assert outbox.enqueue(request(1))["id"] == first["id"]
+    assert outbox.enqueue(request(2, key="custom"))["id"] != first["id"]
+    assert outbox.enqueue(request(3, key="custom"))["rpid"] == 2
+    assert outbox.counts()[STATUS_QUEUED] == 2
+
+
+def test_enqueue_after_success_returns_existing_job(outbox):
+    job = outbox.enqueue(request(1))
+    claimed = outbox.claim_next()
+    outbox.complete(claimed["id"], ReplyResponse(success=True, message="回复成功", rpid=9))
+    again = outbox.enqueue(request(1))
+    assert again["id"] == job["id"]
+    assert again["status"] == STATUS_SUCCEEDED
+    assert again["result"]["rpid"] == 9
+
+
+def test_enqueue_after_failure_creates_new_job(outbox):
+    job = outbox.enqueue(request(1))
+    outbox.claim_next()
+    outbox.fail(job["id"], "失败")
+    assert outbox.latest_statuses(["1"]) == {"1": STATUS_FAILED}
+    again = outbox.enqueue(request(1))
+    assert again["id"] != job["id"]
+    assert outbox.latest_statuses(["1", "2"]) == {"1": STATUS_QUEUED}
+
+
+def test_claim_next_hands_out_each_job_once(outbox):
+    outbox.enqueue_many([request(1), request(2)])
+    first, second = outbox.claim_next(), outbox.claim_next()
+    assert {first["rpid"], second["rpid"]} == {1, 2}
+    assert first["status"] == second["status"] == STATUS_SENDING
+    assert first["attempts"] == 1
+    assert outbox.claim_next() is None
+
+
+def test_requeue_returns_the_attempt(outbox):
+    job = outbox.enqueue(request(1))
+    outbox.claim_next()
+    outbox.requeue(job["id"])
+    requeued = outbox.get(job["id"])
+    assert requeued["status"] == STATUS_QUEUED
+    assert requeued["attempts"] == 0
+    assert outbox.claim_next()["id"] == job["id"]
+
+
+def test_requeue_only_affects_sending_jobs(outbox):
+    job = outbox.enqueue(request(1))
+    outbox.claim_next()
+    outbox.complete(job["id"], ReplyResponse(success=True, message="回复成功"))
+    outbox.requeue(job["id"])
+    assert outbox.get(job["id"])["status"] == STATUS_SUCCEEDED
+
+
+def test_retry_waits_for_next_attempt(outbox):
+    job = outbox.enqueue(request(1))
+    outbox.claim_next()
+    outbox.retry(job["id"], "限频", delay=60)
+    assert outbox.get(job["id"])["status"] == STATUS_QUEUED
+    assert outbox.claim_next() is None
+
+
+def test_stale_sending_job_is_reclaimed(tmp_path):
+    """进程中断遗留的 sending 任务超过 sending_timeout 后重新领取"""
+    outbox = ReplyOutbox(str(tmp_path / "outbox.db"), sending_timeout=0.05, retention=3600)
+    try:
+        job = outbox.enqueue(request(1))
+        outbox.claim_next()
+        assert outbox.claim_next() is None
+        time.sleep(0.1)
+        reclaimed = outbox.claim_next()
+        assert reclaimed["id"] == job["id"]
+        assert reclaimed["attempts"] == 2
+    finally:
+        outbox.close()
@@ -0,0 +1,78 @@
+"""
+评论预过滤：关键词自动机的词边界，以及固定回复判定
+"""
+from app.bilibili.prefilter import (
+    ACTION_CANNED,
+    ACTION_LLM,
+    ACTION_SKIP,
+    CommentPrefilter,
+    KeywordMatcher
+)
+from app.models import CommentInfo
+
+
+def matcher(*keywords):
+    return KeywordMatcher((keyword, keyword) for keyword in keywords)
+
+
+def comment(rpid: int, content: str, mid: str = "1") -> CommentInfo:
+    return CommentInfo(rpid=rpid, mid=mid, oid=1, root=0, parent=0, content=content,
+                       title="视频", uname="小明", bvid="BV1xx")
+
+
+def test_latin_keywords_respect_word_boundaries():
+    keywords = matcher("vx", "qq")
+    assert keywords.search("加vx领取") == "vx"
+    assert keywords.search("vx: abc") == "vx"
+    assert keywords.search("加 vx") == "vx"
+    assert keywords.search("加vxworks") is None
+    assert keywords.search("avx指令集") is None
+    assert keywords.search("qqq") is None
+    assert keywords.search("我的qq号") == "qq"
+
+
+def test_cjk_keywords_match_anywhere():
+    keywords = matcher("加微信", "私信")
+    assert keywords.search("快来加微信吧") == "加微信"
+    assert keywords.search("请私信我") == "私信"
+    assert keywords.search("微信") is None
+
+
+def test_overlapping_keywords_return_first_occurrence():
+    keywords = matcher("he", "she", "hers")
+    assert keywords.search("ushers") is None
+    assert keywords.search("u she rs") == "she"
+    assert matcher("互关", "互关互粉").search("求互关互粉") == "互关"
+
+
+def test_mixed_keyword_only_checks_latin_ends():
+    keywords = matcher("vx号", "加v")
+    assert keywords.search("avx号") is None
+    assert keywords.search("看vx号") == "vx号"
+    assert keywords.search("加vip") is None
+    assert keywords.search("加v。") == "加v"
+
+
+def test_empty_matcher_never_matches():
+    assert matcher().search("anything") is None
+    assert matcher("").search("anything") is None
+
+
+def test_classify_actions():
+    prefilter = CommentPrefilter({"blocked_users": ["42"]})
+    assert prefilter.classify(comment(1, "谢谢up主！！")).action == ACTION_CANNED
+    assert prefilter.classify(comment(2, "加微信领取资料")).action == ACTION_SKIP
+    assert prefilter.classify(comment(3, "请问这个视频里用的是什么软件？")).action == ACTION_LLM
+    assert prefilter.classify(comment(4, "谢谢，请问怎么下载？")).action == ACTION_LLM
+    assert prefilter.classify(comment(5, "这个教程讲得很清楚", mid="42")).action == ACTION_SKIP
+
+
+def test_demote_hands_canned_comment_to_llm():
+    prefilter = CommentPrefilter()
+    thanks = comment(1, "谢谢up主！！")
+    keep, canned = prefilter.apply([thanks])
+    assert keep == [] and [item.rpid for item, _ in canned] == [1]
+    assert prefilter.demote(1)
+    keep, canned = prefilter.apply([thanks])
+    assert keep == [thanks] and canned == []
+    assert not prefilter.demote(1)